@@ -1,232 +1,4202 @@
+import argparse
+import bisect
+import codecs
+import contextlib
+import functools
+import heapq
+import importlib.machinery
+import importlib.util
+import io
+import itertools
 import json
+import math
+import mmap
+import numbers
+import os
+import random
+import re
+import shlex
+import struct
 import sys
-import requests
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterator, Mapping, Sequence
+from datetime import date as Date
+from decimal import Decimal, ROUND_HALF_EVEN
 
 """
 Financial Management System
 """
 
+#requests, numpy, multiprocessing and asyncio take much longer to import than the rest of the
+#program, and most runs never use them, so they are only imported the first time they are needed
+
+@functools.lru_cache(maxsize=None)
+def optional_numpy():
+    """
+    Imports numpy the first time it is needed
+
+    Returns:
+        module: numpy, or None if it is not installed (callers then fall back to plain lists)
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def is_request_error(error):
+    """
+    Checks whether an error was raised by requests, without importing requests to find out
+
+    Args:
+        error (Exception): the error
+
+    Returns:
+        bool: True if it is a requests.exceptions.RequestException
+    """
+    requests = sys.modules.get('requests')
+    return requests is not None and isinstance(error, requests.exceptions.RequestException)
+
+def parallel_map(function, iterables, workers=None):
+    """
+    Calls a function of this module on each set of arguments in a pool of processes.
+    Processes started fresh instead of forked (the default on macOS and Windows, and on
+    Linux from Python 3.14) import this module by name to find the function, which they
+    can't when it was loaded from a file that isn't named like a module, as
+    "Finance_Tracker (4).py" is; a pool of threads is used then instead.
+
+    Args:
+        function (callable): function defined at the top level of this module
+        iterables (list): one iterable per argument of the function, as for map
+        workers (int): number of processes (default: one per CPU)
+
+    Returns:
+        list: the results, in order
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    if multiprocessing.get_start_method() == 'fork' or _importable_by_name(function.__module__):
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+    with pool:
+        return list(pool.map(function, *iterables))
+
+def _importable_by_name(name):
+    """
+    Checks whether a fresh process would find a loaded module by importing its name
+
+    Args:
+        name (str): the module's name
+
+    Returns:
+        bool: True if importing the name gives the same file
+    """
+    path = getattr(sys.modules.get(name), '__file__', None)
+    if path is None:
+        return False
+    if name == '__main__':
+        #the main script is run again from its path
+        return True
+    #a name already imported is found in sys.modules, so look for it on the path as a new process would
+    spec = importlib.machinery.PathFinder.find_spec(name) if '.' not in name else importlib.util.find_spec(name)
+    return spec is not None and spec.origin is not None and os.path.realpath(spec.origin) == os.path.realpath(path)
+
+#names of the dated lists kept by Finances, in the order they appear in reports
+LEDGERS = ('income', 'expenses', 'transactions')
+
+#fields of the records in each dated list, in the order add_* takes them
+LEDGER_FIELDS = {
+    'income': ('source', 'amount', 'date'),
+    'expenses': ('category', 'amount', 'date'),
+    'transactions': ('date', 'category', 'amount', 'description'),
+}
+
+#text field each dated list is categorized by; there are only a few distinct values, so
+#they are dictionary encoded (see StringDictionary) whatever the storage option
+CATEGORY_FIELDS = {'income': 'source', 'expenses': 'category', 'transactions': 'category'}
+
+#sign of a transaction's amount in totals, by category (lowercase); other categories count as 0
+TRANSACTION_SIGNS = {'income': 1, 'expense': -1, 'savings': -1}
+
+#decimal places of each currency's minor unit (cents for USD), used when Finances or Investments
+#keep amounts as whole minor units; currencies not listed have 2, and more can be added
+MINOR_UNITS = {'JPY': 0, 'KRW': 0, 'VND': 0, 'CLP': 0, 'ISK': 0, 'BHD': 3, 'JOD': 3, 'KWD': 3, 'OMR': 3, 'TND': 3}
+
+def to_minor_units(amount, currency):
+    """
+    Converts an amount into a whole number of its currency's minor unit, e.g. 19.99 USD into
+    1999 cents, rounding to the nearest one (halves to even)
+
+    Args:
+        amount (float): amount in the currency's main unit
+        currency (str): currency code (see MINOR_UNITS)
+
+    Returns:
+        int: the amount in minor units
+    """
+    places = MINOR_UNITS.get(currency, 2)
+    if isinstance(amount, int):
+        return amount * 10 ** places
+    #going through the float's shortest decimal form makes 0.29 exactly 29 cents, not 28.999...
+    return int(Decimal(str(amount)).scaleb(places).to_integral_value(ROUND_HALF_EVEN))
+
+def from_minor_units(units, currency):
+    """
+    Converts a whole number of a currency's minor unit back into its main unit, e.g. for display
+
+    Args:
+        units (int): amount in minor units
+        currency (str): currency code (see MINOR_UNITS)
+
+    Returns:
+        float: the amount in the currency's main unit
+    """
+    return units / 10 ** MINOR_UNITS.get(currency, 2)
+
+@functools.lru_cache(maxsize=65536)
+def date_to_ordinal(date):
+    """
+    Converts a YYYY-MM-DD date into its day number. The month and day may leave out
+    their leading zero (2024-5-1). Dates are kept as day numbers for comparing, sorting
+    and indexing, which is faster than comparing strings and does not put 2024-5-1 after
+    2024-10-01; the cache means each distinct date is only parsed once.
+
+    Args:
+        date (str): date to convert
+
+    Returns:
+        int: proleptic Gregorian ordinal of the date (0001-01-01 is day 1)
+
+    Raises:
+        ValueError: if the date is not a real date in YYYY-MM-DD form
+    """
+    parts = date.split('-') if isinstance(date, str) else ()
+    if len(parts) != 3 or len(parts[0]) != 4 or not all(0 < len(part) <= 4 and part.isdecimal() for part in parts) \
+            or len(parts[1]) > 2 or len(parts[2]) > 2:
+        raise ValueError(f"Invalid date {date!r}. Please use YYYY-MM-DD.")
+    year, month, day = map(int, parts)
+    try:
+        return Date(year, month, day).toordinal()
+    except ValueError:
+        raise ValueError(f"Invalid date {date!r}: there is no such day.") from None
+
+def valid_date(date):
+    """
+    Checks whether a string is a valid YYYY-MM-DD date
+
+    Args:
+        date (str): date to check
+
+    Returns:
+        bool: True if it is valid
+    """
+    try:
+        date_to_ordinal(date)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+@functools.lru_cache(maxsize=65536)
+def ordinal_to_date(ordinal):
+    """
+    Converts a day number back into a YYYY-MM-DD date
+
+    Args:
+        ordinal (int): proleptic Gregorian ordinal of the date
+
+    Returns:
+        str: the date in YYYY-MM-DD format
+    """
+    return Date.fromordinal(ordinal).isoformat()
+
+def normalize_date(date):
+    """
+    Rewrites a date in the YYYY-MM-DD form records are kept in, e.g. 2024-5-1 as 2024-05-01
+
+    Args:
+        date (str): date to rewrite
+
+    Returns:
+        str: the date in YYYY-MM-DD format
+    """
+    return ordinal_to_date(date_to_ordinal(date))
+
+@functools.lru_cache(maxsize=65536)
+def week_of(day):
+    """
+    Finds the ISO week a date falls in
+
+    Args:
+        day (int): day number of the date (see date_to_ordinal)
+
+    Returns:
+        str: the week in YYYY-Www format (e.g. 2024-W18)
+    """
+    year, week, _ = Date.fromordinal(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+#calendar buckets Finances.aggregate can group by, each turning a day number into its bucket
+DATE_BUCKETS = {
+    'day': ordinal_to_date,
+    'week': week_of,
+    'month': lambda day: ordinal_to_date(day)[:7],
+    'year': lambda day: ordinal_to_date(day)[:4],
+}
+
+def group_by(keys, amounts, method='hash'):
+    """
+    Computes the sum, count, mean, min and max of amounts grouped by key in a single pass
+
+    Args:
+        keys (iterable): group key of each amount
+        amounts (iterable): the amounts, in the same order as keys
+        method (str): 'hash' collects the groups in a dict, which is fastest when there
+            are few distinct keys; 'sort' sorts by key and reads off each run of equal
+            keys, which holds up better when there are very many
+
+    Returns:
+        dict: maps each key, in sorted order, to a dict of sum, count, mean, min and max
+    """
+    if method == 'hash':
+        groups = {}
+        for key, amount in zip(keys, amounts):
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [amount, 1, amount, amount]
+            else:
+                group[0] += amount
+                group[1] += 1
+                if amount < group[2]:
+                    group[2] = amount
+                elif amount > group[3]:
+                    group[3] = amount
+        runs = sorted(groups.items())
+    elif method == 'sort':
+        runs = []
+        pairs = sorted(zip(keys, amounts), key=lambda pair: pair[0])
+        for key, run in itertools.groupby(pairs, key=lambda pair: pair[0]):
+            values = [amount for _, amount in run]
+            runs.append((key, [sum(values), len(values), min(values), max(values)]))
+    else:
+        raise ValueError(f"Unknown method '{method}'. Please use 'hash' or 'sort'.")
+    return {key: {'sum': total, 'count': count, 'mean': total / count, 'min': low, 'max': high}
+            for key, (total, count, low, high) in runs}
+
+def insert_in_order(keys, values, key, value):
+    """
+    Inserts a key and its value into a pair of lists kept sorted by key, after any equal keys
+
+    Args:
+        keys (list): sorted keys
+        values (list): value of each key, in the same order
+        key: key to insert
+        value: its value
+    """
+    if not keys or key >= keys[-1]:
+        #records usually arrive in date order, so this is just an append
+        keys.append(key)
+        values.append(value)
+    else:
+        i = bisect.bisect_right(keys, key)
+        keys.insert(i, key)
+        values.insert(i, value)
+
+class DailyTotals:
+    """
+    Keeps a running total of the amounts in a dated list, one per day, so the total
+    between two dates is the difference of two running totals.
+    """
+
+    def __init__(self):
+        """
+        Initializes empty totals
+
+        Args:
+            days: sorted list of the distinct dates, as day numbers
+            running: running[i] is the total of all amounts dated days[i] or earlier
+        """
+        self.days = []
+        self.running = []
+
+    def add(self, day, amount):
+        """
+        Adds an amount to the totals
+
+        Args:
+            day (int): day number of the amount's date
+            amount (float): amount to add
+        """
+        if not self.days or day > self.days[-1]:
+            self.days.append(day)
+            self.running.append(self.running[-1] + amount if self.running else amount)
+            return
+        i = bisect.bisect_left(self.days, day)
+        if self.days[i] != day:
+            self.days.insert(i, day)
+            self.running.insert(i, self.running[i - 1] if i else 0)
+        for j in range(i, len(self.running)):
+            self.running[j] += amount
+
+    def extend(self, days, amounts):
+        """
+        Adds a batch of amounts to the totals
+
+        Args:
+            days (list): day number of every amount
+            amounts (list): the amounts
+        """
+        per_day = {}
+        for day, amount in zip(days, amounts):
+            per_day[day] = per_day.get(day, 0) + amount
+        if not per_day:
+            return
+        new_days = sorted(per_day)
+        if not self.days or new_days[0] > self.days[-1]:
+            total = self.running[-1] if self.running else 0
+            for day in new_days:
+                total += per_day[day]
+                self.days.append(day)
+                self.running.append(total)
+            return
+        #fold the existing running totals back into daily amounts and start over
+        previous = 0
+        for day, running in zip(self.days, self.running):
+            per_day[day] = per_day.get(day, 0) + running - previous
+            previous = running
+        self.days = sorted(per_day)
+        self.running = list(itertools.accumulate(per_day[day] for day in self.days))
+
+    def rebuild(self, days, amounts):
+        """
+        Replaces the totals with ones built from the given amounts
+
+        Args:
+            days (list): day number of every amount
+            amounts (list): the amounts
+        """
+        per_day = {}
+        for day, amount in zip(days, amounts):
+            per_day[day] = per_day.get(day, 0) + amount
+        self.days = sorted(per_day)
+        self.running = list(itertools.accumulate(per_day[day] for day in self.days))
+
+    def total(self, start, end):
+        """
+        Finds the total of the amounts dated between start and end (inclusive)
+
+        Args:
+            start (int): day number of the first date of the range
+            end (int): day number of the last date of the range
+
+        Returns:
+            float: the total
+        """
+        lo = bisect.bisect_left(self.days, start)
+        hi = bisect.bisect_right(self.days, end)
+        if hi <= lo:
+            return 0
+        return self.running[hi - 1] - (self.running[lo - 1] if lo else 0)
+
+class StringDictionary:
+    """
+    Gives each distinct string a small integer code, so repeated strings are stored once.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty dictionary
+
+        Args:
+            values: list of the distinct strings, where a string's position is its code
+            codes: maps each string to its code
+        """
+        self.values = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        """
+        Finds the code of a string, giving it a new code the first time it is seen
+
+        Args:
+            value (str): string to encode
+
+        Returns:
+            int: code of the string
+        """
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def decode(self, code):
+        """
+        Finds the string for a code
+
+        Args:
+            code (int): code returned by encode
+
+        Returns:
+            str: the string with that code
+        """
+        return self.values[code]
+
+class ColumnarRecord(dict):
+    """
+    A record read from a ColumnarLedger. It is a dict, so it compares, prints and saves like
+    one, but it is read-only: the ledger keeps its values in columns, so a change made to the
+    record would be lost. dict(record) gives a copy that can be changed.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Records kept in columnar storage can't be changed in place. "
+                        "Please use dict(record) for a copy that can be changed.")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        #pickle would otherwise add the items one by one through __setitem__
+        return ColumnarRecord, (dict(self),)
+
+class ColumnarLedger(Sequence):
+    """
+    Stores a dated list of records column by column instead of as one dict per record.
+
+    Dates are kept as int32 day numbers, amounts as float64 and text fields as
+    codes into a StringDictionary, all in compact arrays. Reading the ledger still
+    gives back dicts (read-only ColumnarRecords), so it can be used anywhere a list of
+    records is expected.
+    """
+
+    def __init__(self, fields, records=(), amount_typecode='d'):
+        """
+        Initializes the ledger
+
+        Args:
+            fields (tuple): names of the record fields, in order
+            records (iterable): records (dicts) to start with
+            amount_typecode (str): 'd' for float amounts or 'q' for whole minor units
+        """
+        self.fields = fields
+        self.columns = {}
+        self.dictionaries = {}
+        for field in fields:
+            if field == 'date':
+                self.columns[field] = array('i')
+            elif field == 'amount':
+                self.columns[field] = array(amount_typecode)
+            else:
+                self.columns[field] = array('I')
+                self.dictionaries[field] = StringDictionary()
+        self.extend(records)
+
+    @classmethod
+    def from_columns(cls, fields, columns):
+        """
+        Creates a ledger around existing columns without copying them
+
+        Args:
+            fields (tuple): names of the record fields, in order
+            columns (dict): maps each field to its array: day numbers for date, amounts
+                for amount, and a (strings, codes) pair for text fields
+
+        Returns:
+            ColumnarLedger: the ledger
+        """
+        ledger = cls(fields)
+        for field in fields:
+            if field in ledger.dictionaries:
+                strings, codes = columns[field]
+                dictionary = ledger.dictionaries[field]
+                dictionary.values = list(strings)
+                dictionary.codes = {string: code for code, string in enumerate(dictionary.values)}
+                ledger.columns[field] = codes
+            else:
+                ledger.columns[field] = columns[field]
+        return ledger
+
+    def __len__(self):
+        return len(self.columns[self.fields[0]])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        values = []
+        for field in self.fields:
+            value = self.columns[field][i]
+            if field == 'date':
+                value = ordinal_to_date(value)
+            elif field in self.dictionaries:
+                value = self.dictionaries[field].values[value]
+            values.append(value)
+        return ColumnarRecord(zip(self.fields, values))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if isinstance(other, (list, ColumnarLedger)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def append(self, record):
+        """
+        Adds a record to the end of the ledger
+
+        Args:
+            record (dict): record with a value for every field
+        """
+        #encode every value first so a bad record can't leave the columns different lengths
+        values = []
+        for field in self.fields:
+            value = record[field]
+            if field == 'date':
+                value = date_to_ordinal(value)
+            elif field == 'amount':
+                value = float(value) if self.columns[field].typecode == 'd' else int(value)
+            else:
+                value = self.dictionaries[field].encode(value)
+            values.append(value)
+        for field, value in zip(self.fields, values):
+            self.columns[field].append(value)
+
+    def extend(self, records):
+        """
+        Adds several records to the end of the ledger
+
+        Args:
+            records (iterable): records (dicts) to add
+        """
+        records = list(records)
+        columns = {field: [record[field] for record in records] for field in self.fields}
+        columns['date'] = list(map(date_to_ordinal, columns['date']))
+        self.extend_columns(columns)
+
+    def extend_columns(self, columns):
+        """
+        Adds several records to the end of the ledger, given as one sequence of values per field
+
+        Args:
+            columns (dict): maps each field to its values, all of the same length, with
+                dates given as day numbers (see date_to_ordinal)
+        """
+        #encode every column first so a bad value can't leave the columns different lengths
+        encoded = {}
+        for field in self.fields:
+            values = columns[field]
+            if field == 'date':
+                encoded[field] = array('i', values)
+            elif field == 'amount':
+                encoded[field] = array(self.columns[field].typecode, values)
+            else:
+                encoded[field] = array('I', map(self.dictionaries[field].encode, values))
+        for field in self.fields:
+            self.columns[field].extend(encoded[field])
+
+    def column(self, field):
+        """
+        Gives direct access to the array holding one field, e.g. to sum amounts
+        or to wrap it with numpy.frombuffer without copying
+
+        Args:
+            field (str): name of the field
+
+        Returns:
+            array: the column (day numbers for dates, codes for text fields)
+        """
+        return self.columns[field]
+
+READ_ONLY_MESSAGE = "This data is a read-only memory-mapped snapshot and can't be changed."
+
+class MappedLedger(ColumnarLedger):
+    """
+    A read-only ColumnarLedger whose columns are memoryviews into a memory-mapped binary
+    snapshot. Records are in date order, so a date range is found by binary search on the
+    date column, and only the pages holding that range are ever read from disk.
+    """
+
+    def __init__(self, fields, columns=None, mapping=None):
+        """
+        Initializes the ledger
+
+        Args:
+            fields (tuple): names of the record fields, in order
+            columns (dict): the list's columns as returned by read_snapshot(copy=False);
+                without them the ledger is empty
+            mapping (mmap): the memory map the columns point into, kept open while the ledger exists
+        """
+        #ColumnarLedger.__init__ would extend the ledger, so the columns are set up here instead
+        mapped = ColumnarLedger(fields) if columns is None else ColumnarLedger.from_columns(fields, columns)
+        self.fields = fields
+        self.columns = mapped.columns
+        self.dictionaries = mapped.dictionaries
+        self.mapping = mapping
+
+    def append(self, record):
+        raise RuntimeError(READ_ONLY_MESSAGE)
+
+    def extend_columns(self, columns):
+        raise RuntimeError(READ_ONLY_MESSAGE)
+
+    def range_positions(self, start, end):
+        """
+        Finds the records dated between start and end (inclusive)
+
+        Args:
+            start (int): day number of the first date of the range (None for no limit)
+            end (int): day number of the last date of the range (None for no limit)
+
+        Returns:
+            range: positions of the matching records
+        """
+        dates = self.columns['date']
+        lo = 0 if start is None else bisect.bisect_left(dates, start)
+        hi = len(dates) if end is None else bisect.bisect_right(dates, end)
+        return range(lo, hi)
+
+    def total(self, start, end, signs=None):
+        """
+        Totals the amounts dated between start and end, reading only that part of the file
+
+        Args:
+            start (int): day number of the first date of the range (None for no limit)
+            end (int): day number of the last date of the range (None for no limit)
+            signs (dict): optional sign per category, applied to each amount
+
+        Returns:
+            float: the total
+        """
+        positions = self.range_positions(start, end)
+        amounts = self.columns['amount'][positions.start:positions.stop]
+        if signs is None:
+            return sum(amounts)
+        factors = [signs.get(category.lower(), 0) for category in self.dictionaries['category'].values]
+        codes = self.columns['category'][positions.start:positions.stop]
+        return sum(factors[code] * amount for code, amount in zip(codes, amounts))
+
+class DateIndex:
+    """
+    Keeps the positions of a list of records sorted by date, so a date range
+    can be found with a binary search instead of checking every record.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty index
+
+        Args:
+            keys: sorted list of record dates, as day numbers
+            positions: position of each record in its list, in the same order as keys
+        """
+        self.keys = []
+        self.positions = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, position):
+        """
+        Adds a record's date to the index
+
+        Args:
+            key (int): day number of the record's date
+            position (int): position of the record in its list
+        """
+        insert_in_order(self.keys, self.positions, key, position)
+
+    def extend(self, keys, start):
+        """
+        Adds the dates of a batch of records that were added to the end of the list
+
+        Args:
+            keys (list): day number of each new record's date, in list order
+            start (int): position of the first new record in its list
+        """
+        if not keys:
+            return
+        in_order = all(a <= b for a, b in zip(keys, itertools.islice(keys, 1, None)))
+        if in_order and (not self.keys or keys[0] >= self.keys[-1]):
+            #the usual case of a batch of later records, already in date order
+            self.keys.extend(keys)
+            self.positions.extend(range(start, start + len(keys)))
+            return
+        batch = sorted(zip(keys, range(start, start + len(keys))))
+        if not self.keys or batch[0][0] >= self.keys[-1]:
+            self.keys.extend(key for key, _ in batch)
+            self.positions.extend(position for _, position in batch)
+        else:
+            merged = list(heapq.merge(zip(self.keys, self.positions), batch))
+            self.keys = [key for key, _ in merged]
+            self.positions = [position for _, position in merged]
+
+    def rebuild(self, keys):
+        """
+        Replaces the index with one built from the given dates
+
+        Args:
+            keys (list): day number of every record's date, in list order
+        """
+        self.positions = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in self.positions]
+
+    def lookup(self, start, end):
+        """
+        Finds the records dated between start and end (inclusive)
+
+        Args:
+            start (int): day number of the first date of the range (None for no limit)
+            end (int): day number of the last date of the range (None for no limit)
+
+        Returns:
+            list: positions of the matching records, sorted by date
+        """
+        lo = 0 if start is None else bisect.bisect_left(self.keys, start)
+        hi = len(self.keys) if end is None else bisect.bisect_right(self.keys, end)
+        return self.positions[lo:hi]
+
+#a word is a run of letters and digits; a query word may end in * to match words starting with it
+WORD_PATTERN = re.compile(r'\w+')
+QUERY_PATTERN = re.compile(r'\w+\*?')
+
+@functools.lru_cache(maxsize=65536)
+def tokenize(text):
+    """
+    Splits text into the lowercase words a TextIndex finds it by. Descriptions repeat
+    a lot, so the cache means each distinct one is only split once.
+
+    Args:
+        text (str): text to split
+
+    Returns:
+        tuple: the distinct words, in the order they first appear
+    """
+    return tuple(dict.fromkeys(WORD_PATTERN.findall(str(text).lower())))
+
+def _intersect(small, large):
+    """
+    Finds the positions in both of two increasing sequences by binary searching the
+    larger one for each position of the smaller one
+
+    Args:
+        small (sequence): the shorter sequence of positions
+        large (sequence): the longer sequence of positions
+
+    Returns:
+        list: the positions in both, in increasing order
+    """
+    found = []
+    lo = 0
+    for position in small:
+        lo = bisect.bisect_left(large, position, lo)
+        if lo == len(large):
+            break
+        if large[lo] == position:
+            found.append(position)
+    return found
+
+class TextIndex:
+    """
+    Keeps, for every word of a text field, the positions of the records whose text
+    contains it (an inverted index), so records can be found by word without
+    reading every record.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty index
+
+        Args:
+            postings: maps each word to an array of the positions of the records containing it, in increasing order
+            words: sorted list of all the words, for prefix searches (None until one is needed)
+            count: number of records indexed
+        """
+        self.postings = {}
+        self.words = None
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, text, position):
+        """
+        Adds a record's text to the index
+
+        Args:
+            text (str): the record's text
+            position (int): position of the record in its list, after every record already indexed
+        """
+        for word in tokenize(text):
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = array('I')
+                self.words = None
+            posting.append(position)
+        self.count += 1
+
+    def extend(self, texts, start):
+        """
+        Adds the text of a batch of records that were added to the end of the list
+
+        Args:
+            texts (iterable): text of each new record, in list order
+            start (int): position of the first new record in its list
+        """
+        for position, text in enumerate(texts, start):
+            self.add(text, position)
+
+    def rebuild(self, texts):
+        """
+        Replaces the index with one built from the given text
+
+        Args:
+            texts (iterable): text of every record, in list order
+        """
+        self.postings = {}
+        self.words = None
+        self.count = 0
+        self.extend(texts, 0)
+
+    def matches(self, word):
+        """
+        Finds the records containing a word
+
+        Args:
+            word (str): lowercase word, or the start of a word followed by *
+
+        Returns:
+            sequence: positions of the matching records, in increasing order
+        """
+        if not word.endswith('*'):
+            return self.postings.get(word, ())
+        prefix = word[:-1]
+        if self.words is None:
+            self.words = sorted(self.postings)
+        postings = []
+        for i in range(bisect.bisect_left(self.words, prefix), len(self.words)):
+            if not self.words[i].startswith(prefix):
+                break
+            postings.append(self.postings[self.words[i]])
+        if len(postings) == 1:
+            return postings[0]
+        return sorted(set(itertools.chain.from_iterable(postings)))
+
+    def lookup(self, query):
+        """
+        Finds the records containing every word of a query
+
+        Args:
+            query (str): words to look for, in any case; a word ending in * matches every
+                word starting with it (ub* finds Uber)
+
+        Returns:
+            list: positions of the matching records, in increasing order (none for a query without words)
+        """
+        postings = sorted((self.matches(word) for word in QUERY_PATTERN.findall(query.lower())), key=len)
+        if not postings:
+            return []
+        #starting from the rarest word keeps every intersection small
+        found = postings[0]
+        for posting in postings[1:]:
+            if not found:
+                break
+            found = _intersect(found, posting)
+        return list(found)
+
+class JSONArrayStream:
+    """
+    Reads a JSON object such as Sample_Data.json a piece at a time, so the records
+    in its arrays can be handled one by one without loading the whole file.
+    """
+
+    def __init__(self, file, chunk_size=1 << 16, progress=None):
+        """
+        Initializes the stream
+
+        Args:
+            file: JSON file opened in binary mode
+            chunk_size (int): number of bytes read from the file at a time
+            progress (callable): called as progress(bytes_read, total_bytes) after
+                every chunk; total_bytes is None if the size of the file is unknown
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+        try:
+            self.total_bytes = os.fstat(file.fileno()).st_size
+        except (AttributeError, OSError):
+            self.total_bytes = None
+
+    def _read(self):
+        """
+        Reads the next chunk of the file into the buffer, dropping the part already parsed
+
+        Returns:
+            bool: False if the end of the file was reached
+        """
+        chunk = self.file.read(self.chunk_size)
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk, final=not chunk)
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+            return False
+        self.bytes_read += len(chunk)
+        if self.progress is not None:
+            self.progress(self.bytes_read, self.total_bytes)
+        return True
+
+    def _peek(self):
+        """
+        Skips whitespace and returns the next character, or '' at the end of the file
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ''
+
+    def _next_char(self, expected):
+        """
+        Consumes the next character, which must be one of the expected ones
+
+        Args:
+            expected (str): characters that are allowed here
+
+        Returns:
+            str: the character that was consumed
+        """
+        char = self._peek()
+        if not char or char not in expected:
+            found = repr(char) if char else 'end of file'
+            raise ValueError(f"Invalid JSON: expected one of {expected!r} but found {found}.")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        """
+        Decodes the next complete JSON value, reading more of the file as needed
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._read()
+                continue
+            if end == len(self.buffer) and not self.eof:
+                #a number at the end of the buffer might continue in the next chunk
+                self._read()
+                continue
+            self.pos = end
+            return value
+
+    def _items(self):
+        """
+        Yields the elements of the array whose '[' was just consumed
+        """
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._next_char(',]') == ']':
+                return
+
+    def sections(self):
+        """
+        Goes through the members of the top-level JSON object
+
+        Yields:
+            tuple: (key, value) for each member. Arrays are given as an iterator over
+            their elements, which must be used before moving on to the next member;
+            any other value is decoded whole.
+        """
+        self._next_char('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._next_char(':')
+            if self._peek() == '[':
+                self.pos += 1
+                items = self._items()
+                yield key, items
+                #skip whatever the caller did not read
+                for _ in items:
+                    pass
+            else:
+                yield key, self._value()
+            if self._next_char(',}') == '}':
+                return
+
+#number of records load_from_file(stream=True) adds at a time
+STREAM_BATCH_SIZE = 10000
+
+#extension of the log file that Finances.open_journal keeps next to the data file
+JOURNAL_SUFFIX = '.journal'
+
+class Journal:
+    """
+    Append-only log of the changes made to a Finances object since its data file was last written.
+    The log starts with a header entry [0, 'currency', code] giving the currency whose minor
+    units the logged amounts are in (null for floats); a log without one holds floats.
+    """
+
+    def __init__(self, file_name, seq=0, compact_every=1000, currency=None):
+        """
+        Opens the log for appending
+
+        Args:
+            file_name (str): log file
+            seq (int): number of the last change already logged or saved in the data file
+            compact_every (int): number of logged changes after which the data file should be rewritten
+            currency (str): currency whose minor units new changes' amounts are in (None for floats)
+        """
+        self.file_name = file_name
+        self.seq = seq
+        self.compact_every = compact_every
+        self.currency = currency
+        #currency of the amounts already in the log, from its header
+        self.file_currency = None
+        self.pending = 0
+        valid_length = 0
+        for valid_length, (_, kind, *values) in Journal.entries(file_name, header=True):
+            if kind == 'currency':
+                self.file_currency = values[0]
+            else:
+                self.pending += 1
+        self.file = open(file_name, 'ab')
+        #drop a change that was only partly written when the program stopped
+        self.file.truncate(valid_length)
+        if not valid_length:
+            self._write_header()
+
+    @staticmethod
+    def entries(file_name, header=False):
+        """
+        Reads the complete changes in a log, stopping at one that was only partly written
+
+        Args:
+            file_name (str): log file
+            header (bool): also yield the header entry, [0, 'currency', code]
+
+        Yields:
+            tuple: (end offset of the change in the file, [seq, kind, values...])
+        """
+        try:
+            file = open(file_name, 'rb')
+        except FileNotFoundError:
+            return
+        with file:
+            end = 0
+            for line in file:
+                if not line.endswith(b'\n'):
+                    return
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    return
+                end += len(line)
+                if header or entry[1] != 'currency':
+                    yield end, entry
+
+    @staticmethod
+    def last_seq(file_name):
+        """
+        Finds the number of the last complete change in a log
+
+        Args:
+            file_name (str): log file
+
+        Returns:
+            int: the change's number, or 0 if the log is empty or missing
+        """
+        seq = 0
+        for _, entry in Journal.entries(file_name):
+            seq = entry[0]
+        return seq
+
+    def _write_header(self):
+        """
+        Starts the log with the currency its amounts are in
+        """
+        self.file.write((json.dumps([0, 'currency', self.currency]) + '\n').encode('utf-8'))
+        self.file.flush()
+        self.file_currency = self.currency
+
+    def write(self, kind, values):
+        """
+        Appends one change to the log
+
+        Args:
+            kind (str): 'income', 'expenses', 'transactions' or 'investments'
+            values (list): the values passed to the add_* call
+        """
+        self.seq += 1
+        self.pending += 1
+        line = json.dumps([self.seq, kind, *values], separators=(',', ':')) + '\n'
+        self.file.write(line.encode('utf-8'))
+        #hand the change to the operating system right away so it survives the program crashing
+        self.file.flush()
+
+    def write_many(self, kind, rows):
+        """
+        Appends a batch of changes of one kind to the log with a single write
+
+        Args:
+            kind (str): 'income', 'expenses' or 'transactions'
+            rows (list): the values of each change
+        """
+        lines = []
+        for values in rows:
+            self.seq += 1
+            lines.append(json.dumps([self.seq, kind, *values], separators=(',', ':')) + '\n')
+        self.pending += len(lines)
+        self.file.write(''.join(lines).encode('utf-8'))
+        self.file.flush()
+
+    def sync(self):
+        """
+        Makes sure every logged change is on disk
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def reset(self):
+        """
+        Empties the log once its changes have been saved in the data file
+        """
+        self.file.truncate(0)
+        self._write_header()
+        self.pending = 0
+
+    def close(self):
+        """
+        Syncs and closes the log
+        """
+        self.sync()
+        self.file.close()
+
+#binary snapshot format written by save_to_file(binary=True): a header, then for each
+#dated list (in LEDGERS order) one section per field (in LEDGER_FIELDS order), then the
+#investments. Dates are int32 day numbers, amounts float64 (int64 minor units when the
+#SNAPSHOT_MINOR_UNITS flag is set, with the currency code in a last string table), and text fields a string table
+#followed by uint32 codes into it. Numbers are little-endian and every section starts on an
+#8-byte boundary so the columns can be used straight from a memory map.
+SNAPSHOT_MAGIC = b'FTSNAP\x00\x01'
+SNAPSHOT_VERSION = 2
+#magic, version, flags, crc32, length of everything after the header, then the number of
+#income, expense, transaction and investment records. Since version 2 the crc32 covers the
+#rest of the header as well as everything after it; version 1 only covered what follows.
+SNAPSHOT_HEADER = struct.Struct('<8sHHIQQQQQ')
+#offsets of the crc32 within the header
+SNAPSHOT_CHECKSUM_START = struct.calcsize('<8sHH')
+SNAPSHOT_CHECKSUM_END = struct.calcsize('<8sHHI')
+#flag set when the records of each list are stored in date order
+SNAPSHOT_SORTED = 1
+#flag set when amounts are whole minor units of a currency rather than floats
+SNAPSHOT_MINOR_UNITS = 2
+SNAPSHOT_TYPECODES = {'date': 'i', 'amount': 'd'}
+
+def _snapshot_array(typecode, values):
+    """
+    Makes an array of little-endian numbers ready to be written to a snapshot
+
+    Args:
+        typecode (str): array typecode
+        values (iterable): the numbers
+
+    Returns:
+        array: the numbers
+    """
+    values = values if isinstance(values, array) and values.typecode == typecode else array(typecode, values)
+    if sys.byteorder == 'big':
+        values = array(typecode, values)
+        values.byteswap()
+    return values
+
+def _string_table(strings):
+    """
+    Encodes a list of strings as a snapshot string table
+
+    Args:
+        strings (list): the strings, in code order
+
+    Returns:
+        bytes: the count, the (count + 1) end offsets into the text, then the UTF-8 text
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = _snapshot_array('Q', itertools.accumulate(map(len, encoded), initial=0))
+    return struct.pack('<Q', len(strings)) + offsets.tobytes() + b''.join(encoded)
+
+def write_snapshot(file_name, ledgers, investments, currency=None):
+    """
+    Writes a binary snapshot, replacing the file in one step once it is complete
+
+    Args:
+        file_name (str): file to write
+        ledgers (dict): for each dated list, a dict mapping each field to its values in
+            date order: an array (or sequence) of numbers for date and amount, and a
+            (strings, codes) pair for text fields
+        investments (dict): maps each asset to its amount
+        currency (str): if the amounts are whole minor units, the currency they are in
+    """
+    typecodes = dict(SNAPSHOT_TYPECODES, amount='q' if currency else 'd')
+    flags = SNAPSHOT_SORTED | (SNAPSHOT_MINOR_UNITS if currency else 0)
+    counts = [len(ledgers[ledger]['date']) for ledger in LEDGERS]
+    sections = []
+    for ledger in LEDGERS:
+        for field in LEDGER_FIELDS[ledger]:
+            if field in typecodes:
+                sections.append(_snapshot_array(typecodes[field], ledgers[ledger][field]))
+            else:
+                strings, codes = ledgers[ledger][field]
+                sections.append(_string_table(strings))
+                sections.append(_snapshot_array('I', codes))
+    sections.append(_string_table(list(investments)))
+    sections.append(_snapshot_array(typecodes['amount'], investments.values()))
+    if currency:
+        sections.append(_string_table([currency]))
+
+    sections = [memoryview(section).cast('B') for section in sections]
+    length = sum(len(data) + -len(data) % 8 for data in sections)
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, 0, length, *counts, len(investments))
+    checksum = zlib.crc32(header[SNAPSHOT_CHECKSUM_END:], zlib.crc32(header[:SNAPSHOT_CHECKSUM_START]))
+
+    temp_name = file_name + '.tmp'
+    with open(temp_name, 'wb') as file:
+        file.write(bytes(SNAPSHOT_HEADER.size))
+        for data in sections:
+            padding = bytes(-len(data) % 8)
+            checksum = zlib.crc32(padding, zlib.crc32(data, checksum))
+            file.write(data)
+            file.write(padding)
+        file.seek(0)
+        file.write(header[:SNAPSHOT_CHECKSUM_START] + struct.pack('<I', checksum) + header[SNAPSHOT_CHECKSUM_END:])
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_name, file_name)
+
+def is_snapshot(file_name):
+    """
+    Checks whether a file is a binary snapshot rather than JSON
+
+    Args:
+        file_name (str): file to check
+
+    Returns:
+        bool: True if the file starts with the snapshot magic bytes
+    """
+    with open(file_name, 'rb') as file:
+        return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+def read_snapshot(buffer, copy=True, verify=True):
+    """
+    Reads a binary snapshot without creating a Python object per record
+
+    Args:
+        buffer: the snapshot's bytes (e.g. a bytes object or an mmap)
+        copy (bool): if True, numeric columns are copied into arrays; if False they are
+            memoryviews into buffer, so nothing is read from disk until it is used
+        verify (bool): check the checksum (this reads the whole buffer)
+
+    Returns:
+        tuple: (flags, ledgers, investments, currency), where ledgers maps each dated list
+        to a dict of its fields in the same form write_snapshot takes, investments maps each
+        asset to its amount, and currency is the currency of amounts kept in minor units
+        (None for float amounts)
+
+    Raises:
+        ValueError: if the buffer is not a valid snapshot
+    """
+    view = memoryview(buffer)
+    if len(view) < SNAPSHOT_HEADER.size:
+        raise ValueError("File is too short to be a snapshot.")
+    magic, version, flags, checksum, length, *counts = SNAPSHOT_HEADER.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("File is not a snapshot.")
+    if version not in (1, SNAPSHOT_VERSION):
+        raise ValueError(f"Unsupported snapshot version {version}.")
+    body = view[SNAPSHOT_HEADER.size:]
+    if len(body) != length:
+        raise ValueError("Snapshot is truncated.")
+    if verify:
+        expected = 0
+        if version >= 2:
+            expected = zlib.crc32(view[:SNAPSHOT_CHECKSUM_START])
+            expected = zlib.crc32(view[SNAPSHOT_CHECKSUM_END:SNAPSHOT_HEADER.size], expected)
+        if zlib.crc32(body, expected) != checksum:
+            raise ValueError("Snapshot checksum does not match; the file is damaged.")
+    if not copy and sys.byteorder == 'big':
+        copy = True
+    offset = 0
+
+    def take(size):
+        nonlocal offset
+        if offset + size > len(body):
+            raise ValueError("Snapshot record counts do not match its contents; the file is damaged.")
+        data = body[offset:offset + size]
+        offset += size + (-size % 8)
+        return data
+
+    def numbers(typecode, count):
+        data = take(array(typecode).itemsize * count)
+        if not copy:
+            return data.cast(typecode)
+        values = array(typecode)
+        values.frombytes(data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    def strings():
+        count = struct.unpack('<Q', take(8))[0]
+        ends = numbers('Q', count + 1)
+        text = bytes(take(ends[-1]))
+        return [text[ends[i]:ends[i + 1]].decode('utf-8') for i in range(count)]
+
+    typecodes = dict(SNAPSHOT_TYPECODES, amount='q' if flags & SNAPSHOT_MINOR_UNITS else 'd')
+    ledgers = {}
+    for ledger, count in zip(LEDGERS, counts):
+        ledgers[ledger] = {}
+        for field in LEDGER_FIELDS[ledger]:
+            if field in typecodes:
+                ledgers[ledger][field] = numbers(typecodes[field], count)
+            else:
+                table = strings()
+                ledgers[ledger][field] = (table, numbers('I', count))
+    assets = strings()
+    investments = dict(zip(assets, numbers(typecodes['amount'], counts[3])))
+    currency = strings()[0] if flags & SNAPSHOT_MINOR_UNITS else None
+    if offset != len(body):
+        raise ValueError("Snapshot record counts do not match its contents; the file is damaged.")
+    return flags, ledgers, investments, currency
+
+#key of each dated list in the reports built by Finances.build_report
+REPORT_SECTIONS = {'income': 'Income', 'expenses': 'Expenses', 'transactions': 'Transactions'}
+
+class MaterializedReport:
+    """
+    A report for a fixed date window that its Finances keeps up to date as records are
+    added, so a dashboard can read it at any time without rebuilding it. Each new record
+    costs a date check, plus an append (or, for an earlier date, an insert) when it falls
+    in the window. Create one with Finances.materialize.
+    """
+
+    def __init__(self, finances, start_date, end_date):
+        """
+        Initializes the report with the records already in the window
+
+        Args:
+            finances (Finances): data the report is kept from
+            start_date (str): start date of the window
+            end_date (str): end date of the window
+            report: the report, in the same form as build_report's, kept in date order
+            totals: total of each dated list in the window (see Finances.total)
+            version: number that goes up every time the report changes
+            subscribers: functions called as callback(report, ledger, records) with the
+                records added to the window
+        """
+        self.finances = finances
+        self.start_date = start_date
+        self.end_date = end_date
+        self.start = date_to_ordinal(start_date)
+        self.end = date_to_ordinal(end_date)
+        self.version = 0
+        self.subscribers = []
+        self.refresh()
+
+    def refresh(self):
+        """
+        Rebuilds the report from scratch, e.g. after the data was loaded or changed without going through add_*
+        """
+        #a report of its own, as the one build_report returns may be shared through the report cache
+        self.report = self.finances._build_report(self.start_date, self.end_date)
+        self.days = {ledger: [date_to_ordinal(record['date']) for record in self.report[REPORT_SECTIONS[ledger]]]
+                     for ledger in LEDGERS}
+        self.totals = {ledger: self.finances.total(ledger, self.start_date, self.end_date) for ledger in LEDGERS}
+        self.version += 1
+
+    def net_cash_flow(self):
+        """
+        Finds total income minus total expenses in the window
+
+        Returns:
+            float: net cash flow for the window
+        """
+        return self.totals['income'] - self.totals['expenses']
+
+    def add(self, ledger, days, records):
+        """
+        Adds the records of the window from a batch of new records and tells the subscribers
+
+        Args:
+            ledger (str): name of the list the records were added to
+            days (list): day number of each record's date
+            records (list): the new records
+        """
+        section = self.report[REPORT_SECTIONS[ledger]]
+        section_days = self.days[ledger]
+        added = []
+        for day, record in zip(days, records):
+            if not self.start <= day <= self.end:
+                continue
+            insert_in_order(section_days, section, day, record)
+            self.totals[ledger] += self.finances._total_amount(ledger, record)
+            added.append(record)
+        if added:
+            self.version += 1
+            for callback in self.subscribers:
+                callback(self, ledger, added)
+
+    def subscribe(self, callback):
+        """
+        Calls a function every time records are added to the window
+
+        Args:
+            callback (callable): called as callback(report, ledger, records)
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Stops calling a function added with subscribe
+
+        Args:
+            callback (callable): the function
+        """
+        self.subscribers.remove(callback)
+
+    def close(self):
+        """
+        Stops keeping the report up to date
+        """
+        if self in self.finances.reports:
+            self.finances.reports.remove(self)
+
+class ReportCache:
+    """
+    Keeps the reports Finances.build_report built most recently, keyed by date window,
+    so asking for the same month or year again does not scan the lists again. A cached
+    report is dropped as soon as a record is added inside its window.
+    """
+
+    def __init__(self, maxsize=32):
+        """
+        Initializes the cache
+
+        Args:
+            maxsize (int): number of reports kept; the least recently used is dropped first
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, window):
+        """
+        Finds the cached report for a date window
+
+        Args:
+            window (tuple): (start, end) day numbers of the window
+
+        Returns:
+            dict: the report, or None if it is not cached
+        """
+        report = self.entries.get(window)
+        if report is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(window)
+        self.hits += 1
+        return report
+
+    def put(self, window, report):
+        """
+        Stores the report for a date window
+
+        Args:
+            window (tuple): (start, end) day numbers of the window
+            report (dict): the report
+        """
+        self.entries[window] = report
+        self.entries.move_to_end(window)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, days):
+        """
+        Drops the reports whose window contains any of the given dates
+
+        Args:
+            days (iterable): day numbers of the dates of new records
+        """
+        days = sorted(set(days))
+        for start, end in list(self.entries):
+            i = bisect.bisect_left(days, start)
+            if i < len(days) and days[i] <= end:
+                del self.entries[start, end]
+                self.invalidations += 1
+
+    def invalidate_all(self):
+        """
+        Drops every report, e.g. after the lists were replaced
+        """
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+
+    def clear(self):
+        """
+        Removes all reports and resets the counters
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def info(self):
+        """
+        Reports how well the cache is working
+
+        Returns:
+            dict: hits, misses, hit_rate (hits per lookup), invalidations (reports dropped
+            because of new data), size (reports stored) and maxsize
+        """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+def _ledger_property(ledger):
+    """
+    Makes the Finances attribute for one of the dated lists. Assigning a new list to it
+    rebuilds the list's date index, daily totals and category codes.
+
+    Args:
+        ledger (str): name of the list ('income', 'expenses' or 'transactions')
+
+    Returns:
+        property: the attribute
+    """
+    def get(self):
+        return self._ledgers[ledger]
+
+    def set(self, records):
+        self._ledgers[ledger] = records
+        self._reindex(ledger)
+
+    return property(get, set, doc=f"The {ledger} records, in the order they were added.")
+
 class Finances:
     """
-    Creates a class that holds the user's financial data.
+    Creates a class that holds the user's financial data.
+    """
+
+    income = _ledger_property('income')
+    expenses = _ledger_property('expenses')
+    transactions = _ledger_property('transactions')
+    
+    def __init__(self, storage='list', currency=None, report_cache_size=0):
+        """
+        Initializes user's finances
+        
+        Args:
+            storage (str): 'list' to keep each record as a dict, 'columnar' to keep
+                the records in a ColumnarLedger, which uses far less memory for large data,
+                or 'mapped' for read-only reporting straight from a binary snapshot file:
+                load_from_file memory maps the snapshot instead of reading it, so reports
+                only read the part of the file they need and processes share one copy
+            currency (str): if given, amounts are kept as whole minor units of this currency
+                (e.g. cents for 'USD', see MINOR_UNITS) instead of floats, so totals are exact.
+                add_* and extend_* still take amounts in the main unit (19.99), while records,
+                totals and aggregates give them in minor units (1999); see from_minor_units
+            report_cache_size (int): if not 0, build_report keeps this many recent reports in a
+                ReportCache (see report_cache.info() for its hit rate). Cached reports are shared
+                between calls, so they must not be changed by the caller.
+            income: list of income sources
+            expenses: list of expenses
+            savings: list of different investments/savings accounts, etc.
+        """
+        if storage not in ('list', 'columnar', 'mapped'):
+            raise ValueError(f"Unknown storage '{storage}'. Please use 'list', 'columnar' or 'mapped'.")
+        self.storage = storage
+        self.currency = currency
+        self._ledgers = {ledger: self._new_ledger(ledger) for ledger in LEDGERS}
+        self.investments = {}
+        self._date_index = {ledger: DateIndex() for ledger in LEDGERS}
+        self._daily_totals = {ledger: DailyTotals() for ledger in LEDGERS}
+        #built by the first search, then kept up to date as transactions are added
+        self._text_index = None
+        #list storage keeps the code of each record's category here (see categories)
+        self._categories = {ledger: StringDictionary() for ledger in LEDGERS}
+        self._category_codes = {ledger: array('I') for ledger in LEDGERS}
+        self.journal = None
+        self.journal_file = None
+        self.journal_seq = 0
+        self.reports = []
+        self.report_cache = ReportCache(report_cache_size) if report_cache_size else None
+
+    def _new_ledger(self, ledger, records=()):
+        """
+        Creates the storage for one of the dated lists
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            records (iterable): records (dicts) to start with
+
+        Returns:
+            list or ColumnarLedger: the new list, depending on the storage option
+        """
+        if self.storage == 'columnar':
+            return ColumnarLedger(LEDGER_FIELDS[ledger], records, self._amount_typecode())
+        if self.storage == 'mapped':
+            if records:
+                raise RuntimeError(READ_ONLY_MESSAGE)
+            return MappedLedger(LEDGER_FIELDS[ledger])
+        return list(records)
+
+    def _amount_typecode(self):
+        """
+        Finds the array typecode amounts are kept in
+
+        Returns:
+            str: 'q' for whole minor units, 'd' for floats
+        """
+        return 'q' if self.currency else 'd'
+
+    def _stored_amount(self, amount):
+        """
+        Converts an amount given in its currency's main unit into the form amounts are kept in
+
+        Args:
+            amount (float): the amount
+
+        Returns:
+            float or int: the amount as given, or in whole minor units of self.currency
+        """
+        return amount if self.currency is None else to_minor_units(amount, self.currency)
+
+    def _stored_amounts(self, amounts, currency=None):
+        """
+        Converts amounts read from a file or passed to extend_* into the form amounts are kept in
+
+        Args:
+            amounts (list): the amounts
+            currency (str): currency whose minor units the amounts are in, or None if they
+                are floats in the main unit
+
+        Returns:
+            list: the converted amounts
+
+        Raises:
+            ValueError: if the amounts are minor units of a different currency than self.currency
+        """
+        if currency == self.currency:
+            return amounts
+        if currency is None:
+            return [to_minor_units(amount, self.currency) for amount in amounts]
+        if self.currency is None:
+            return [from_minor_units(amount, currency) for amount in amounts]
+        raise ValueError(f"The amounts are in {currency} but these finances are kept in {self.currency}.")
+
+    def _append(self, ledger, record):
+        """
+        Adds a record to one of the dated lists and keeps its date index up to date.
+        The record's date is rewritten in YYYY-MM-DD form (see normalize_date).
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            record (dict): record to add
+
+        Raises:
+            ValueError: if the record's date is not a valid date
+        """
+        day = date_to_ordinal(record['date'])
+        record['date'] = ordinal_to_date(day)
+        records = self._ledgers[ledger]
+        #checking for a list is much faster than checking for a ColumnarLedger, which is a Sequence
+        if isinstance(records, list):
+            field = CATEGORY_FIELDS[ledger]
+            if len(self._category_codes[ledger]) != len(records):
+                self._encode_categories(ledger)
+            dictionary = self._categories[ledger]
+            code = dictionary.encode(record[field])
+            #the record shares the dictionary's copy of the string, so each category is only stored once
+            record[field] = dictionary.values[code]
+            self._category_codes[ledger].append(code)
+        records.append(record)
+        self._date_index[ledger].add(day, len(records) - 1)
+        self._daily_totals[ledger].add(day, self._total_amount(ledger, record))
+        if ledger == 'transactions' and self._text_index is not None:
+            self._text_index.add(record['description'], len(records) - 1)
+        for report in self.reports:
+            report.add(ledger, (day,), (record,))
+        if self.report_cache is not None:
+            self.report_cache.invalidate((day,))
+        if self.journal is not None:
+            self._log(ledger, [record[field] for field in LEDGER_FIELDS[ledger]])
+
+    def _log(self, kind, values):
+        """
+        Writes a change to the journal, rewriting the data file when enough changes have built up
+
+        Args:
+            kind (str): 'income', 'expenses', 'transactions' or 'investments'
+            values (list): the values passed to the add_* call
+        """
+        self.journal.write(kind, values)
+        if self.journal.pending >= self.journal.compact_every:
+            self.compact()
+
+    def _batch_columns(self, ledger, rows, currency=None):
+        """
+        Checks a batch of records for one of the dated lists and arranges it by field
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            rows: either a dict mapping each field to a sequence of values (e.g. lists,
+                arrays or numpy arrays), or an iterable of records that are either all
+                tuples in the same order as the add_* arguments or all dicts
+            currency (str): currency whose minor units the amounts are in, if they are not
+                in the main unit (see _stored_amounts)
+
+        Returns:
+            dict: maps each field to a list of its values, with dates as day numbers
+
+        Raises:
+            ValueError: if any record is incomplete or has a value of the wrong type
+        """
+        fields = LEDGER_FIELDS[ledger]
+        if isinstance(rows, Mapping):
+            missing = [field for field in fields if field not in rows]
+            if missing:
+                raise ValueError(f"Missing columns for {ledger}: {', '.join(missing)}.")
+            #tolist turns numpy and array values into plain Python numbers
+            columns = {field: rows[field].tolist() if hasattr(rows[field], 'tolist') else list(rows[field])
+                       for field in fields}
+            lengths = {len(values) for values in columns.values()}
+            if len(lengths) > 1:
+                raise ValueError(f"The columns for {ledger} have different lengths.")
+        else:
+            rows = list(rows)
+            if rows and isinstance(rows[0], Mapping):
+                columns = {field: [row.get(field) for row in rows] for field in fields}
+            else:
+                for i, row in enumerate(rows):
+                    if len(row) != len(fields):
+                        raise ValueError(f"Record {i} of {ledger} has {len(row)} values instead of {len(fields)}.")
+                columns = {field: list(values) for field, values in zip(fields, zip(*rows))} if rows \
+                    else {field: [] for field in fields}
+
+        for field in fields:
+            values = columns[field]
+            if field == 'amount':
+                is_valid = lambda value: isinstance(value, numbers.Real) and not isinstance(value, bool)
+                #checking the exact type first is much faster for the usual plain numbers
+                if all(type(value) is float or type(value) is int or is_valid(value) for value in values):
+                    columns[field] = self._stored_amounts(values, currency)
+                    continue
+            elif field == 'date':
+                #there are far fewer distinct dates than records, so parse each one once
+                is_valid = valid_date
+                try:
+                    days = {value: date_to_ordinal(value) for value in set(values)}
+                    columns[field] = [days[value] for value in values]
+                    continue
+                except (TypeError, ValueError):
+                    pass
+            else:
+                is_valid = lambda value: isinstance(value, str)
+                if all(type(value) is str for value in values):
+                    continue
+            i = next(i for i, value in enumerate(values) if not is_valid(value))
+            raise ValueError(f"Record {i} of {ledger} has an invalid {field}: {values[i]!r}.")
+        return columns
+
+    def _extend(self, ledger, rows, currency=None):
+        """
+        Adds a batch of records to one of the dated lists, updating the date index,
+        daily totals and journal once for the whole batch
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            rows: records to add (see _batch_columns)
+            currency (str): currency whose minor units the amounts are in, if they are not
+                in the main unit (see _stored_amounts)
+
+        Returns:
+            int: number of records added
+        """
+        fields = LEDGER_FIELDS[ledger]
+        if not isinstance(rows, Mapping):
+            rows = list(rows)
+        columns = self._batch_columns(ledger, rows, currency)
+        count = len(columns['date'])
+        if not count:
+            return 0
+        self._check_index(ledger)
+        records = self._ledgers[ledger]
+        start = len(records)
+        category = CATEGORY_FIELDS[ledger]
+        if isinstance(records, ColumnarLedger):
+            records.extend_columns(columns)
+            codes = records.column(category)[start:]
+        else:
+            dictionary = self.categories(ledger)
+            codes = array('I', map(dictionary.encode, columns[category]))
+            #the records share the dictionary's copy of each category string
+            columns[category] = list(map(dictionary.values.__getitem__, codes))
+            #new dicts with only the list's fields, as add_* makes, so the caller's dicts are never
+            #shared or changed and list storage keeps the same fields as columnar storage
+            values = dict(columns, date=list(map(ordinal_to_date, columns['date'])))
+            records.extend([dict(zip(fields, row)) for row in zip(*(values[field] for field in fields))])
+            self._category_codes[ledger].extend(codes)
+
+        dates = columns['date']
+        amounts = self._signed_amounts(ledger, codes, columns['amount'])
+        self._date_index[ledger].extend(dates, start)
+        self._daily_totals[ledger].extend(dates, amounts)
+        if ledger == 'transactions' and self._text_index is not None:
+            self._text_index.extend(columns['description'], start)
+        if self.reports:
+            added = [records[i] for i in range(start, start + count)]
+            for report in self.reports:
+                report.add(ledger, dates, added)
+        if self.report_cache is not None:
+            self.report_cache.invalidate(dates)
+        if self.journal is not None:
+            values = dict(columns, date=list(map(ordinal_to_date, columns['date'])))
+            self.journal.write_many(ledger, list(zip(*(values[field] for field in fields))))
+            if self.journal.pending >= self.journal.compact_every:
+                self.compact()
+        return count
+
+    def _total_amount(self, ledger, record):
+        """
+        Finds how much a record adds to its list's totals; transactions are signed by
+        category using TRANSACTION_SIGNS
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            record (dict): the record
+
+        Returns:
+            float: the amount to add
+        """
+        if ledger == 'transactions':
+            return TRANSACTION_SIGNS.get(str(record['category']).lower(), 0) * record['amount']
+        return record['amount']
+
+    def reindex(self, ledger=None):
+        """
+        Rebuilds the date index, daily totals and category codes of the dated lists, and the
+        reports built from them. add_*, extend_*, loading and assigning a new list
+        (finances.income = [...]) keep these up to date, and records appended to a list
+        directly are noticed, but records changed in place (record['date'] = ...) are not,
+        so call this after changing them.
+
+        Args:
+            ledger (str): list to rebuild ('income', 'expenses' or 'transactions'; default: all of them)
+        """
+        for name in LEDGERS if ledger is None else (ledger,):
+            self._reindex(name)
+
+    def _reindex(self, ledger):
+        """
+        Rebuilds the date index and daily totals of one of the dated lists from scratch
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+        """
+        records = self._ledgers[ledger]
+        if isinstance(records, MappedLedger):
+            #mapped lists can't change and are already in date order, so they have no index
+            return
+        if isinstance(records, ColumnarLedger):
+            dates = records.column('date')
+            amounts = records.column('amount')
+        else:
+            dates = [date_to_ordinal(record['date']) for record in records]
+            amounts = [record['amount'] for record in records]
+            self._encode_categories(ledger)
+        if self.report_cache is not None:
+            #the list was replaced or changed directly, so there is no telling which reports changed
+            self.report_cache.invalidate_all()
+        if ledger == 'transactions':
+            #rebuilt by the next search
+            self._text_index = None
+        self._date_index[ledger].rebuild(dates)
+        self._daily_totals[ledger].rebuild(dates, self._signed_amounts(ledger, self.category_codes(ledger), amounts))
+        for report in self.reports:
+            report.refresh()
+
+    def _encode_categories(self, ledger):
+        """
+        Rebuilds the category dictionary and codes of a list kept as dicts from scratch
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+        """
+        field = CATEGORY_FIELDS[ledger]
+        dictionary = self._categories[ledger] = StringDictionary()
+        codes = self._category_codes[ledger] = array('I')
+        for record in self._ledgers[ledger]:
+            code = dictionary.encode(record[field])
+            record[field] = dictionary.values[code]
+            codes.append(code)
+
+    def _signed_amounts(self, ledger, codes, amounts):
+        """
+        Finds how much each of a batch of records adds to its list's totals (see _total_amount),
+        looking up the sign of each transaction category once instead of once per record
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            codes (sequence): category code of each record (see category_codes)
+            amounts (sequence): amount of each record
+
+        Returns:
+            sequence: the amounts to add
+        """
+        if ledger != 'transactions':
+            return amounts
+        factors = [TRANSACTION_SIGNS.get(str(category).lower(), 0) for category in self.categories(ledger).values]
+        return [factors[code] * amount for code, amount in zip(codes, amounts)]
+
+    def categories(self, ledger):
+        """
+        Gives the dictionary the categories of a dated list (sources for income) are encoded
+        with. Each distinct category is stored once and records refer to it by a small code,
+        so filters can compare codes instead of strings (see category_codes).
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+
+        Returns:
+            StringDictionary: its values list every distinct category, at the position of its code
+        """
+        records = self._ledgers[ledger]
+        if not isinstance(records, list):
+            return records.dictionaries[CATEGORY_FIELDS[ledger]]
+        if len(self._category_codes[ledger]) != len(records):
+            #the list was replaced or changed directly
+            self._encode_categories(ledger)
+        return self._categories[ledger]
+
+    def category_codes(self, ledger):
+        """
+        Gives the category code of every record of a dated list (see categories)
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+
+        Returns:
+            array: the codes, in list order
+        """
+        records = self._ledgers[ledger]
+        if not isinstance(records, list):
+            return records.column(CATEGORY_FIELDS[ledger])
+        self.categories(ledger)
+        return self._category_codes[ledger]
+
+    def _check_index(self, ledger):
+        """
+        Rebuilds the date index and daily totals of a list that was changed without going through add_*
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+        """
+        records = self._ledgers[ledger]
+        #mapped lists can't change and are already in date order, so they have no index
+        if len(self._date_index[ledger]) != len(records) and not isinstance(records, MappedLedger):
+            self._reindex(ledger)
+
+    def _positions(self, ledger, start_date=None, end_date=None):
+        """
+        Finds the positions of the records of a dated list that fall between two dates
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            start_date (str): start date of the range (None for no limit)
+            end_date (str): end date of the range (None for no limit)
+
+        Returns:
+            list or range: positions of the matching records, sorted by date
+        """
+        start = None if start_date is None else date_to_ordinal(start_date)
+        end = None if end_date is None else date_to_ordinal(end_date)
+        records = self._ledgers[ledger]
+        if isinstance(records, MappedLedger):
+            #mapped records are already in date order, so they need no index
+            return records.range_positions(start, end)
+        self._check_index(ledger)
+        return self._date_index[ledger].lookup(start, end)
+
+    def _in_range(self, ledger, start_date, end_date):
+        """
+        Finds the records of a dated list that fall between two dates
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            start_date (str): start date of the range
+            end_date (str): end date of the range
+
+        Returns:
+            list: matching records, sorted by date
+        """
+        records = self._ledgers[ledger]
+        return [records[i] for i in self._positions(ledger, start_date, end_date)]
+        
+    def add_income(self, source, amount, date):
+        """
+        Adds a new income source to the system
+        
+        Args:
+            source (str): represents the name of the income source(job, etc.)
+            amount (float): $ amount of the income source
+            date (str): date associated with the income source
+        """
+        self._append('income', {'source': source, 'amount': self._stored_amount(amount), 'date': date})
+            
+    def add_expense(self, category, amount, date):
+        """
+        Adds a new expense category to the system
+        
+        Args:
+            category (str): represents the name of the expense category
+            amount (float): monetary amount of the expense category
+            date (str): date associated with the expense category
+        """
+        self._append('expenses', {'category': category, 'amount': self._stored_amount(amount), 'date': date})
+            
+    def add_transaction(self, date, category, amount, description):
+        """
+        Adds a new transaction to the system
+        
+        Args:
+            date (str): date of the transaction
+            category (str): category of the transaction (income, expense, savings)
+            amount (float): monetary amount of the transaction
+            description (str): description of the transaction
+        """
+        self._append('transactions', {'date': date, 'category': category, 'amount': self._stored_amount(amount),
+                                      'description': description})
+        
+    def extend_income(self, rows):
+        """
+        Adds many income records at once. The whole batch is checked before anything is
+        added, and the date index, totals and journal are updated once per batch.
+
+        Args:
+            rows: (source, amount, date) tuples, dicts, or a dict of columns
+                {'source': [...], 'amount': [...], 'date': [...]}
+
+        Returns:
+            int: number of records added
+        """
+        return self._extend('income', rows)
+
+    def extend_expenses(self, rows):
+        """
+        Adds many expense records at once (see extend_income)
+
+        Args:
+            rows: (category, amount, date) tuples, dicts, or a dict of columns
+
+        Returns:
+            int: number of records added
+        """
+        return self._extend('expenses', rows)
+
+    def extend_transactions(self, rows):
+        """
+        Adds many transactions at once (see extend_income)
+
+        Args:
+            rows: (date, category, amount, description) tuples, dicts, or a dict of columns
+
+        Returns:
+            int: number of records added
+        """
+        return self._extend('transactions', rows)
+
+    def add_investment(self, asset, amount):
+        """
+        Adds a new asset/investment to the portfolio
+        
+        Args:
+            asset (str): name of the asset
+            amount (float): monetary cost of the asset
+        """
+        if self.storage == 'mapped':
+            raise RuntimeError(READ_ONLY_MESSAGE)
+        amount = self._stored_amount(amount)
+        self.investments[asset] = amount
+        if self.journal is not None:
+            self._log('investments', [asset, amount])
+        
+    def total(self, ledger, start_date, end_date):
+        """
+        Totals the amounts of a dated list between two dates using its daily running
+        totals, without going through the records. Transactions are signed by category
+        (income adds, expense and savings subtract).
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            start_date (str): start date of the period
+            end_date (str): end date of the period
+
+        Returns:
+            float: total of the amounts dated in the period
+        """
+        start, end = date_to_ordinal(start_date), date_to_ordinal(end_date)
+        records = self._ledgers[ledger]
+        if isinstance(records, MappedLedger):
+            return records.total(start, end, TRANSACTION_SIGNS if ledger == 'transactions' else None)
+        self._check_index(ledger)
+        return self._daily_totals[ledger].total(start, end)
+
+    def net_cash_flow(self, start_date, end_date):
+        """
+        Finds total income minus total expenses between two dates
+
+        Args:
+            start_date (str): start date of the period
+            end_date (str): end date of the period
+
+        Returns:
+            float: net cash flow for the period
+        """
+        return self.total('income', start_date, end_date) - self.total('expenses', start_date, end_date)
+
+    def aggregate(self, ledger, by, start_date=None, end_date=None, method='hash'):
+        """
+        Computes the sum, count, mean, min and max of the amounts in a dated list,
+        grouped by a text field or by calendar period
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            by (str): a text field of the records ('source' for income, 'category' for
+                expenses and transactions) or 'day', 'week', 'month' or 'year'
+            start_date (str): only include records from this date on (optional)
+            end_date (str): only include records up to this date (optional)
+            method (str): 'hash' (best for few distinct groups) or 'sort' (best for many),
+                see group_by
+
+        Returns:
+            dict: maps each group, in sorted order, to a dict of sum, count, mean, min and max
+        """
+        fields = LEDGER_FIELDS[ledger]
+        if by not in DATE_BUCKETS and (by not in fields or by in ('date', 'amount')):
+            raise ValueError(f"Cannot group {ledger} by '{by}'.")
+        records = self._ledgers[ledger]
+        if start_date is not None or end_date is not None:
+            positions = self._positions(ledger, start_date, end_date)
+        else:
+            positions = range(len(records))
+
+        if isinstance(records, ColumnarLedger):
+            #read the columns directly and only turn codes back into text once per group
+            column = records.column('date' if by in DATE_BUCKETS else by)
+            amounts = records.column('amount')
+            if by in DATE_BUCKETS:
+                bucket = DATE_BUCKETS[by]
+                keys = (bucket(column[i]) for i in positions)
+            else:
+                keys = (column[i] for i in positions)
+            groups = group_by(keys, (amounts[i] for i in positions), method)
+            if by not in DATE_BUCKETS:
+                values = records.dictionaries[by].values
+                groups = dict(sorted((values[code], group) for code, group in groups.items()))
+            return groups
+
+        if by in DATE_BUCKETS:
+            bucket = DATE_BUCKETS[by]
+            keys = (bucket(date_to_ordinal(records[i]['date'])) for i in positions)
+        elif by == CATEGORY_FIELDS[ledger]:
+            #group by the category codes and only turn them back into text once per group
+            codes = self.category_codes(ledger)
+            groups = group_by((codes[i] for i in positions), (records[i]['amount'] for i in positions), method)
+            values = self.categories(ledger).values
+            return dict(sorted((values[code], group) for code, group in groups.items()))
+        else:
+            keys = (records[i][by] for i in positions)
+        return group_by(keys, (records[i]['amount'] for i in positions), method)
+
+    def select(self, ledger, categories, start_date=None, end_date=None):
+        """
+        Finds the records of a dated list in some categories (sources for income). The
+        categories are looked up in the category dictionary once, and each record is
+        checked by comparing its category code instead of its text.
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            categories (str or iterable): category to keep, or several; they must match exactly
+            start_date (str): only include records from this date on (optional)
+            end_date (str): only include records up to this date (optional)
+
+        Returns:
+            list: matching records, sorted by date
+        """
+        if isinstance(categories, str):
+            categories = (categories,)
+        code_of = self.categories(ledger).codes
+        wanted = {code_of[category] for category in categories if category in code_of}
+        if not wanted:
+            return []
+        codes = self.category_codes(ledger)
+        records = self._ledgers[ledger]
+        return [records[i] for i in self._positions(ledger, start_date, end_date) if codes[i] in wanted]
+
+    def search(self, query, start_date=None, end_date=None):
+        """
+        Finds the transactions whose description contains every word of a query, using
+        an index of the words in the descriptions instead of reading every transaction
+
+        Args:
+            query (str): words to look for, in any case; a word ending in * matches every
+                word starting with it (ub* finds Uber)
+            start_date (str): start date of the range (None for no limit)
+            end_date (str): end date of the range (None for no limit)
+
+        Returns:
+            list: matching transactions, sorted by date
+        """
+        records = self.transactions
+        return [records[i] for i in self._search_positions(query, start_date, end_date)]
+
+    def _search_positions(self, query, start_date=None, end_date=None):
+        """
+        Finds the positions of the transactions matching a search (see search)
+
+        Args:
+            query (str): words to look for
+            start_date (str): start date of the range (None for no limit)
+            end_date (str): end date of the range (None for no limit)
+
+        Returns:
+            list: positions of the matching transactions, sorted by date
+        """
+        start = None if start_date is None else date_to_ordinal(start_date)
+        end = None if end_date is None else date_to_ordinal(end_date)
+        records = self.transactions
+        if isinstance(records, ColumnarLedger):
+            values = records.dictionaries['description'].values
+            texts = (values[code] for code in records.column('description'))
+            day_of = records.column('date').__getitem__
+        else:
+            texts = (record['description'] for record in records)
+            day_of = lambda i: date_to_ordinal(records[i]['date'])
+        if self._text_index is None or len(self._text_index) != len(records):
+            self._text_index = TextIndex()
+            self._text_index.rebuild(texts)
+
+        matches = ((day_of(i), i) for i in self._text_index.lookup(query))
+        if start is not None or end is not None:
+            matches = ((day, i) for day, i in matches
+                       if (start is None or day >= start) and (end is None or day <= end))
+        return [i for _, i in sorted(matches)]
+
+    def convert_ledger(self, ledger, to_currency, from_currency=None, cache=None, rates=None):
+        """
+        Converts the amounts of a whole dated list to another currency in one call
+        (see convert_currency_batch). With a RateTable, each amount is converted at the
+        rate of its own date without downloading anything (see RateTable.convert).
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            to_currency (str): the target currency code
+            from_currency (str or sequence): currency of all the amounts, or one code per record
+                (default: self.currency, or 'USD')
+            cache (RateCache): cache to get the latest rates from (default: the module's rate_cache)
+            rates (RateTable): historical rates to use instead of the latest ones
+
+        Returns:
+            numpy.ndarray or list: converted amounts in list order, in the main unit of
+            to_currency, None if an error occurs
+        """
+        records = self._ledgers[ledger]
+        if isinstance(records, ColumnarLedger):
+            amounts = records.column('amount')
+        else:
+            amounts = [record['amount'] for record in records]
+        if self.currency is not None:
+            amounts = [from_minor_units(amount, self.currency) for amount in amounts]
+        from_currency = from_currency or self.currency or 'USD'
+        if rates is None:
+            return convert_currency_batch(amounts, from_currency, to_currency, cache)
+
+        if isinstance(records, ColumnarLedger):
+            days = records.column('date')
+        else:
+            days = [date_to_ordinal(record['date']) for record in records]
+        try:
+            return rates.convert(amounts, from_currency, to_currency, days)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return None
+
+    def build_report(self, start_date, end_date):
+        """
+        Generates a report for the specified start and end dates
+        
+        Args:
+            start_date (str): start date of reporting period
+            end_date (str): end date of reporting period
+
+        Returns:
+        Comes back with a generate report from the beginning to end, with the
+        records of each list sorted by date.
+        """
+        cache = self.report_cache
+        if cache is None:
+            return self._build_report(start_date, end_date)
+        #a list changed without going through add_* is reindexed here, which empties the cache
+        for ledger in LEDGERS:
+            self._check_index(ledger)
+        window = (date_to_ordinal(start_date), date_to_ordinal(end_date))
+        report = cache.get(window)
+        if report is None:
+            report = self._build_report(start_date, end_date)
+            cache.put(window, report)
+        return report
+
+    def _build_report(self, start_date, end_date):
+        """
+        Generates a report for the specified start and end dates without using the report cache
+
+        Args:
+            start_date (str): start date of reporting period
+            end_date (str): end date of reporting period
+
+        Returns:
+            dict: the report (see build_report)
+        """
+        report = {
+            'Income': self._in_range('income', start_date, end_date),
+            'Expenses': self._in_range('expenses', start_date, end_date),
+            'Transactions': self._in_range('transactions', start_date, end_date),
+            'Investments': self.investments
+        }
+        
+        return report
+
+    def materialize(self, start_date, end_date):
+        """
+        Creates a report for a date window that is kept up to date as records are added,
+        instead of building it again with build_report after every change
+
+        Args:
+            start_date (str): start date of the window
+            end_date (str): end date of the window
+
+        Returns:
+            MaterializedReport: the report; call its close() when it is no longer needed
+        """
+        report = MaterializedReport(self, start_date, end_date)
+        self.reports.append(report)
+        return report
+
+    #If we use a JSON for the data, this is how we would save the data to a JSON file
+    def save_to_file(self, file_name, binary=False):
+        """
+        Saves the financial data to a JSON file.
+
+        Args:
+            file_name (str): file that the data will be saved to.
+            binary (bool): if True, write a compact binary snapshot instead of JSON, which is much
+                faster to save and load for large data. It holds every list (and the investments)
+                with the records in date order, and load_from_file recognizes it automatically.
+                It can't be used for the data file of an open journal.
+        """        
+        
+        try:
+            self._save(file_name, binary)
+            print("Data saved.")
+        except Exception as e:
+            print(f"An error occurred while saving: {e}")
+
+    def _save(self, file_name, binary=False):
+        """
+        Saves the financial data to a file, raising any error instead of printing it (see save_to_file)
+
+        Args:
+            file_name (str): file that the data will be saved to.
+            binary (bool): write a binary snapshot instead of JSON
+        """
+        if self.journal is not None and os.path.abspath(file_name) == os.path.abspath(self.journal_file):
+            if binary:
+                #replacing the file would mean deleting the journal while later changes are still logged to it
+                raise ValueError("This file is kept up to date by the open journal, so it can't be replaced by "
+                                 "a binary snapshot. Please call close_journal() first.")
+            #every change is already in the journal, so only make sure it is on disk
+            self.journal.sync()
+            return
+        if binary:
+            write_snapshot(file_name, {ledger: self._snapshot_columns(ledger) for ledger in LEDGERS}, self.investments,
+                           self.currency)
+            #a snapshot doesn't record which journaled changes it holds, so a journal left over
+            #from earlier would be replayed on top of it
+            if os.path.exists(file_name + JOURNAL_SUFFIX):
+                os.remove(file_name + JOURNAL_SUFFIX)
+        else:
+            #the changes in a journal left over from earlier are older than this data, so the file
+            #records them as saved and loading skips them, as it does after compact()
+            self._write_json(file_name, Journal.last_seq(file_name + JOURNAL_SUFFIX))
+
+    def _write_json(self, file_name, journal_seq):
+        """
+        Writes every list and the investments to a JSON data file. The file is replaced in
+        one step, so a crash leaves either the old or the new file.
+
+        Args:
+            file_name (str): file to write
+            journal_seq (int): number of the last journaled change the data includes
+        """
+        #the currency goes first so a streaming load knows the amounts are minor units before reading them
+        data = {'currency': self.currency} if self.currency else {}
+        data.update({
+            'income': list(self.income),
+            'expenses': list(self.expenses),
+            'transactions': list(self.transactions),
+            'investments': [{'asset': asset, 'amount': amount} for asset, amount in self.investments.items()],
+            'journal_seq': journal_seq
+        })
+        temp_name = file_name + '.tmp'
+        with open(temp_name, 'w') as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_name, file_name)
+
+    def _snapshot_columns(self, ledger):
+        """
+        Arranges one of the dated lists by field, in date order, for write_snapshot
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+
+        Returns:
+            dict: the list's columns in the form write_snapshot takes
+        """
+        records = self._ledgers[ledger]
+        order = self._positions(ledger)
+        in_order = isinstance(order, range) or order == list(range(len(order)))
+        columns = {}
+        for field in LEDGER_FIELDS[ledger]:
+            if isinstance(records, ColumnarLedger):
+                column = records.column(field)
+                if not in_order:
+                    column = array(column.typecode, map(column.__getitem__, order))
+                if field in records.dictionaries:
+                    column = (records.dictionaries[field].values, column)
+            elif field == CATEGORY_FIELDS[ledger]:
+                codes = self.category_codes(ledger)
+                column = (self.categories(ledger).values, array('I', map(codes.__getitem__, order)))
+            else:
+                values = [records[i][field] for i in order]
+                if field == 'date':
+                    column = array('i', map(date_to_ordinal, values))
+                elif field == 'amount':
+                    column = array(self._amount_typecode(), values)
+                else:
+                    dictionary = StringDictionary()
+                    column = (dictionary.values, array('I', map(dictionary.encode, values)))
+            columns[field] = column
+        return columns
+
+    def _ledger_from_columns(self, ledger, columns):
+        """
+        Creates the storage for one of the dated lists from snapshot columns
+
+        Args:
+            ledger (str): name of the list ('income', 'expenses' or 'transactions')
+            columns (dict): the list's columns as returned by read_snapshot
+
+        Returns:
+            list or ColumnarLedger: the new list, depending on the storage option
+        """
+        fields = LEDGER_FIELDS[ledger]
+        if self.storage == 'columnar':
+            return ColumnarLedger.from_columns(fields, columns)
+        values = []
+        for field in fields:
+            if field == 'date':
+                values.append(map(ordinal_to_date, columns[field]))
+            elif field == 'amount':
+                values.append(columns[field])
+            else:
+                strings, codes = columns[field]
+                values.append(map(strings.__getitem__, codes))
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+    def _load_snapshot(self, file_name):
+        """
+        Loads a binary snapshot written by save_to_file(binary=True). The file is memory mapped
+        and its columns copied into place in bulk, without a Python object per record.
+
+        Args:
+            file_name (str): file to load the data from
+        """
+        if self.storage == 'mapped':
+            with open(file_name, 'rb') as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            #checking the checksum would read the whole file, which is what this mode avoids
+            flags, ledgers, investments, currency = read_snapshot(mapping, copy=False, verify=False)
+            if not flags & SNAPSHOT_SORTED:
+                raise ValueError("Snapshot records are not in date order, so the snapshot can't be mapped.")
+            if currency != self.currency:
+                raise ValueError(f"Snapshot amounts are kept {f'in {currency} minor units' if currency else 'as floats'}, "
+                                 f"which mapped data can't convert.")
+            for ledger in LEDGERS:
+                self._ledgers[ledger] = MappedLedger(LEDGER_FIELDS[ledger], ledgers[ledger], mapping)
+            self.investments.update(investments)
+            return
+        with open(file_name, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                _, ledgers, investments, currency = read_snapshot(mapped)
+        if currency != self.currency:
+            for ledger in LEDGERS:
+                amounts = ledgers[ledger]['amount']
+                ledgers[ledger]['amount'] = array(self._amount_typecode(), self._stored_amounts(amounts, currency))
+            investments = dict(zip(investments, self._stored_amounts(list(investments.values()), currency)))
+        for ledger in LEDGERS:
+            self._ledgers[ledger] = self._ledger_from_columns(ledger, ledgers[ledger])
+            #the date index, totals and category codes are rebuilt the first time they are needed
+            self._date_index[ledger] = DateIndex()
+            self._daily_totals[ledger] = DailyTotals()
+            self._categories[ledger] = StringDictionary()
+            self._category_codes[ledger] = array('I')
+        self.investments.update(investments)
+
+    #If we use a JSON for the financial data, this will read it and update the classes 
+    def load_from_file(self, file_name, stream=False, progress=None):
+        """
+        Loads financial data from a JSON file (or a binary snapshot) and updates the class attributes.
+
+        Args:
+            file_name (str): file that the data will be saved to.
+            stream (bool): if True, read the file a piece at a time and add the records
+                one by one, so memory use does not grow with the size of the file
+            progress (callable): with stream=True, called as progress(bytes_read, total_bytes)
+                as the file is read
+        """
+        
+        try:
+            self._load(file_name, stream, progress)
+            print("Data loaded.")
+        except FileNotFoundError:
+            print("File not found.")
+        except Exception as e:
+            print(f"An error occurred while loading data: {e}")
+
+    def _load(self, file_name, stream=False, progress=None):
+        """
+        Loads financial data from a JSON file, raising any error instead of printing it (see load_from_file)
+
+        Args:
+            file_name (str): file to load the data from
+            stream (bool): read the file a piece at a time
+            progress (callable): with stream=True, called as progress(bytes_read, total_bytes)
+        """
+        #loading replaces the lists rather than adding to them, which the journal can't record,
+        #so it is set aside while loading and the journal's data file is rewritten afterwards
+        journal, self.journal = self.journal, None
+        try:
+            if is_snapshot(file_name):
+                self._load_snapshot(file_name)
+                snapshot_seq = 0
+            elif self.storage == 'mapped':
+                raise ValueError("Read-only mapped data can only be loaded from a binary snapshot.")
+            elif stream:
+                snapshot_seq = self._load_stream(file_name, progress)
+            else:
+                with open(file_name, 'r') as file:
+                    data = json.load(file)
+                currency = data.get('currency')
+                staged = self._staging()
+                for ledger in LEDGERS:
+                    if ledger in data:
+                        #go through _extend, like the streaming load, so dates are checked and normalized
+                        staged._extend(ledger, data[ledger], currency)
+                if 'investments' in data:
+                    amounts = staged._stored_amounts([inv['amount'] for inv in data['investments']], currency)
+                    staged.investments = {inv['asset']: amount for inv, amount in zip(data['investments'], amounts)}
+                self._adopt(staged, [ledger for ledger in LEDGERS if ledger in data])
+                snapshot_seq = data.get('journal_seq', 0)
+            self.journal_seq = self._replay_journal(file_name, snapshot_seq)
+        finally:
+            self.journal = journal
+        #the lists were replaced, so the materialized and cached reports and the search index start over
+        for report in self.reports:
+            report.refresh()
+        if self.report_cache is not None:
+            self.report_cache.invalidate_all()
+        self._text_index = None
+        if journal is not None:
+            self.compact()
+
+    def load_files(self, file_names, workers=None):
+        """
+        Loads many data files (JSON or binary snapshots) and merges them all into this
+        Finances, keeping the records already here instead of replacing them. The files
+        are read in parallel by a pool of processes (threads if the processes can't import
+        this module, see parallel_map), and the records of each list are
+        added in date order. Investments found in several files are added together.
+
+        Args:
+            file_names (list): files to load
+            workers (int): number of processes to use (default: one per CPU); 1 reads the
+                files one after another in this process
+        """
+        try:
+            count = self._load_files(file_names, workers)
+            print(f"Data loaded: {count} records.")
+        except FileNotFoundError as e:
+            print(f"File not found: {e.filename}")
+        except Exception as e:
+            print(f"An error occurred while loading data: {e}")
+
+    def _load_files(self, file_names, workers=None):
+        """
+        Loads many data files, raising any error instead of printing it (see load_files).
+        Nothing is added unless every file loads.
+
+        Args:
+            file_names (list): files to load
+            workers (int): number of processes to use (default: one per CPU)
+
+        Returns:
+            int: number of records added
+        """
+        if self.storage == 'mapped':
+            raise RuntimeError(READ_ONLY_MESSAGE)
+        file_names = list(file_names)
+        currencies = itertools.repeat(self.currency)
+        if workers == 1 or len(file_names) < 2:
+            loaded = list(map(_load_columns, file_names, currencies))
+        else:
+            loaded = parallel_map(_load_columns, (file_names, currencies), workers)
+
+        count = 0
+        for ledger in LEDGERS:
+            runs = [ledgers[ledger] for ledgers, _ in loaded if len(ledgers[ledger]['date'])]
+            if runs:
+                #the workers already converted the amounts into the form they are kept in here
+                count += self._extend(ledger, merge_columns(LEDGER_FIELDS[ledger], runs), self.currency)
+        for _, investments in loaded:
+            for asset, amount in investments.items():
+                self.investments[asset] = self.investments.get(asset, 0) + amount
+                if self.journal is not None:
+                    self._log('investments', [asset, self.investments[asset]])
+        return count
+
+    def _load_stream(self, file_name, progress=None):
+        """
+        Loads financial data from a JSON file record by record (see load_from_file)
+
+        Args:
+            file_name (str): file to load the data from
+            progress (callable): called as progress(bytes_read, total_bytes) as the file is read
+
+        Returns:
+            int: number of the last journal change saved in the file
+        """
+        snapshot_seq = 0
+        currency = None
+        read_amounts = False
+        staged = self._staging()
+        loaded = []
+        with open(file_name, 'rb') as file:
+            for key, value in JSONArrayStream(file, progress=progress).sections():
+                if key in LEDGER_FIELDS or key == 'investments':
+                    if not isinstance(value, Iterator):
+                        raise ValueError(f"'{key}' must be a list of records.")
+                    read_amounts = True
+                elif key == 'currency' and read_amounts:
+                    #the amounts already added were taken to be floats
+                    raise ValueError("'currency' comes after the records in this file, so it can't be "
+                                     "streamed. Please load it without stream=True.")
+                if key in LEDGER_FIELDS:
+                    loaded.append(key)
+                    while True:
+                        batch = list(itertools.islice(value, STREAM_BATCH_SIZE))
+                        if not batch:
+                            break
+                        staged._extend(key, batch, currency)
+                elif key == 'investments':
+                    for inv in value:
+                        staged.investments[inv['asset']] = staged._stored_amounts([inv['amount']], currency)[0]
+                elif key == 'currency':
+                    currency = value
+                elif key == 'journal_seq':
+                    snapshot_seq = value
+        self._adopt(staged, loaded)
+        return snapshot_seq
+
+    def _staging(self):
+        """
+        Creates an empty Finances with the same storage and currency for a file to be loaded
+        into, so a file that fails part way through leaves this one as it was
+
+        Returns:
+            Finances: the empty Finances
+        """
+        return Finances(storage=self.storage, currency=self.currency)
+
+    def _adopt(self, staged, ledgers):
+        """
+        Replaces dated lists with those a file was loaded into, along with their indexes,
+        and adds its investments
+
+        Args:
+            staged (Finances): Finances from _staging that the file was loaded into
+            ledgers (list): names of the lists the file had, which replace the ones here
+        """
+        for ledger in ledgers:
+            self._ledgers[ledger] = staged._ledgers[ledger]
+            self._date_index[ledger] = staged._date_index[ledger]
+            self._daily_totals[ledger] = staged._daily_totals[ledger]
+            self._categories[ledger] = staged._categories[ledger]
+            self._category_codes[ledger] = staged._category_codes[ledger]
+        self.investments.update(staged.investments)
+
+    def _replay_journal(self, file_name, snapshot_seq):
+        """
+        Applies the changes in a data file's journal that are newer than the file itself
+
+        Args:
+            file_name (str): data file whose journal should be replayed
+            snapshot_seq (int): number of the last change already saved in the data file
+
+        Returns:
+            int: number of the last change applied
+        """
+        journal, self.journal = self.journal, None
+        seq = snapshot_seq
+        currency = None
+        try:
+            for _, (entry_seq, kind, *values) in Journal.entries(file_name + JOURNAL_SUFFIX, header=True):
+                if kind == 'currency':
+                    #the amounts are converted into the form they are kept in here, like _load does
+                    currency = values[0]
+                    continue
+                if entry_seq <= snapshot_seq:
+                    continue
+                if kind == 'investments':
+                    self.investments[values[0]] = self._stored_amounts([values[1]], currency)[0]
+                else:
+                    record = dict(zip(LEDGER_FIELDS[kind], values))
+                    record['amount'] = self._stored_amounts([record['amount']], currency)[0]
+                    self._append(kind, record)
+                seq = entry_seq
+        finally:
+            self.journal = journal
+        return seq
+
+    def open_journal(self, file_name, compact_every=1000):
+        """
+        Keeps a JSON data file up to date by logging each add_* call to a journal next to it,
+        instead of rewriting the whole file on every save. Loads the file (and its journal)
+        first if it exists.
+
+        Args:
+            file_name (str): data file; the journal is file_name + '.journal'
+            compact_every (int): number of logged changes after which the data file is
+                rewritten and the journal emptied
+
+        Raises:
+            Exception: if the data file exists but can't be loaded; the journal is then not
+                opened, so compaction can't overwrite the file
+        """
+        self.close_journal()
+        if os.path.exists(file_name):
+            self._load(file_name)
+        else:
+            self.journal_seq = self._replay_journal(file_name, 0)
+        self.journal_file = file_name
+        self.journal = Journal(file_name + JOURNAL_SUFFIX, self.journal_seq, compact_every, self.currency)
+        #changes logged in other units were replayed above; saving them empties the log, so it
+        #only ever holds amounts in one currency
+        if not os.path.exists(file_name) or self.journal.file_currency != self.currency:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrites the journal's data file with all current data and empties the journal.
+        The file is replaced in one step, so a crash leaves either the old or the new file.
+        """
+        self._write_json(self.journal_file, self.journal.seq)
+        self.journal_seq = self.journal.seq
+        self.journal.reset()
+
+    def close_journal(self):
+        """
+        Stops journaling, making sure every logged change is on disk
+        """
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+def _load_columns(file_name, currency=None):
+    """
+    Loads one data file for Finances.load_files, usually in a worker process
+
+    Args:
+        file_name (str): file to load
+        currency (str): currency whose minor units the amounts should be in (see Finances)
+
+    Returns:
+        tuple: (ledgers, investments), where ledgers maps each dated list to its fields in
+        date order, as Finances._snapshot_columns arranges them
+    """
+    finances = Finances(currency=currency)
+    finances._load(file_name)
+    return {ledger: finances._snapshot_columns(ledger) for ledger in LEDGERS}, finances.investments
+
+def merge_columns(fields, runs):
+    """
+    Merges several batches of records that are each in date order into one batch in date order
+
+    Args:
+        fields (tuple): names of the record fields
+        runs (list): the batches, each a dict mapping every field to its values in the form
+            write_snapshot takes (day numbers for date, a (strings, codes) pair for text fields)
+
+    Returns:
+        dict: maps each field to a list of its values, in the form extend_* takes
+    """
+    #(day, batch, position) for every record, in date order; ties keep the order of the batches
+    order = list(heapq.merge(*(zip(run['date'], itertools.repeat(k), range(len(run['date'])))
+                               for k, run in enumerate(runs))))
+    columns = {}
+    for field in fields:
+        if field == 'date':
+            columns[field] = [ordinal_to_date(day) for day, _, _ in order]
+        elif field == 'amount':
+            amounts = [run[field] for run in runs]
+            columns[field] = [amounts[k][i] for _, k, i in order]
+        else:
+            tables = [run[field] for run in runs]
+            columns[field] = [tables[k][0][tables[k][1][i]] for _, k, i in order]
+    return columns
+
+class Investments:
+    """
+    Represents the user's investments
     """
     
-    def __init__(self):
+    def __init__(self, name, currency=None):
+        """
+        Initializes the portfolio with an empty list and name
+        
+        Args:
+            name (str): name of the portfolio
+            currency (str): if given, amounts are kept as whole minor units of this currency
+                (see Finances)
+        """
+        self.name = name
+        self.currency = currency
+        self.investments = {} 
+        
+    def add_investment(self, asset, amount):
+        """
+        Adds a new asset/investment to the portfolio
+        
+        Args:
+            asset (str): name of the asset
+            amount (int): monetary cost of the asset, in the currency's main unit
+        """
+        self.investments[asset] = amount if self.currency is None else to_minor_units(amount, self.currency)
+        
+    def remove_investment(self, asset):
+        """
+        Removes an asset/investment from the portfolio
+        
+        Args:
+            asset (str): name of the asset that's being removed
+        """
+        if asset in self.investments:
+            del self.investments[asset]
+
+    def calculate_investment_growth(self, asset, growth_rate):
+        """
+        Calculates the growth of an investment
+        
+        Args:
+            asset (str): name of the asset
+            growth_rate (float): rate of growth (e.g., 0.05 for 5% growth)
+            
+        Returns:
+            float: updated investment amount after growth (whole minor units, rounded
+            halves to even, if the portfolio has a currency)
+        """
+        if asset in self.investments:
+            if self.currency is None:
+                self.investments[asset] *= (1 + growth_rate)
+            else:
+                grown = Decimal(self.investments[asset]) * (1 + Decimal(str(growth_rate)))
+                self.investments[asset] = int(grown.to_integral_value(ROUND_HALF_EVEN))
+            return self.investments[asset]
+        else:
+            print("Investment not found.")
+            return None
+
+    def _per_asset(self, value, name):
+        """
+        Turns a parameter given for the whole portfolio or for each asset into one value per asset
+
+        Args:
+            value (float, dict or sequence): one number for every asset, a dict keyed by asset,
+                or a sequence in portfolio order
+            name (str): name of the parameter, for error messages
+
+        Returns:
+            list: one value per asset, in portfolio order
+
+        Raises:
+            ValueError: if an asset has no value
+        """
+        assets = list(self.investments)
+        if isinstance(value, numbers.Real):
+            return [value] * len(assets)
+        if isinstance(value, Mapping):
+            missing = [asset for asset in assets if asset not in value]
+            if missing:
+                raise ValueError(f"No {name} given for {', '.join(missing)}.")
+            return [value[asset] for asset in assets]
+        values = list(value)
+        if len(values) != len(assets):
+            raise ValueError(f"Got {len(values)} values for {name} but the portfolio has {len(assets)} assets.")
+        return values
+
+    def grow(self, rates, periods=None, mutate=False):
+        """
+        Compounds every asset of the portfolio over several periods in one pass, instead of
+        calling calculate_investment_growth once per asset and period. Uses numpy when it
+        is installed.
+
+        Args:
+            rates: growth rate per period (0.05 for 5%) as one number for every asset; one
+                per asset, as a dict keyed by asset or a sequence in portfolio order; or one
+                per asset and period, as a matrix with a row per period and a column per asset
+                or a dict mapping each asset to its sequence of rates
+            periods (int): number of periods; only needed when the rates don't have one per period
+            mutate (bool): if True, replace each asset's amount with its value after the last period
+                (rounded to a whole minor unit if the portfolio has a currency)
+
+        Returns:
+            numpy.ndarray or list: the value of each asset after every period, with a row per
+            period (row 0 being today) and a column per asset in portfolio order; a numpy
+            array if numpy is installed, otherwise a list of lists
+
+        Raises:
+            ValueError: if the rates don't match the portfolio or the number of periods
+        """
+        assets = list(self.investments)
+        if isinstance(rates, Mapping):
+            rates = self._per_asset(rates, 'rates')
+            if rates and not isinstance(rates[0], numbers.Real):
+                #a sequence of rates per asset becomes a matrix with a column per asset
+                if len({len(column) for column in rates}) > 1:
+                    raise ValueError("Every asset needs the same number of rates.")
+                rates = list(zip(*rates))
+        elif isinstance(rates, numbers.Real):
+            rates = self._per_asset(rates, 'rates')
+        rows = list(rates)
+        if not rows or isinstance(rows[0], numbers.Real):
+            #one rate per asset, used every period
+            if periods is None:
+                raise ValueError("The number of periods is needed when the rates are not given per period.")
+            rates = [self._per_asset(rows, 'rates')] * periods
+        else:
+            if periods is not None and periods != len(rows):
+                raise ValueError(f"Got rates for {len(rows)} periods instead of {periods}.")
+            if any(len(row) != len(assets) for row in rows):
+                raise ValueError(f"Every period needs a rate for each of the {len(assets)} assets.")
+            rates = rows
+
+        start = [float(self.investments[asset]) for asset in assets]
+        np = optional_numpy()
+        if np is not None:
+            values = np.empty((len(rates) + 1, len(assets)))
+            values[0] = start
+            if rates:
+                factors = 1 + np.asarray(rates, dtype=np.float64).reshape(len(rates), len(assets))
+                values[1:] = np.asarray(start) * np.cumprod(factors, axis=0)
+            final = values[-1].tolist()
+        else:
+            values = [start]
+            for row in rates:
+                values.append([value * (1 + rate) for value, rate in zip(values[-1], row)])
+            final = values[-1]
+        if mutate:
+            for asset, value in zip(assets, final):
+                self.investments[asset] = value if self.currency is None else round(value)
+        return values
+
+    def project(self, periods, mean, volatility, correlation=None, paths=10000,
+                percentiles=(5, 25, 50, 75, 95), seed=None, workers=1):
+        """
+        Simulates many possible futures of the portfolio (Monte Carlo) and summarizes them
+        as percentile bands, without changing the portfolio. Every period each asset grows
+        by a random factor whose logarithm is normally distributed, so values never drop
+        below zero, and assets can move together through a correlation matrix. The paths
+        are simulated with numpy when it is installed, and can be spread over processes.
+
+        Args:
+            periods (int): number of periods to simulate (e.g. 12 for a year of months)
+            mean (float, dict or sequence): expected return per period (0.01 for 1%), for
+                every asset or per asset (a dict keyed by asset, or a sequence in portfolio order)
+            volatility (float, dict or sequence): standard deviation of the log return per
+                period, for every asset or per asset
+            correlation (sequence): matrix of the correlations between the assets' returns,
+                in portfolio order (default: the assets move independently)
+            paths (int): number of futures to simulate
+            percentiles (sequence): percentiles of the bands, from 0 to 100
+            seed (int): seed for the random numbers, so a projection can be repeated; the
+                result does not depend on the number of workers
+            workers (int): number of processes to spread the paths over (None: one per CPU;
+                threads if the processes can't import this module, see parallel_map)
+
+        Returns:
+            dict: 'percentiles', 'assets' mapping each asset to its bands, and 'total' with
+            the bands of the whole portfolio. Bands have a row per percentile and a column per
+            period, column 0 being today's value: a numpy array if numpy is installed,
+            otherwise a list of lists.
+
+        Raises:
+            ValueError: if the portfolio is empty or a parameter is invalid
+        """
+        assets = list(self.investments)
+        if not assets:
+            raise ValueError("The portfolio has no investments to project.")
+        if periods < 1 or paths < 1:
+            raise ValueError("periods and paths must be at least 1.")
+        if not all(0 <= q <= 100 for q in percentiles):
+            raise ValueError("Percentiles must be between 0 and 100.")
+        means = self._per_asset(mean, 'mean')
+        volatilities = self._per_asset(volatility, 'volatility')
+        if any(m <= -1 for m in means) or any(v < 0 for v in volatilities):
+            raise ValueError("Mean returns must be above -1 and volatilities can't be negative.")
+        if correlation is not None and len(correlation) != len(assets):
+            raise ValueError(f"The correlation matrix must have a row for each of the {len(assets)} assets.")
+        #the expected growth factor is 1 + mean, so the log return is centered half a variance lower
+        drift = [math.log1p(m) - v * v / 2 for m, v in zip(means, volatilities)]
+        factor = None if correlation is None else cholesky(correlation)
+        start = [float(self.investments[asset]) for asset in assets]
+        chunks = [min(PROJECTION_CHUNK, paths - i) for i in range(0, paths, PROJECTION_CHUNK)]
+        seeds = [None if seed is None else (seed, k) for k in range(len(chunks))]
+        jobs = (itertools.repeat(start), itertools.repeat(periods), itertools.repeat(drift),
+                itertools.repeat(volatilities), itertools.repeat(factor), chunks, seeds)
+        if workers == 1 or len(chunks) == 1:
+            results = list(map(_simulate_paths, *jobs))
+        else:
+            results = parallel_map(_simulate_paths, jobs, workers)
+
+        np = optional_numpy()
+        if np is not None:
+            bands = np.percentile(np.concatenate(results), percentiles, axis=0)
+            return {'percentiles': list(percentiles),
+                    'assets': {asset: bands[:, :, i] for i, asset in enumerate(assets)},
+                    'total': bands[:, :, -1]}
+        values = [path for result in results for path in result]
+        bands = []
+        for i in range(len(assets) + 1):
+            columns = [sorted(path[t][i] for path in values) for t in range(periods + 1)]
+            bands.append([[percentile(column, q) for column in columns] for q in percentiles])
+        return {'percentiles': list(percentiles), 'assets': dict(zip(assets, bands)), 'total': bands[-1]}
+
+#number of paths Investments.project simulates at a time, each with its own random numbers;
+#it is fixed so a seeded projection comes out the same whatever the number of workers
+PROJECTION_CHUNK = 2000
+
+def cholesky(matrix):
+    """
+    Factors a correlation matrix into a lower-triangular L with L times its transpose equal
+    to the matrix, so independent random numbers multiplied by L are correlated as it says
+
+    Args:
+        matrix (sequence): square, symmetric, positive definite matrix, as rows
+
+    Returns:
+        list: L, as a list of rows
+
+    Raises:
+        ValueError: if the matrix is not square, symmetric and positive definite
+    """
+    n = len(matrix)
+    if any(len(row) != n for row in matrix):
+        raise ValueError("The correlation matrix must be square.")
+    factor = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1):
+            if abs(matrix[i][j] - matrix[j][i]) > 1e-9:
+                raise ValueError("The correlation matrix must be symmetric.")
+            rest = matrix[i][j] - sum(factor[i][k] * factor[j][k] for k in range(j))
+            if i == j:
+                if rest <= 0:
+                    raise ValueError("The correlation matrix must be positive definite.")
+                factor[i][i] = math.sqrt(rest)
+            else:
+                factor[i][j] = rest / factor[j][j]
+    return factor
+
+def percentile(values, q):
+    """
+    Finds a percentile of sorted values, interpolating between the two nearest (as numpy does)
+
+    Args:
+        values (list): the values, sorted
+        q (float): the percentile, from 0 to 100
+
+    Returns:
+        float: the percentile
+    """
+    position = (len(values) - 1) * q / 100
+    lo = int(position)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (position - lo)
+
+def _simulate_paths(start, periods, drift, volatility, factor, paths, seed):
+    """
+    Simulates futures of a portfolio for Investments.project, possibly in a worker process
+
+    Args:
+        start (list): value of each asset today
+        periods (int): number of periods to simulate
+        drift (list): mean log return of each asset per period
+        volatility (list): standard deviation of each asset's log return per period
+        factor (list): Cholesky factor of the correlation matrix (None if the assets are independent)
+        paths (int): number of futures to simulate
+        seed (tuple): (seed, chunk number) for the random numbers, or None
+
+    Returns:
+        numpy.ndarray or list: the value of each asset, then of the whole portfolio, after
+        every period of every path, indexed [path][period][asset]
+    """
+    np = optional_numpy()
+    if np is not None:
+        rng = np.random.default_rng(None if seed is None else list(seed))
+        shocks = rng.standard_normal((paths, periods, len(start)))
+        if factor is not None:
+            shocks = shocks @ np.asarray(factor).T
+        log_growth = np.cumsum(np.asarray(drift) + np.asarray(volatility) * shocks, axis=1)
+        values = np.empty((paths, periods + 1, len(start) + 1))
+        values[:, 0, :-1] = start
+        values[:, 1:, :-1] = np.asarray(start) * np.exp(log_growth)
+        values[:, :, -1] = values[:, :, :-1].sum(axis=2)
+        return values
+
+    rng = random.Random(None if seed is None else f"{seed[0]}/{seed[1]}")
+    values = []
+    for _ in range(paths):
+        current = list(start)
+        path = [current + [sum(current)]]
+        for _ in range(periods):
+            shocks = [rng.gauss(0, 1) for _ in start]
+            if factor is not None:
+                shocks = [sum(f * z for f, z in zip(row, shocks)) for row in factor]
+            current = [value * math.exp(d + v * z) for value, d, v, z in zip(current, drift, volatility, shocks)]
+            path.append(current + [sum(current)])
+        values.append(path)
+    return values
+
+#address of the exchange rate API; {} is replaced by the source currency code
+RATES_URL = "https://api.exchangerate-api.com/v4/latest/{}"
+
+def fetch_rates(from_currency, url=RATES_URL):
+    """
+    Downloads the latest exchange rates for a currency from the exchange rate API.
+
+    Args:
+        from_currency (str): The source currency code.
+        url (str): Address of the API, with {} where the currency code goes.
+
+    Returns:
+        dict: Maps each currency code to the value of one unit of from_currency in that currency.
+    """
+    import requests
+    response = requests.get(url.format(from_currency))
+    return response.json()['rates']
+
+class RateCache:
+    """
+    Keeps recently downloaded exchange rates, so converting many amounts from the
+    same currency only downloads its rates once.
+    """
+
+    def __init__(self, ttl=3600, maxsize=128, fetcher=fetch_rates, file_name=None, clock=time.time):
+        """
+        Initializes the cache
+
+        Args:
+            ttl (float): number of seconds downloaded rates are used before downloading them again
+            maxsize (int): number of source currencies kept; the least recently used is dropped first
+            fetcher (callable): fetcher(from_currency) returns the rates for a currency (see fetch_rates)
+            file_name (str): optional JSON file the cache is kept in, so rates survive a restart
+            clock (callable): returns the current time in seconds
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.fetcher = fetcher
+        self.file_name = file_name
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if file_name is not None:
+            self._load()
+
+    def get(self, from_currency):
+        """
+        Finds the rates for a currency, downloading them if they are missing or too old
+
+        Args:
+            from_currency (str): The source currency code.
+
+        Returns:
+            dict: Maps each currency code to the value of one unit of from_currency in that currency.
+        """
+        now = self.clock()
+        rates = self.lookup(from_currency, now)
+        if rates is None:
+            rates = self.fetcher(from_currency)
+            self.put(from_currency, rates, now)
+        return rates
+
+    def lookup(self, from_currency, now=None):
+        """
+        Finds the stored rates for a currency without downloading them
+
+        Args:
+            from_currency (str): The source currency code.
+            now (float): current time in seconds (default: the cache's clock)
+
+        Returns:
+            dict: the rates for the currency, None if they are missing or too old (counted as a miss)
+        """
+        if now is None:
+            now = self.clock()
+        entry = self.entries.get(from_currency)
+        if entry is not None and now - entry[0] < self.ttl:
+            self.entries.move_to_end(from_currency)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, from_currency, rates, fetched_at=None, save=True):
+        """
+        Stores the rates for a currency
+
+        Args:
+            from_currency (str): The source currency code.
+            rates (dict): rates for the currency
+            fetched_at (float): time the rates were downloaded (default: now)
+            save (bool): write the cache file now; AsyncRateClient writes it itself, off the event loop
+        """
+        if fetched_at is None:
+            fetched_at = self.clock()
+        self.entries[from_currency] = (fetched_at, rates)
+        self.entries.move_to_end(from_currency)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        if self.file_name is not None and save:
+            self._save()
+
+    def clear(self):
+        """
+        Removes all stored rates and resets the counters
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        if self.file_name is not None:
+            self._save()
+
+    def info(self):
+        """
+        Reports how well the cache is working
+
+        Returns:
+            dict: hits, misses, size (currencies stored), maxsize and ttl
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries),
+                'maxsize': self.maxsize, 'ttl': self.ttl}
+
+    def _load(self):
+        """
+        Reads the cache file, ignoring it if it is missing or damaged
+        """
+        try:
+            with open(self.file_name, 'r') as file:
+                data = json.load(file)
+            for from_currency, entry in data.items():
+                self.entries[from_currency] = (entry['fetched_at'], entry['rates'])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            self.entries.clear()
+
+    def _save(self):
+        """
+        Writes the cache file, replacing it in one step
+        """
+        self._write(self._file_data())
+
+    def _file_data(self):
+        """
+        Arranges the stored rates the way the cache file keeps them
+
+        Returns:
+            dict: the file's contents
+        """
+        return {from_currency: {'fetched_at': fetched_at, 'rates': rates}
+                for from_currency, (fetched_at, rates) in self.entries.items()}
+
+    def _write(self, data):
+        """
+        Writes the cache file, replacing it in one step
+
+        Args:
+            data (dict): the file's contents (see _file_data)
+        """
+        temp_name = self.file_name + '.tmp'
+        with open(temp_name, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp_name, self.file_name)
+
+#cache used by convert_currency when no other cache is given
+rate_cache = RateCache()
+
+#statuses of the redirects AsyncRateClient follows, and how many it follows for one download
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+async def _read_response(reader, limit):
+    """
+    Reads one HTTP/1.1 response from a connection
+
+    Args:
+        reader (asyncio.StreamReader): the connection to read from
+        limit (int): largest body accepted, in bytes
+
+    Returns:
+        tuple: (status code, headers with lowercase names, body as bytes, whether the
+        connection can be used again)
+
+    Raises:
+        ConnectionError: if the response is malformed or its body is larger than limit,
+            so it is retried like a dropped connection
+    """
+    async def read_line():
+        line = await reader.readline()
+        if not line:
+            raise ConnectionResetError("The rate server closed the connection.")
+        return line
+
+    def check_size(size):
+        if size > limit:
+            raise ConnectionError(f"The rate server's response is larger than {limit} bytes.")
+        return size
+
+    try:
+        version, status = (await read_line()).split(None, 2)[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await read_line()
+            if line in (b'\r\n', b'\n'):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = bytearray()
+            while True:
+                size = int((await read_line()).split(b';')[0], 16)
+                if size == 0:
+                    #skips the trailers after the last chunk
+                    while await read_line() not in (b'\r\n', b'\n'):
+                        pass
+                    break
+                body += await reader.readexactly(check_size(len(body) + size) - len(body))
+                await reader.readexactly(2)
+            body = bytes(body)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(check_size(int(headers['content-length'])))
+        else:
+            #without a length the body ends when the server closes the connection
+            body = await reader.read(limit + 1)
+            check_size(len(body))
+            keep_alive = False
+    except ValueError as e:
+        #also raised by readline for a line longer than the reader's limit
+        raise ConnectionError(f"The rate server sent a malformed response: {e}") from e
+    return status, headers, body, keep_alive
+
+class AsyncRateClient:
+    """
+    Downloads exchange rates without blocking, for programs that run on asyncio.
+    Connections to the rate server are kept open and reused, callers asking for the
+    same currency at the same time share one download, and failed downloads (including
+    answers that are damaged or too large) are retried with a growing delay. Redirects are
+    followed. A client should only be used from one event loop.
+    """
+
+    def __init__(self, url=RATES_URL, cache=None, timeout=10, retries=3, backoff=0.5, max_connections=4,
+                 max_response_bytes=1 << 20):
+        """
+        Initializes the client
+
+        Args:
+            url (str): Address of the API, with {} where the currency code goes.
+            cache (RateCache): Cache the rates are kept in (default: the module's rate_cache).
+            timeout (float): number of seconds one download may take before it is given up
+            retries (int): number of times a failed download is tried again
+            backoff (float): seconds to wait before the first retry; doubled for each retry after it
+            max_connections (int): number of connections open to the rate server at once
+            max_response_bytes (int): largest response body accepted; a larger one counts as a failed download
+            idle (dict): open connections waiting to be reused, by (scheme, host, port)
+            pending (dict): downloads in progress, by source currency code
+        """
+        self.url = url
+        self.cache = rate_cache if cache is None else cache
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.max_response_bytes = max_response_bytes
+        self.idle = {}
+        self.pending = {}
+        self.fetches = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.connections_opened = 0
+        self._slots = None
+        self._saving = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def rates(self, from_currency):
+        """
+        Finds the rates for a currency, downloading them if they are missing or too old
+
+        Args:
+            from_currency (str): The source currency code.
+
+        Returns:
+            dict: Maps each currency code to the value of one unit of from_currency in that currency.
+
+        Raises:
+            ValueError: If the rate server does not know the currency.
+            ConnectionError: If the rates could not be downloaded after all retries.
+        """
+        import asyncio
+        rates = self.cache.lookup(from_currency)
+        if rates is not None:
+            return rates
+        task = self.pending.get(from_currency)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(from_currency))
+            self.pending[from_currency] = task
+            task.add_done_callback(lambda done: self._forget(from_currency, done))
+        else:
+            self.coalesced += 1
+        #shielded so one caller giving up does not cancel the download the others wait for
+        return await asyncio.shield(task)
+
+    async def exchange_rate(self, from_currency, to_currency):
+        """
+        Finds the value of one unit of a currency in another
+
+        Args:
+            from_currency (str): The source currency code.
+            to_currency (str): The target currency code.
+
+        Returns:
+            float: The exchange rate.
+
+        Raises:
+            Exception: If there's an issue with the download or the currency codes.
+        """
+        rates = await self.rates(from_currency)
+        if from_currency not in rates:
+            raise Exception(f"Currency code '{from_currency}' not found. Please use a valid currency code.")
+        if to_currency not in rates:
+            raise Exception(f"Currency code '{to_currency}' not found. Please use a valid currency code.")
+        return rates[to_currency]
+
+    async def convert(self, amount, from_currency, to_currency):
+        """
+        Converts an amount from one currency to another
+
+        Args:
+            amount (float): The amount to be converted.
+            from_currency (str): The source currency code.
+            to_currency (str): The target currency code.
+
+        Returns:
+            float: The converted amount.
+
+        Raises:
+            Exception: If there's an issue with the download or the currency codes.
         """
-        Initializes user's finances
-        
+        return amount * await self.exchange_rate(from_currency, to_currency)
+
+    async def close(self):
+        """
+        Closes the connections kept open for reuse
+        """
+        connections = [writer for idle in self.idle.values() for _, writer in idle]
+        self.idle.clear()
+        for writer in connections:
+            writer.close()
+        for writer in connections:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def info(self):
+        """
+        Reports how the client has been downloading
+
+        Returns:
+            dict: fetches (downloads started), coalesced (callers that shared another's download),
+            retries, connections_opened and idle (connections waiting to be reused)
+        """
+        return {'fetches': self.fetches, 'coalesced': self.coalesced, 'retries': self.retried,
+                'connections_opened': self.connections_opened,
+                'idle': sum(len(idle) for idle in self.idle.values())}
+
+    def _forget(self, from_currency, task):
+        """
+        Removes a finished download from the ones in progress
+
         Args:
-            income: list of income sources
-            expenses: list of expenses
-            savings: list of different investments/savings accounts, etc.
+            from_currency (str): The source currency code.
+            task (asyncio.Task): the finished download
         """
-        self.income = []
-        self.expenses = []
-        self.transactions = []
-        self.investments = {}
-        
-    def add_income(self, source, amount, date):
+        if self.pending.get(from_currency) is task:
+            del self.pending[from_currency]
+        if not task.cancelled():
+            #marks a failure as seen, in case every caller stopped waiting for it
+            task.exception()
+
+    async def _fetch(self, from_currency):
         """
-        Adds a new income source to the system
-        
+        Downloads the rates for a currency, retrying with a growing delay, and stores them in the cache
+
         Args:
-            source (str): represents the name of the income source(job, etc.)
-            amount (float): $ amount of the income source
-            date (str): date associated with the income source
+            from_currency (str): The source currency code.
+
+        Returns:
+            dict: rates for the currency
         """
-        self.income.append({'source': source, 'amount': amount, 'date': date})
-            
-    def add_expense(self, category, amount, date):
+        import asyncio
+        self.fetches += 1
+        url = self.url.format(from_currency)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                status, body = await asyncio.wait_for(self._follow(url), self.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                error = e
+                continue
+            if status == 429 or status >= 500:
+                error = ConnectionError(f"The rate server answered {status}.")
+                continue
+            if status != 200:
+                raise ValueError(f"The rate server answered {status} for '{from_currency}'. Please use a valid currency code.")
+            try:
+                rates = json.loads(body)['rates']
+                if not isinstance(rates, dict):
+                    raise TypeError("'rates' is not an object.")
+            except (ValueError, KeyError, TypeError) as e:
+                #a damaged or cut off answer is retried like a dropped connection
+                error = e
+                continue
+            self.cache.put(from_currency, rates, save=False)
+            await self._save_cache()
+            return rates
+        raise ConnectionError(f"Could not download the rates for '{from_currency}' "
+                              f"after {self.retries + 1} attempts: {error!r}") from error
+
+    async def _save_cache(self):
         """
-        Adds a new expense category to the system
-        
+        Writes the cache file, if the cache has one, in a thread so the event loop is not blocked
+        """
+        import asyncio
+        if self.cache.file_name is None:
+            return
+        if self._saving is None:
+            self._saving = asyncio.Lock()
+        #one write at a time, each with the cache as it is when the write starts, so a slow
+        #write can't replace the file with older rates or clash over the temporary file
+        async with self._saving:
+            await asyncio.to_thread(self.cache._write, self.cache._file_data())
+
+    async def _follow(self, url):
+        """
+        Sends a GET request, following the server's redirects
+
         Args:
-            category (str): represents the name of the expense category
-            amount (float): monetary amount of the expense category
-            date (str): date associated with the expense category
+            url (str): address to get
+
+        Returns:
+            tuple: (status code, body as bytes)
+
+        Raises:
+            ConnectionError: if the server redirects more than MAX_REDIRECTS times
         """
-        self.expenses.append({'category': category, 'amount': amount, 'date': date})
-            
-    def add_transaction(self, date, category, amount, description):
+        from urllib.parse import urljoin
+        for _ in range(MAX_REDIRECTS + 1):
+            status, headers, body = await self._get(url)
+            if status not in REDIRECT_STATUSES or 'location' not in headers:
+                return status, body
+            url = urljoin(url, headers['location'])
+        raise ConnectionError(f"The rate server redirected more than {MAX_REDIRECTS} times.")
+
+    async def _get(self, url):
         """
-        Adds a new transaction to the system
-        
+        Sends one GET request, reusing an open connection to the server when there is one
+
         Args:
-            date (str): date of the transaction
-            category (str): category of the transaction (income, expense, savings)
-            amount (float): monetary amount of the transaction
-            description (str): description of the transaction
+            url (str): address to get
+
+        Returns:
+            tuple: (status code, headers with lowercase names, body as bytes)
         """
-        self.transactions.append({'date': date, 'category': category, 'amount': amount, 'description': description})
-        
-    def add_investment(self, asset, amount):
+        import asyncio
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        request = (f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                   "Accept: application/json\r\nConnection: keep-alive\r\n\r\n").encode('ascii')
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        async with self._slots:
+            idle = self.idle.setdefault((parts.scheme, parts.hostname, port), [])
+            while True:
+                reused = bool(idle)
+                if reused:
+                    reader, writer = idle.pop()
+                else:
+                    reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=True if secure else None)
+                    self.connections_opened += 1
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, headers, body, keep_alive = await _read_response(reader, self.max_response_bytes)
+                except (OSError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        #the server may have closed the idle connection, so tries a new one
+                        continue
+                    raise
+                except BaseException:
+                    #a timeout or cancellation leaves the response half read
+                    writer.close()
+                    raise
+                if keep_alive:
+                    idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, headers, body
+
+def exchange_rate(from_currency, to_currency, cache=None):
+    """
+    Finds the value of one unit of a currency in another, raising an error if it can't
+
+    Args:
+        from_currency (str): The source currency code.
+        to_currency (str): The target currency code.
+        cache (RateCache): Cache to get the rates from (default: the module's rate_cache).
+
+    Returns:
+        float: The exchange rate.
+
+    Raises:
+        Exception: If there's an issue with the API request or the currency codes.
+    """
+    if cache is None:
+        cache = rate_cache
+    rates = cache.get(from_currency)
+
+    #checks if from_currency and to_currency exists in the exchange rates data
+    if from_currency not in rates:
+        raise Exception(f"Currency code '{from_currency}' not found. Please use a valid currency code.")
+
+    if to_currency not in rates:
+        raise Exception(f"Currency code '{to_currency}' not found. Please use a valid currency code.")
+
+    return rates[to_currency]
+
+def convert_currency(amount, from_currency, to_currency, cache=None):
+    """
+    Converts an amount from one currency to another using the exchange rates from an external API.
+    Rates are kept in a RateCache, so they are only downloaded again once they are older than its ttl.
+
+    Args:
+        amount (float): The amount to be converted.
+        from_currency (str): The source currency code.
+        to_currency (str): The target currency code.
+        cache (RateCache): Cache to get the rates from (default: the module's rate_cache).
+
+    Returns:
+        float: The converted amount if successful, None if an error occurs.
+
+    Raises:
+        Exception: If there's an issue with the API request or the currency codes, raises an invalidation in the input.
+    """
+    
+    try:
+        return amount * exchange_rate(from_currency, to_currency, cache)
+    except Exception as e:
+        if is_request_error(e):
+            print(f"An error occurred: {e}")
+        else:
+            print(f"Error: {e}")
+        return None
+
+def convert_currency_batch(amounts, from_currencies, to_currency, cache=None):
+    """
+    Converts many amounts to one currency at once. The rates of each distinct source
+    currency are looked up once, and the amounts are converted with a single
+    vectorized multiply when numpy is installed.
+
+    Args:
+        amounts (sequence): The amounts to be converted (a list, array or numpy array).
+        from_currencies (str or sequence): One source currency code for all amounts,
+            or one code per amount.
+        to_currency (str): The target currency code.
+        cache (RateCache): Cache to get the rates from (default: the module's rate_cache).
+
+    Returns:
+        numpy.ndarray or list: The converted amounts (a numpy array if numpy is installed,
+        otherwise a list), None if an error occurs.
+    """
+    np = optional_numpy()
+    try:
+        if isinstance(from_currencies, str):
+            currencies = [from_currencies]
+        else:
+            if len(from_currencies) != len(amounts):
+                raise Exception(f"Got {len(amounts)} amounts but {len(from_currencies)} currency codes.")
+            if np is not None:
+                #distinct codes plus, for each amount, the position of its code among them
+                currencies, positions = np.unique(np.asarray(from_currencies, dtype=str), return_inverse=True)
+                currencies = currencies.tolist()
+            else:
+                currencies = list(dict.fromkeys(from_currencies))
+        factors = [exchange_rate(currency, to_currency, cache) for currency in currencies]
+
+        if np is not None:
+            amounts = np.asarray(amounts, dtype=np.float64)
+            if isinstance(from_currencies, str):
+                return amounts * factors[0]
+            return amounts * np.asarray(factors)[positions]
+        if isinstance(from_currencies, str):
+            return [amount * factors[0] for amount in amounts]
+        factor_of = dict(zip(currencies, factors))
+        return [amount * factor_of[currency] for amount, currency in zip(amounts, from_currencies)]
+    except Exception as e:
+        if is_request_error(e):
+            print(f"An error occurred: {e}")
+        else:
+            print(f"Error: {e}")
+        return None
+
+def valid_rate(rate):
+    """
+    Checks that an exchange rate can be used, and inverted
+
+    Args:
+        rate: the rate
+
+    Returns:
+        bool: True if it is a positive, finite number
+    """
+    return isinstance(rate, numbers.Real) and not isinstance(rate, bool) and 0 < rate < math.inf
+
+class RateTable:
+    """
+    Exchange rates by date kept in memory, so dated amounts can be converted at the
+    rate of their own date without downloading anything. Rates are stored per currency
+    pair; a date with no rate uses the latest earlier one, and a pair with no rates of
+    its own is derived through the pivot currency (EUR to GBP as EUR to USD to GBP).
+    """
+
+    def __init__(self, pivot='USD'):
         """
-        Adds a new asset/investment to the portfolio
-        
+        Initializes an empty table
+
         Args:
-            asset (str): name of the asset
-            amount (float): monetary cost of the asset
+            pivot (str): currency cross rates are derived through
+            days (dict): sorted day numbers with a rate, by (from_currency, to_currency)
+            rates (dict): the rates, in the same order as days, by (from_currency, to_currency)
         """
-        self.investments[asset] = amount
-        
-    def build_report(self, start_date, end_date):
+        self.pivot = pivot
+        self.days = {}
+        self.rates = {}
+
+    def __len__(self):
+        return sum(len(days) for days in self.days.values())
+
+    def add(self, date, from_currency, to_currency, rate):
         """
-        Generates a report for the specified start and end dates
-        
+        Stores the value of one unit of a currency in another on a date
+
         Args:
-            start_date (str): start date of reporting period
-            end_date (str): end date of reporting period
+            date (str): date of the rate in YYYY-MM-DD format
+            from_currency (str): The source currency code.
+            to_currency (str): The target currency code.
+            rate (float): The exchange rate.
 
-        Returns:
-        Comes back with a generate report from the beginning to end.
+        Raises:
+            ValueError: if the date is invalid or the rate is not a positive, finite number
         """
-        report = {
-            'Income': [inc for inc in self.income if start_date <= inc['date'] <= end_date],
-            'Expenses': [exp for exp in self.expenses if start_date <= exp['date'] <= end_date],
-            'Transactions': [tra for tra in self.transactions if start_date <= tra['date'] <= end_date],
-            'Investments': self.investments
-        }
-        
-        return report
+        if not valid_rate(rate):
+            raise ValueError(f"The rate from '{from_currency}' to '{to_currency}' must be a positive number, not {rate!r}.")
+        day = date_to_ordinal(date)
+        pair = (from_currency, to_currency)
+        days = self.days.setdefault(pair, [])
+        rates = self.rates.setdefault(pair, [])
+        i = bisect.bisect_left(days, day)
+        if i < len(days) and days[i] == day:
+            rates[i] = rate
+        else:
+            days.insert(i, day)
+            rates.insert(i, rate)
 
-    #If we use a JSON for the data, this is how we would save the data to a JSON file
-    def save_to_file(self, file_name):
+    def add_rates(self, date, base, rates):
         """
-        Saves the financial data to a JSON file.
+        Stores all the rates of one currency on a date, in the form the exchange rate API returns them.
+        Rates that are zero, negative or not finite are skipped, as they can't be used or inverted.
 
         Args:
-            file_name (str): file that the data will be saved to.
-        """        
-        
-        try:
-            with open(file_name, 'w') as file:
-                json.dump({'income': self.income, 'expenses': self.expenses}, file)
-            print("Data saved.")
-        except Exception as e:
-            print(f"An error occurred while saving: {e}")
+            date (str): date of the rates in YYYY-MM-DD format
+            base (str): The source currency code.
+            rates (dict): Maps each currency code to the value of one unit of base in that currency.
+        """
+        for to_currency, rate in rates.items():
+            if to_currency != base and valid_rate(rate):
+                self.add(date, base, to_currency, rate)
 
-    #If we use a JSON for the financial data, this will read it and update the classes 
-    def load_from_file(self, file_name):
+    def load(self, file_name):
         """
-        Loads financial data from a JSON file and updates the class attributes.
+        Reads rates from a JSON file holding a list of {"date", "base", "rates"} objects,
+        the form of the exchange rate API's answers
 
         Args:
-            file_name (str): file that the data will be saved to.
+            file_name (str): name of the file to read
+
+        Raises:
+            ValueError: if the file is not a list of dated rates
         """
-        
+        with open(file_name, 'r') as file:
+            entries = json.load(file)
         try:
-            with open(file_name, 'r') as file:
-                data = json.load(file)
-                if 'income' in data:
-                    self.income = data['income']
-                if 'expenses' in data:
-                    self.expenses = data['expenses']
-                if 'transactions' in data:
-                    self.transactions = data['transactions']
-                if 'investments' in data:
-                    for inv in data['investments']:
-                        self.investments[inv['asset']] = inv['amount']
-            print("Data loaded.")
-        except FileNotFoundError:
-            print("File not found.")
-        except Exception as e:
-            print(f"An error occurred while loading data: {e}")
+            for entry in entries:
+                self.add_rates(entry['date'], entry['base'], entry['rates'])
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError(f"{file_name} is not a list of {{\"date\", \"base\", \"rates\"}} objects.") from None
 
-class Investments:
-    """
-    Represents the user's investments
-    """
-    
-    def __init__(self, name):
+    def save(self, file_name):
         """
-        Initializes the portfolio with an empty list and name
-        
+        Writes the rates to a JSON file that load can read back
+
         Args:
-            name (str): name of the portfolio
+            file_name (str): name of the file to write
         """
-        self.name = name
-        self.investments = {} 
-        
-    def add_investment(self, asset, amount):
+        entries = {}
+        for (from_currency, to_currency), days in self.days.items():
+            for day, rate in zip(days, self.rates[(from_currency, to_currency)]):
+                entries.setdefault((day, from_currency), {})[to_currency] = rate
+        with open(file_name, 'w') as file:
+            json.dump([{'date': ordinal_to_date(day), 'base': base, 'rates': rates}
+                       for (day, base), rates in sorted(entries.items())], file, indent=4)
+
+    def _pair_rate(self, from_currency, to_currency, day):
         """
-        Adds a new asset/investment to the portfolio
-        
+        Finds the latest stored rate of a pair on or before a day, using the opposite pair if it is newer
+
         Args:
-            asset (str): name of the asset
-            amount (int): monetary cost of the asset
+            from_currency (str): The source currency code.
+            to_currency (str): The target currency code.
+            day (int): day number of the date
+
+        Returns:
+            float: the rate, None if neither pair has one on or before the day
         """
-        self.investments[asset] = amount
-        
-    def remove_investment(self, asset):
+        found_day, found = None, None
+        for pair, invert in (((from_currency, to_currency), False), ((to_currency, from_currency), True)):
+            days = self.days.get(pair)
+            if not days:
+                continue
+            i = bisect.bisect_right(days, day) - 1
+            if i >= 0 and (found_day is None or days[i] > found_day):
+                rate = self.rates[pair][i]
+                found_day, found = days[i], 1 / rate if invert else rate
+        return found
+
+    def rate_on(self, from_currency, to_currency, day):
         """
-        Removes an asset/investment from the portfolio
-        
+        Finds the value of one unit of a currency in another on a day
+
         Args:
-            asset (str): name of the asset that's being removed
+            from_currency (str): The source currency code.
+            to_currency (str): The target currency code.
+            day (int): day number of the date (see date_to_ordinal)
+
+        Returns:
+            float: The exchange rate.
+
+        Raises:
+            ValueError: if there is no rate for the currencies on or before the day
         """
-        if asset in self.investments:
-            del self.investments[asset]
+        if from_currency == to_currency:
+            return 1.0
+        rate = self._pair_rate(from_currency, to_currency, day)
+        if rate is None and self.pivot not in (from_currency, to_currency):
+            to_pivot = self._pair_rate(from_currency, self.pivot, day)
+            from_pivot = self._pair_rate(self.pivot, to_currency, day)
+            if to_pivot is not None and from_pivot is not None:
+                rate = to_pivot * from_pivot
+        if rate is None:
+            raise ValueError(f"No rate from '{from_currency}' to '{to_currency}' on or before {ordinal_to_date(day)}.")
+        return rate
 
-    def calculate_investment_growth(self, asset, growth_rate):
+    def rate(self, from_currency, to_currency, date):
         """
-        Calculates the growth of an investment
-        
+        Finds the value of one unit of a currency in another on a date
+
         Args:
-            asset (str): name of the asset
-            growth_rate (float): rate of growth (e.g., 0.05 for 5% growth)
-            
+            from_currency (str): The source currency code.
+            to_currency (str): The target currency code.
+            date (str): date in YYYY-MM-DD format
+
         Returns:
-            float: updated investment amount after growth
+            float: The exchange rate.
+
+        Raises:
+            ValueError: if the date is invalid or there is no rate for the currencies on or before it
         """
-        if asset in self.investments:
-            self.investments[asset] *= (1 + growth_rate)
-            return self.investments[asset]
-        else:
-            print("Investment not found.")
-            return None
+        return self.rate_on(from_currency, to_currency, date_to_ordinal(date))
 
-def convert_currency(amount, from_currency, to_currency):
+    def convert(self, amounts, from_currencies, to_currency, days):
+        """
+        Converts many dated amounts to one currency, each at the rate of its own date.
+        Each distinct currency and date is looked up once.
+
+        Args:
+            amounts (sequence): The amounts to be converted.
+            from_currencies (str or sequence): One source currency code for all amounts,
+                or one code per amount.
+            to_currency (str): The target currency code.
+            days (sequence): day number of the date of each amount
+
+        Returns:
+            numpy.ndarray or list: The converted amounts (a numpy array if numpy is installed,
+            otherwise a list).
+
+        Raises:
+            ValueError: if an amount has no rate on or before its date
+        """
+        if isinstance(from_currencies, str):
+            from_currencies = itertools.repeat(from_currencies, len(amounts))
+        elif len(from_currencies) != len(amounts):
+            raise ValueError(f"Got {len(amounts)} amounts but {len(from_currencies)} currency codes.")
+        if len(days) != len(amounts):
+            raise ValueError(f"Got {len(amounts)} amounts but {len(days)} dates.")
+        found = {}
+        factors = []
+        for key in zip(from_currencies, days):
+            factor = found.get(key)
+            if factor is None:
+                factor = found[key] = self.rate_on(key[0], to_currency, key[1])
+            factors.append(factor)
+
+        np = optional_numpy()
+        if np is not None:
+            return np.asarray(amounts, dtype=np.float64) * np.asarray(factors)
+        return [amount * factor for amount, factor in zip(amounts, factors)]
+
+def growth(investments, asset, growth_rate):
     """
-    Converts an amount from one currency to another using the exchange rates from an external API.
+    Applies growth to an asset for batch mode, raising an error instead of printing one if it is missing
 
     Args:
-        amount (float): The amount to be converted.
-        from_currency (str): The source currency code.
-        to_currency (str): The target currency code.
+        investments (Investments): the portfolio
+        asset (str): name of the asset
+        growth_rate (float): rate of growth (e.g., 0.05 for 5% growth)
 
     Returns:
-        float: The converted amount if successful, None if an error occurs.
+        float: updated investment amount after growth
+    """
+    if asset not in investments.investments:
+        raise ValueError(f"Investment '{asset}' not found.")
+    return investments.calculate_investment_growth(asset, growth_rate)
+
+def finite_float(text):
+    """
+    Reads a number argument in batch mode. nan and inf are rejected, as they can't be
+    added up and have no form in the JSON output.
+
+    Args:
+        text (str): the argument
+
+    Returns:
+        float: the number
 
     Raises:
-        Exception: If there's an issue with the API request or the currency codes, raises an invalidation in the input.
+        ValueError: if the argument is not a finite number
     """
-    
-    try:
-        url = f"https://api.exchangerate-api.com/v4/latest/{from_currency}"
-        response = requests.get(url)
-        data = response.json()
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"'{text}' is not a finite number.")
+    return value
 
-        #checks if from_currency and to_currency exists in the exchange rates data
-        if from_currency not in data['rates']:
-            raise Exception(f"Currency code '{from_currency}' not found. Please use a valid currency code.")
+def batch_commands(finances, investments):
+    """
+    Lists the commands available in batch mode
 
-        rates = data['rates']
+    Args:
+        finances (Finances): data the commands work on
+        investments (Investments): portfolio the commands work on
 
-        if to_currency not in rates:
-            raise Exception(f"Currency code '{to_currency}' not found. Please use a valid currency code.")
+    Returns:
+        dict: maps each command to (function, types of its arguments, number of required arguments)
+    """
+    return {
+        'add_income': (finances.add_income, (str, finite_float, str), 3),
+        'add_expense': (finances.add_expense, (str, finite_float, str), 3),
+        'add_transaction': (finances.add_transaction, (str, str, finite_float, str), 4),
+        'add_investment': (investments.add_investment, (str, finite_float), 2),
+        'report': (finances.build_report, (str, str), 2),
+        'total': (finances.total, (str, str, str), 3),
+        'aggregate': (finances.aggregate, (str, str, str, str), 2),
+        'search': (finances.search, (str, str, str), 1),
+        'select': (finances.select, (str, str, str, str), 2),
+        'save': (finances._save, (str,), 1),
+        'load': (finances._load, (str,), 1),
+        'convert': (lambda amount, from_currency, to_currency: amount * exchange_rate(from_currency, to_currency),
+                    (finite_float, str, str), 3),
+        'growth': (lambda asset, growth_rate: growth(investments, asset, growth_rate), (str, finite_float), 2),
+        'income': (lambda: list(finances.income), (), 0),
+        'expenses': (lambda: list(finances.expenses), (), 0),
+        'transactions': (lambda: list(finances.transactions), (), 0),
+        'investments': (lambda: investments.investments, (), 0),
+    }
 
-        return amount * rates[to_currency]
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
-        return None
-    except Exception as e:
-        print(f"Error: {e}")
-        return None
+def run_batch(lines, finances, investments, output=sys.stdout):
+    """
+    Runs commands without the menu, one per line, against a single Finances and Investments.
+    Each line is a command followed by its arguments, split like a shell command line
+    (quote arguments that contain spaces), e.g.
+
+        add_income "Work Salary" 2000 2024-05-01
+        report 2024-05-01 2024-05-31
+
+    Blank lines and lines starting with # are skipped. See batch_commands for the commands.
+    One JSON object is written per command: {"line", "command", "ok", and "result" or "error"},
+    plus "message" with anything the command printed.
+
+    Args:
+        lines (iterable): the command lines
+        finances (Finances): data the commands work on
+        investments (Investments): portfolio the commands work on
+        output: file the JSON lines are written to
+
+    Returns:
+        int: number of commands that failed
+    """
+    commands = batch_commands(finances, investments)
+    failed = 0
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        entry = {'line': number}
+        printed = io.StringIO()
+        try:
+            name, *args = shlex.split(line)
+            entry['command'] = name
+            if name not in commands:
+                raise ValueError(f"Unknown command '{name}'.")
+            function, types, required = commands[name]
+            if not required <= len(args) <= len(types):
+                raise ValueError(f"'{name}' takes {required} to {len(types)} arguments but got {len(args)}.")
+            with contextlib.redirect_stdout(printed):
+                result = function(*[kind(arg) for kind, arg in zip(types, args)])
+            entry['ok'] = True
+            entry['result'] = result
+        except Exception as e:
+            entry['ok'] = False
+            entry['error'] = str(e)
+            failed += 1
+        if printed.getvalue():
+            entry['message'] = printed.getvalue().strip()
+        output.write(json.dumps(entry, default=list) + '\n')
+    return failed
 
-def main():
+def main(argv=None):
     """
     Runs the Financial Management System.
+
+    Args:
+        argv (list): command line arguments; with none, the interactive menu is shown,
+            and with --batch FILE the commands in FILE are run instead (see run_batch)
     """
+    if argv:
+        parser = argparse.ArgumentParser(description="Financial Management System")
+        parser.add_argument("--batch", required=True, metavar="FILE",
+                            help="run the commands in FILE ('-' for standard input) and print the results as JSON lines")
+        parser.add_argument("--currency", metavar="CODE",
+                            help="keep amounts as whole minor units of this currency (e.g. cents for USD)")
+        args = parser.parse_args(argv)
+        finances = Finances(currency=args.currency)
+        investments = Investments("My Portfolio", args.currency)
+        if args.batch == '-':
+            failed = run_batch(sys.stdin, finances, investments)
+        else:
+            with open(args.batch, 'r') as file:
+                failed = run_batch(file, finances, investments)
+        sys.exit(1 if failed else 0)
+
     print("Welcome to the Financial Management System!")
     
     finances = Finances()
@@ -255,21 +4225,30 @@ def main():
             source = input("Enter the name of the income source: ")
             amount = float(input("Enter the $ from this income source: "))
             date = input("Enter the date this occurred (YYYY-MM-DD): ")
-            finances.add_income(source, amount, date)
-            print("Income added successfully.")
+            try:
+                finances.add_income(source, amount, date)
+                print("Income added successfully.")
+            except ValueError as e:
+                print(e)
         elif choice == '2':
             category = input("Enter the name of the expense category: ")
             amount = float(input("Enter the cost ($) of this expense: "))
             date = input("Enter the date this occurred (YYYY-MM-DD): ")
-            finances.add_expense(category, amount, date)
-            print("Expense category added successfully.")
+            try:
+                finances.add_expense(category, amount, date)
+                print("Expense category added successfully.")
+            except ValueError as e:
+                print(e)
         elif choice == '3':
             date = input("Enter the date of the transaction (YYYY-MM-DD): ")
             category = input("Enter the category of the transaction (income/expense/savings): ")
             amount = float(input("Enter the amount of the transaction: "))
             description = input("Enter a description of the transaction: ")
-            finances.add_transaction(date, category, amount, description)
-            print("Transaction added successfully.")
+            try:
+                finances.add_transaction(date, category, amount, description)
+                print("Transaction added successfully.")
+            except ValueError as e:
+                print(e)
         elif choice == '4':
             asset = input("Enter the name of the asset: ")
             amount = float(input("Enter the amount of the investment: "))
@@ -278,9 +4257,12 @@ def main():
         elif choice == '5':
             start_date = input("Enter start date (YYYY-MM-DD): ")
             end_date = input("Enter end date (YYYY-MM-DD): ")
-            report = finances.build_report(start_date, end_date)
-            print("Report:")
-            print(report)
+            try:
+                report = finances.build_report(start_date, end_date)
+                print("Report:")
+                print(report)
+            except ValueError as e:
+                print(e)
         elif choice == '6':
             file_name = input("Enter the file name to save data to: ")
             finances.save_to_file(file_name)
@@ -323,4 +4305,4 @@ def main():
             print("Invalid choice. Please try again.")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
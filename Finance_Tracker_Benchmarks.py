@@ -0,0 +1,454 @@
+"""
+Benchmarks for the Financial Management System
+
+Times the hot paths of Finances, Investments and the save/load code on synthetic
+data shaped like Sample_Data.json, and writes the results as JSON so runs from
+different commits can be compared.
+
+Usage:
+    python Finance_Tracker_Benchmarks.py --sizes 1000,100000 --output results.json
+    python Finance_Tracker_Benchmarks.py --compare old_results.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+def load_module():
+    """
+    Imports the Financial Management System module
+
+    Returns:
+        module: the Finance_Tracker module
+    """
+    try:
+        import Finance_Tracker
+    except ImportError:
+        #the module is checked in as "Finance_Tracker (4).py", which can't be imported by name
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Finance_Tracker (4).py")
+        spec = importlib.util.spec_from_file_location("Finance_Tracker", path)
+        Finance_Tracker = importlib.util.module_from_spec(spec)
+        sys.modules["Finance_Tracker"] = Finance_Tracker
+        spec.loader.exec_module(Finance_Tracker)
+    return Finance_Tracker
+
+#run in a fresh interpreter to time importing the module on its own
+STARTUP_SCRIPT = """
+import importlib.util, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('Finance_Tracker', sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(time.perf_counter() - start, 'requests' in sys.modules, 'numpy' in sys.modules)
+"""
+
+Finance_Tracker = load_module()
+
+INCOME_SOURCES = ["Salary", "Freelance Work", "Investment Dividends", "Rental Income", "Bonus",
+                  "Interest Income", "Consulting Fees", "Part-Time Job", "Side Business Revenue", "Royalties"]
+EXPENSE_CATEGORIES = ["Rent", "Groceries", "Utilities", "Transportation", "Dining Out",
+                      "Entertainment", "Medical Expenses", "Shopping", "Insurance", "Education"]
+DESCRIPTIONS = ["Payment from Client A", "Dinner with friends", "Dividend from Stocks", "Doctor's Appointment",
+                "Royalty Payment", "Shopping Spree", "Consulting Fee", "Part-Time Job Payment", "Uber ride"]
+START_DATE = datetime.date(2020, 1, 1)
+
+#sizes of the windows build_report is timed with, in days
+REPORT_WINDOWS = {'day': 1, 'month': 30, 'quarter': 91, 'year': 365}
+
+def generate_rows(rows, seed=0, days=5 * 365):
+    """
+    Generates synthetic records for each dated list, dated in order over a number of days
+
+    Args:
+        rows (int): number of records per list
+        seed (int): seed for the random numbers, so runs are reproducible
+        days (int): number of days the records are spread over
+
+    Returns:
+        dict: 'income', 'expenses' and 'transactions' lists of tuples in add_* argument order
+    """
+    rng = random.Random(seed)
+    dates = [(START_DATE + datetime.timedelta(days=i * days // rows)).isoformat() for i in range(rows)]
+    return {
+        'income': [(rng.choice(INCOME_SOURCES), round(rng.uniform(50, 5000), 2), date) for date in dates],
+        'expenses': [(rng.choice(EXPENSE_CATEGORIES), round(rng.uniform(5, 1500), 2), date) for date in dates],
+        'transactions': [(date, rng.choice(('income', 'expense', 'savings')), round(rng.uniform(5, 2000), 2),
+                          rng.choice(DESCRIPTIONS)) for date in dates],
+    }
+
+def generate_data(rows, seed=0):
+    """
+    Generates a dataset in the same format as Sample_Data.json
+
+    Args:
+        rows (int): number of records per list
+        seed (int): seed for the random numbers
+
+    Returns:
+        dict: data ready to be written with json.dump
+    """
+    data = {ledger: [dict(zip(Finance_Tracker.LEDGER_FIELDS[ledger], row)) for row in records]
+            for ledger, records in generate_rows(rows, seed).items()}
+    data['investments'] = [{'asset': f"Asset {i}", 'amount': 1000 * (i + 1)} for i in range(10)]
+    return data
+
+def fill(finances, rows):
+    """
+    Adds generated records to a Finances object through add_*
+
+    Args:
+        finances (Finances): object to fill
+        rows (dict): records from generate_rows
+    """
+    for source, amount, date in rows['income']:
+        finances.add_income(source, amount, date)
+    for category, amount, date in rows['expenses']:
+        finances.add_expense(category, amount, date)
+    for date, category, amount, description in rows['transactions']:
+        finances.add_transaction(date, category, amount, description)
+
+def measure(function, repeat=3):
+    """
+    Times a function, keeping the best of several runs
+
+    Args:
+        function (callable): function to time; it is called with no arguments
+        repeat (int): number of runs
+
+    Returns:
+        float: fastest run in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def result(name, size, seconds, operations, **extra):
+    """
+    Builds one benchmark result
+
+    Args:
+        name (str): name of the benchmark
+        size (int): number of records per list
+        seconds (float): time taken
+        operations (int): number of operations done in that time
+
+    Returns:
+        dict: the result
+    """
+    return dict(name=name, size=size, seconds=seconds, ops_per_sec=operations / seconds if seconds else None, **extra)
+
+def fill_bulk(finances, rows):
+    """
+    Adds generated records to a Finances object through extend_*, one batch per list
+
+    Args:
+        finances (Finances): object to fill
+        rows (dict): records from generate_rows
+    """
+    finances.extend_income(rows['income'])
+    finances.extend_expenses(rows['expenses'])
+    finances.extend_transactions(rows['transactions'])
+
+def bench_ingestion(size, storage, repeat):
+    """Times adding size records to each dated list through add_* and through extend_*."""
+    rows = generate_rows(size)
+    seconds = measure(lambda: fill(Finance_Tracker.Finances(storage=storage), rows), repeat)
+    results = [result('add_records', size, seconds, 3 * size, storage=storage)]
+    seconds = measure(lambda: fill_bulk(Finance_Tracker.Finances(storage=storage), rows), repeat)
+    results.append(result('extend_records', size, seconds, 3 * size, storage=storage))
+    return results
+
+def bench_reports(size, storage, repeat):
+    """
+    Times build_report for windows of a day, month, quarter and year in the middle of the data,
+    without and with the report cache
+    """
+    finances = Finance_Tracker.Finances(storage=storage)
+    fill(finances, generate_rows(size))
+    middle = START_DATE + datetime.timedelta(days=2 * 365)
+    results = []
+    for cached in (False, True):
+        finances.report_cache = Finance_Tracker.ReportCache() if cached else None
+        for window, days in REPORT_WINDOWS.items():
+            end = (middle + datetime.timedelta(days=days - 1)).isoformat()
+            calls = 100
+            seconds = measure(lambda: [finances.build_report(middle.isoformat(), end) for _ in range(calls)], repeat)
+            extra = {'cached': True} if cached else {}
+            results.append(result('build_report', size, seconds, calls, storage=storage, window=window, **extra))
+    return results
+
+def bench_dashboard(size, storage, repeat, inserts=200):
+    """Times adding records to the latest month while keeping its report current, rebuilt each time or materialized."""
+    finances = Finance_Tracker.Finances(storage=storage)
+    fill(finances, generate_rows(size))
+    last = START_DATE + datetime.timedelta(days=5 * 365)
+    start, end = (last - datetime.timedelta(days=29)).isoformat(), last.isoformat()
+
+    def rebuilt():
+        for i in range(inserts):
+            finances.add_expense("Groceries", i, end)
+            finances.build_report(start, end)
+
+    seconds = measure(rebuilt, repeat)
+    results = [result('dashboard', size, seconds, inserts, storage=storage, report='rebuilt')]
+
+    report = finances.materialize(start, end)
+
+    def materialized():
+        for i in range(inserts):
+            finances.add_expense("Groceries", i, end)
+            report.report
+
+    seconds = measure(materialized, repeat)
+    results.append(result('dashboard', size, seconds, inserts, storage=storage, report='materialized'))
+    report.close()
+    return results
+
+def bench_search(size, storage, repeat):
+    """Times finding one year's Uber transactions with the description index, against scanning every transaction."""
+    finances = Finance_Tracker.Finances(storage=storage)
+    fill_bulk(finances, generate_rows(size))
+
+    def build():
+        finances._text_index = None
+        finances.search("uber", "2021-01-01", "2021-12-31")
+
+    def scan():
+        return [record for record in finances.transactions
+                if "uber" in record['description'].lower() and "2021-01-01" <= record['date'] <= "2021-12-31"]
+
+    results = [result('search', size, measure(build, repeat), size, storage=storage, indexed='build')]
+    seconds = measure(lambda: finances.search("uber", "2021-01-01", "2021-12-31"), repeat)
+    results.append(result('search', size, seconds, 1, storage=storage, indexed=True))
+    results.append(result('search', size, measure(scan, repeat), 1, storage=storage, indexed=False))
+    return results
+
+def bench_persistence(size, storage, repeat):
+    """Times save_to_file and load_from_file (binary snapshots, and JSON in one go and streamed)."""
+    results = []
+    finances = Finance_Tracker.Finances(storage=storage)
+    fill(finances, generate_rows(size))
+    with tempfile.TemporaryDirectory() as directory:
+        saved = os.path.join(directory, "saved.json")
+        seconds = measure(lambda: finances.save_to_file(saved), repeat)
+        results.append(result('save_to_file', size, seconds, 3 * size, storage=storage,
+                              bytes_per_sec=os.path.getsize(saved) / seconds))
+
+        snapshot = os.path.join(directory, "saved.snap")
+        seconds = measure(lambda: finances.save_to_file(snapshot, binary=True), repeat)
+        results.append(result('save_to_file', size, seconds, 3 * size, storage=storage, binary=True,
+                              bytes_per_sec=os.path.getsize(snapshot) / seconds))
+        seconds = measure(lambda: Finance_Tracker.Finances(storage=storage).load_from_file(snapshot), repeat)
+        results.append(result('load_from_file', size, seconds, 3 * size, storage=storage, binary=True,
+                              bytes_per_sec=os.path.getsize(snapshot) / seconds))
+
+        data_file = os.path.join(directory, "data.json")
+        with open(data_file, 'w') as file:
+            json.dump(generate_data(size), file)
+        file_size = os.path.getsize(data_file)
+        for stream in (False, True):
+            seconds = measure(lambda: Finance_Tracker.Finances(storage=storage).load_from_file(data_file, stream=stream), repeat)
+            results.append(result('load_from_file', size, seconds, 3 * size, storage=storage, stream=stream,
+                                  bytes_per_sec=file_size / seconds))
+    return results
+
+def bench_multi_file_load(size, storage, repeat, files=8):
+    """Times load_files on the same records split across several files, in one process and in a pool."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        file_names = []
+        for k in range(files):
+            file_name = os.path.join(directory, f"account_{k}.json")
+            with open(file_name, 'w') as file:
+                json.dump(generate_data(size // files, seed=k), file)
+            file_names.append(file_name)
+        for workers in (1, None):
+            seconds = measure(lambda: Finance_Tracker.Finances(storage=storage).load_files(file_names, workers), repeat)
+            results.append(result('load_files', size, seconds, 3 * size, storage=storage, files=files,
+                                  pool=workers is None))
+    return results
+
+def bench_conversion(size, repeat):
+    """Times convert_currency and convert_currency_batch against an in-process fetcher, and dated conversion from a RateTable."""
+    rates = {'USD': {'USD': 1.0, 'EUR': 0.9, 'GBP': 0.8}, 'EUR': {'EUR': 1.0, 'USD': 1.1, 'GBP': 0.85}}
+    cache = Finance_Tracker.RateCache(fetcher=rates.__getitem__)
+    amounts = [float(i % 1000) for i in range(size)]
+    currencies = ['USD' if i % 2 else 'EUR' for i in range(size)]
+    seconds = measure(lambda: [Finance_Tracker.convert_currency(amount, 'USD', 'GBP', cache) for amount in amounts], repeat)
+    results = [result('convert_currency', size, seconds, size)]
+    seconds = measure(lambda: Finance_Tracker.convert_currency_batch(amounts, currencies, 'GBP', cache), repeat)
+    results.append(result('convert_currency_batch', size, seconds, size))
+
+    table = Finance_Tracker.RateTable()
+    first = Finance_Tracker.date_to_ordinal("2024-01-01")
+    for day in range(first, first + 365):
+        table.add_rates(Finance_Tracker.ordinal_to_date(day), 'USD', {'EUR': 0.9 + day % 10 / 100, 'GBP': 0.8})
+    days = [first + i % 365 for i in range(size)]
+    seconds = measure(lambda: table.convert(amounts, currencies, 'GBP', days), repeat)
+    results.append(result('rate_table_convert', size, seconds, size, dates=365))
+    return results
+
+def bench_projection(repeat, paths=10000, periods=12, assets=5):
+    """Times a Monte Carlo projection of a portfolio, in one process and spread over a pool."""
+    investments = Finance_Tracker.Investments("Benchmark")
+    for i in range(assets):
+        investments.add_investment(f"Asset {i}", 1000 * (i + 1))
+    results = []
+    for workers in (1, None):
+        seconds = measure(lambda: investments.project(periods, 0.005, 0.04, paths=paths, seed=0, workers=workers), repeat)
+        results.append(result('project', paths, seconds, paths * periods * assets, periods=periods, assets=assets,
+                              pool=workers is None))
+    return results
+
+def bench_growth(repeat, periods=360, assets=50):
+    """Times compounding a whole portfolio over many periods, one call per asset and period or in one pass."""
+    investments = Finance_Tracker.Investments("Benchmark")
+    for i in range(assets):
+        investments.add_investment(f"Asset {i}", 1000 * (i + 1))
+    rates = [[0.001 * (i % 7) for i in range(assets)] for _ in range(periods)]
+
+    def one_at_a_time():
+        portfolio = Finance_Tracker.Investments("Copy")
+        portfolio.investments = dict(investments.investments)
+        for row in rates:
+            for asset, rate in zip(investments.investments, row):
+                portfolio.calculate_investment_growth(asset, rate)
+
+    seconds = measure(one_at_a_time, repeat)
+    results = [result('growth', periods, seconds, periods * assets, assets=assets, vectorized=False)]
+    seconds = measure(lambda: investments.grow(rates), repeat)
+    results.append(result('growth', periods, seconds, periods * assets, assets=assets, vectorized=True))
+    return results
+
+def bench_startup(repeat):
+    """
+    Times importing the module in a fresh interpreter, as a script calling the tool would,
+    and records whether that pulled in requests or numpy
+    """
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, Finance_Tracker.__file__],
+                                capture_output=True, text=True, check=True).stdout.split()
+        if best is None or float(output[0]) < float(best[0]):
+            best = output
+    return [result('import', 1, float(best[0]), 1, imports_requests=best[1] == 'True', imports_numpy=best[2] == 'True')]
+
+def run(sizes, storages, repeat):
+    """
+    Runs every benchmark for every size
+
+    Args:
+        sizes (list): numbers of records per list
+        storages (list): Finances storage options to time
+        repeat (int): number of runs per benchmark (the fastest is kept)
+
+    Returns:
+        list: benchmark results
+    """
+    results = bench_startup(repeat)
+    results += bench_projection(repeat)
+    results += bench_growth(repeat)
+    for size in sizes:
+        for storage in storages:
+            results += bench_ingestion(size, storage, repeat)
+            results += bench_reports(size, storage, repeat)
+            results += bench_dashboard(size, storage, repeat)
+            results += bench_search(size, storage, repeat)
+            results += bench_persistence(size, storage, repeat)
+            results += bench_multi_file_load(size, storage, repeat)
+        results += bench_conversion(size, repeat)
+    return results
+
+def environment():
+    """
+    Describes where the benchmarks ran, so results from different commits can be told apart
+
+    Returns:
+        dict: commit, python version, platform and time of the run
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': Finance_Tracker.optional_numpy() is not None,
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+def result_key(entry):
+    """
+    Identifies a benchmark result independently of its timing
+
+    Args:
+        entry (dict): a benchmark result
+
+    Returns:
+        tuple: every field of the result except the measurements
+    """
+    return tuple(sorted((key, value) for key, value in entry.items()
+                        if key not in ('seconds', 'ops_per_sec', 'bytes_per_sec')))
+
+def compare(old, new, file=sys.stdout):
+    """
+    Prints how much faster or slower each benchmark got between two runs
+
+    Args:
+        old (dict): earlier output of this script
+        new (dict): later output of this script
+        file: where to print the comparison
+    """
+    old_results = {result_key(entry): entry for entry in old['results']}
+    for entry in new['results']:
+        before = old_results.get(result_key(entry))
+        if before is None:
+            continue
+        label = ", ".join(f"{key}={value}" for key, value in result_key(entry))
+        print(f"{before['seconds'] / entry['seconds']:6.2f}x  {label}", file=file)
+
+def main(argv=None):
+    """
+    Runs the benchmarks from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the Financial Management System.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated records per list, e.g. 1000,10000000 (default: %(default)s)")
+    parser.add_argument("--storage", default="list,columnar", help="Finances storage options to time (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the fastest is kept (default: %(default)s)")
+    parser.add_argument("--output", help="file to write the JSON results to (default: standard output)")
+    parser.add_argument("--compare", help="earlier results file to compare this run against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    output = {'environment': environment(), 'results': run(sizes, args.storage.split(","), args.repeat)}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            #keep standard output valid JSON when the results are printed there
+            compare(json.load(file), output, sys.stdout if args.output else sys.stderr)
+
+if __name__ == "__main__":
+    main()
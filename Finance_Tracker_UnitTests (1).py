@@ -1,6 +1,39 @@
+import asyncio
+import http.server
+import io
+import json
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
+import urllib.request
 import Finance_Tracker
 
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Sample_Data.json")
+
+#loads the module from its file under a name that new processes can't import, as the
+#benchmarks do, makes pools start their processes fresh, then runs the code in argv[2]
+SPAWN_SCRIPT = """
+import importlib.util, multiprocessing, sys
+multiprocessing.set_start_method('spawn')
+spec = importlib.util.spec_from_file_location('Finance_Tracker', sys.argv[1])
+Finance_Tracker = importlib.util.module_from_spec(spec)
+sys.modules['Finance_Tracker'] = Finance_Tracker
+spec.loader.exec_module(Finance_Tracker)
+exec(sys.argv[2])
+"""
+
+def run_spawned(code, *args):
+    """Runs code with SPAWN_SCRIPT in a fresh interpreter and returns what it printed."""
+    env = {name: value for name, value in os.environ.items() if name != 'PYTHONPATH'}
+    with tempfile.TemporaryDirectory() as directory:
+        return subprocess.run([sys.executable, "-c", SPAWN_SCRIPT, os.path.realpath(Finance_Tracker.__file__), code, *args],
+                              cwd=directory, env=env, capture_output=True, text=True, check=True, timeout=300).stdout
+
 class TestFinanceMethods(unittest.TestCase):
     def setUp(self):
         """Setup for each test case; ensures each test is independent."""
@@ -55,6 +88,71 @@ class TestFinanceMethods(unittest.TestCase):
         self.assertEqual(report['Expenses'][0], {'category': 'Rent', 'amount': 1000, 'date': '2024-05-05'})
         self.assertEqual(report['Transactions'][0], {'date': '2024-05-10', 'category': 'Expense', 'amount': 50, 'description': 'Groceries'})
 
+    def test_build_report_uses_date_order(self):
+        """Reports return only the records inside the window, sorted by date."""
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+        self.finances.add_expense("Groceries", 80, "2024-04-20")
+        self.finances.add_expense("Utilities", 150, "2024-05-02")
+        self.finances.add_expense("Dining Out", 60, "2024-06-01")
+        report = self.finances.build_report("2024-04-20", "2024-05-05")
+        self.assertEqual([exp['category'] for exp in report['Expenses']], ["Groceries", "Utilities", "Rent"])
+
+    def test_build_report_after_direct_append(self):
+        """Records appended to the lists directly still show up in reports."""
+        self.finances.add_income("Work Salary", 2000, "2024-05-01")
+        self.finances.income.append({'source': "Bonus", 'amount': 500, 'date': "2024-05-03"})
+        report = self.finances.build_report("2024-05-02", "2024-05-31")
+        self.assertEqual(report['Income'], [{'source': "Bonus", 'amount': 500, 'date': "2024-05-03"}])
+
+    def test_build_report_after_replacing_lists(self):
+        """Lists replaced with ones of the same length, or edited then reindexed, give correct reports and totals."""
+        self.finances.add_income("Work Salary", 2000, "2024-05-01")
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+        self.finances.income = [{'source': "Bonus", 'amount': 500, 'date': "2024-06-03"}]
+        self.finances.expenses[0]['date'] = "2024-06-10"
+        self.finances.expenses[0]['category'] = "Travel"
+        self.finances.reindex()
+        report = self.finances.build_report("2024-06-01", "2024-06-30")
+        self.assertEqual(report['Income'], [{'source': "Bonus", 'amount': 500, 'date': "2024-06-03"}])
+        self.assertEqual([exp['category'] for exp in report['Expenses']], ["Travel"])
+        self.assertEqual(self.finances.total('income', "2024-06-01", "2024-06-30"), 500)
+        self.assertEqual(self.finances.total('expenses', "2024-05-01", "2024-05-31"), 0)
+        self.assertEqual(self.finances.select('expenses', "Travel"), self.finances.expenses)
+
+    def test_period_totals(self):
+        """Totals over a period match summing the report, including out-of-order entries."""
+        self.finances.add_income("Work Salary", 2000, "2024-05-01")
+        self.finances.add_income("Bonus", 500, "2024-06-15")
+        self.finances.add_income("Refund", 25, "2024-05-20")
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+        self.finances.add_transaction("2024-05-10", "Expense", 50, "Groceries")
+        self.finances.add_transaction("2024-05-12", "income", 80, "Sold a chair")
+        self.assertEqual(self.finances.total('income', "2024-05-01", "2024-05-31"), 2025)
+        self.assertEqual(self.finances.total('income', "2024-05-02", "2024-06-30"), 525)
+        self.assertEqual(self.finances.total('transactions', "2024-05-01", "2024-05-31"), 30)
+        self.assertEqual(self.finances.net_cash_flow("2024-05-01", "2024-05-31"), 1025)
+        self.assertEqual(self.finances.total('expenses', "2024-07-01", "2024-07-31"), 0)
+
+    def test_dates_without_leading_zeros(self):
+        """Dates like 2024-5-1 are stored as 2024-05-01 and sorted as dates, not as text."""
+        self.finances.add_expense("Rent", 1000, "2024-10-01")
+        self.finances.add_expense("Utilities", 150, "2024-5-1")
+        self.finances.extend_expenses([("Dining Out", 60, "2024-5-20")])
+        self.assertEqual(self.finances.expenses[1]['date'], "2024-05-01")
+        self.assertEqual(self.finances.expenses[2]['date'], "2024-05-20")
+        report = self.finances.build_report("2024-5-1", "2024-12-31")
+        self.assertEqual([exp['category'] for exp in report['Expenses']], ["Utilities", "Dining Out", "Rent"])
+        self.assertEqual(self.finances.total('expenses', "2024-05-01", "2024-5-31"), 210)
+
+    def test_invalid_dates_are_rejected(self):
+        """Dates that are not real YYYY-MM-DD dates raise ValueError and add nothing."""
+        for date in ("2024-02-30", "05/01/2024", "2024-05", "", "2024-005-01"):
+            with self.assertRaises(ValueError):
+                self.finances.add_income("Work Salary", 2000, date)
+        self.assertEqual(self.finances.income, [])
+        with self.assertRaises(ValueError):
+            self.finances.build_report("2024-13-01", "2024-12-31")
+
     def test_save_to_file(self, mock_open):
         file_name = "test.json"
         self.finances.save_to_file(file_name)
@@ -100,5 +198,1149 @@ class TestFinanceMethods(unittest.TestCase):
         )
         self.assertEqual(mock_stdout.write.call_args[0][0], expected_output)
         
+class TestBulkIngestion(unittest.TestCase):
+    def setUp(self):
+        """Setup finances with one record per list to add batches to."""
+        self.finances = Finance_Tracker.Finances()
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+
+    def test_extend_with_tuples(self):
+        """Tuples are added like add_* calls, and reports and totals include them."""
+        added = self.finances.extend_expenses([("Groceries", 80, "2024-05-02"), ("Utilities", 150, "2024-05-09")])
+        self.assertEqual(added, 2)
+        self.assertEqual(self.finances.expenses[1], {'category': "Groceries", 'amount': 80, 'date': "2024-05-02"})
+        report = self.finances.build_report("2024-05-01", "2024-05-31")
+        self.assertEqual([exp['category'] for exp in report['Expenses']], ["Groceries", "Rent", "Utilities"])
+        self.assertEqual(self.finances.total('expenses', "2024-05-03", "2024-05-31"), 1150)
+
+    def test_extend_with_columns(self):
+        """A dict of columns is added to either storage."""
+        columns = {'date': ["2024-05-10", "2024-05-11"], 'category': ["expense", "income"],
+                   'amount': [50, 200], 'description': ["Groceries", "Refund"]}
+        for storage in ('list', 'columnar'):
+            finances = Finance_Tracker.Finances(storage=storage)
+            finances.extend_transactions(columns)
+            self.assertEqual(finances.transactions[1], {'date': "2024-05-11", 'category': "income", 'amount': 200, 'description': "Refund"})
+            self.assertEqual(finances.total('transactions', "2024-05-01", "2024-05-31"), 150)
+
+    def test_extend_with_dicts(self):
+        """Dicts are copied with only the list's fields, so the batch is never shared or changed."""
+        rows = [{'source': "Bonus", 'amount': 500, 'date': "2024-5-3", 'note': "yearly"}]
+        for storage in ('list', 'columnar'):
+            finances = Finance_Tracker.Finances(storage=storage)
+            finances.extend_income(rows)
+            self.assertEqual(finances.income[0], {'source': "Bonus", 'amount': 500, 'date': "2024-05-03"})
+            self.assertIsNot(finances.income[0], rows[0])
+        self.assertEqual(rows[0]['date'], "2024-5-3")
+
+    def test_batch_is_checked_first(self):
+        """A bad record rejects the whole batch before anything is added."""
+        with self.assertRaises(ValueError):
+            self.finances.extend_income([("Work Salary", 2000, "2024-05-01"), ("Bonus", "lots", "2024-05-02")])
+        with self.assertRaises(ValueError):
+            self.finances.extend_income([("Work Salary", 2000, "May 1st")])
+        self.assertEqual(self.finances.income, [])
+
+class TestBinarySnapshot(unittest.TestCase):
+    def setUp(self):
+        """Setup a temporary snapshot file and finances loaded from the sample data."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "data.snap")
+        self.finances = Finance_Tracker.Finances()
+        self.finances.load_from_file(SAMPLE_DATA)
+        self.finances.add_expense("Late Fee", 25, "2024-04-30")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """A snapshot loads back into either storage with every list and investment, in date order."""
+        self.finances.save_to_file(self.file_name, binary=True)
+        by_date = lambda records: sorted(records, key=lambda record: record['date'])
+        for storage in ('list', 'columnar'):
+            loaded = Finance_Tracker.Finances(storage=storage)
+            loaded.load_from_file(self.file_name)
+            for ledger in Finance_Tracker.LEDGERS:
+                self.assertEqual(list(getattr(loaded, ledger)), by_date(getattr(self.finances, ledger)))
+            self.assertEqual(loaded.investments, self.finances.investments)
+            self.assertEqual(loaded.build_report("2024-04-01", "2024-04-30")['Expenses'][0]['category'], "Late Fee")
+
+    def test_load_over_same_length(self):
+        """Loading a snapshot over a list of the same length selects by the snapshot's categories."""
+        snapshot = Finance_Tracker.Finances()
+        snapshot.extend_expenses([("Food", 40, "2024-05-01"), ("Rent", 900, "2024-05-02")])
+        snapshot.save_to_file(self.file_name, binary=True)
+        loaded = Finance_Tracker.Finances()
+        loaded.extend_expenses([("Rent", 800, "2024-04-01"), ("Travel", 300, "2024-04-02")])
+        self.assertEqual(len(loaded.select('expenses', "Rent")), 1)
+        loaded.load_from_file(self.file_name)
+        self.assertEqual(loaded.select('expenses', "Rent"), [{'category': "Rent", 'amount': 900, 'date': "2024-05-02"}])
+        self.assertEqual(loaded.select('expenses', "Travel"), [])
+
+    def test_damaged_file_is_rejected(self):
+        """A snapshot whose bytes were changed fails its checksum and loads nothing."""
+        self.finances.save_to_file(self.file_name, binary=True)
+        with open(self.file_name, 'r+b') as file:
+            file.seek(-3, os.SEEK_END)
+            file.write(b'\xff')
+        loaded = Finance_Tracker.Finances()
+        loaded.load_from_file(self.file_name)
+        self.assertEqual(loaded.income, [])
+        with open(self.file_name, 'rb') as file:
+            with self.assertRaises(ValueError):
+                Finance_Tracker.read_snapshot(file.read())
+
+    def test_damaged_counts_are_rejected(self):
+        """Record counts in the header are covered by the checksum and checked against the contents."""
+        self.finances.save_to_file(self.file_name, binary=True)
+        with open(self.file_name, 'rb') as file:
+            data = bytearray(file.read())
+        header = Finance_Tracker.SNAPSHOT_HEADER
+        fields = list(header.unpack_from(data))
+        for position, change in ((-1, -1), (-4, 1000)):
+            damaged = fields.copy()
+            damaged[position] += change
+            changed = header.pack(*damaged) + data[header.size:]
+            for verify in (True, False):
+                with self.assertRaises(ValueError):
+                    Finance_Tracker.read_snapshot(changed, verify=verify)
+
+    def test_empty_snapshot(self):
+        """An empty Finances saves and loads as a snapshot."""
+        Finance_Tracker.Finances().save_to_file(self.file_name, binary=True)
+        loaded = Finance_Tracker.Finances(storage='columnar')
+        loaded.load_from_file(self.file_name)
+        self.assertEqual(len(loaded.transactions), 0)
+
+class TestMappedLedger(unittest.TestCase):
+    def setUp(self):
+        """Setup a snapshot of the sample data and a read-only Finances mapped onto it."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "data.snap")
+        self.finances = Finance_Tracker.Finances()
+        self.finances.load_from_file(SAMPLE_DATA)
+        self.finances.add_transaction("2024-05-02", "Income", 300, "Refund")
+        self.finances.add_transaction("2024-05-03", "Savings", 100, "Rainy day")
+        self.finances.save_to_file(self.file_name, binary=True)
+        self.mapped = Finance_Tracker.Finances(storage='mapped')
+        self.mapped.load_from_file(self.file_name)
+
+    def tearDown(self):
+        for ledger in Finance_Tracker.LEDGERS:
+            setattr(self.mapped, ledger, [])
+        self.directory.cleanup()
+
+    def test_reports_match_list_storage(self):
+        """Reports, totals and aggregates read from the mapping match the in-memory data."""
+        for start, end in (("2024-01-01", "2024-12-31"), ("2024-05-01", "2024-05-31"), ("2030-01-01", "2030-12-31")):
+            self.assertEqual(self.mapped.build_report(start, end), self.finances.build_report(start, end))
+            self.assertEqual(self.mapped.net_cash_flow(start, end), self.finances.net_cash_flow(start, end))
+        for ledger in Finance_Tracker.LEDGERS:
+            self.assertEqual(self.mapped.total(ledger, "2024-05-01", "2024-05-31"),
+                             self.finances.total(ledger, "2024-05-01", "2024-05-31"))
+        self.assertEqual(self.mapped.aggregate('expenses', by='month', start_date="2024-05-01"),
+                         self.finances.aggregate('expenses', by='month', start_date="2024-05-01"))
+        self.assertEqual(self.mapped.investments, self.finances.investments)
+
+    def test_read_only(self):
+        """Changing mapped data raises instead of writing to the file."""
+        with self.assertRaises(RuntimeError):
+            self.mapped.add_income("Gift", 50, "2024-05-01")
+        with self.assertRaises(RuntimeError):
+            self.mapped.extend_expenses([("Rent", 1000, "2024-05-05")])
+        with self.assertRaises(RuntimeError):
+            self.mapped.add_investment("Stock", 100)
+
+    def test_needs_snapshot(self):
+        """Only binary snapshots can be mapped."""
+        with self.assertRaises(ValueError):
+            Finance_Tracker.Finances(storage='mapped')._load(SAMPLE_DATA)
+
+class TestMinorUnits(unittest.TestCase):
+    def setUp(self):
+        """Setup a temporary directory and finances kept in whole cents."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.finances = Finance_Tracker.Finances(currency='USD')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sums_are_exact(self):
+        """Amounts become whole cents, so adding many of them gives an exact total."""
+        for day in range(1, 11):
+            self.finances.add_expense("Coffee", 0.1, f"2024-05-{day:02d}")
+        self.finances.extend_expenses([("Lunch", 12.29, "2024-05-11")])
+        self.finances.add_transaction("2024-05-12", "Income", 19.99, "Refund")
+        self.assertEqual(self.finances.expenses[0]['amount'], 10)
+        self.assertEqual(self.finances.total('expenses', "2024-05-01", "2024-05-31"), 1329)
+        self.assertEqual(self.finances.total('transactions', "2024-05-01", "2024-05-31"), 1999)
+        self.assertEqual(self.finances.aggregate('expenses', 'category')['Coffee']['sum'], 100)
+        self.assertEqual(Finance_Tracker.from_minor_units(1329, 'USD'), 13.29)
+
+    def test_minor_units_per_currency(self):
+        """Each currency uses its own number of decimal places."""
+        self.assertEqual(Finance_Tracker.to_minor_units(1500, 'JPY'), 1500)
+        self.assertEqual(Finance_Tracker.to_minor_units(1.5, 'KWD'), 1500)
+        self.assertEqual(Finance_Tracker.to_minor_units(0.125, 'USD'), 12)
+        columnar = Finance_Tracker.Finances(storage='columnar', currency='JPY')
+        columnar.add_income("Work Salary", 250000, "2024-05-01")
+        self.assertEqual(columnar.income.column('amount').typecode, 'q')
+        self.assertEqual(columnar.income[0]['amount'], 250000)
+
+    def test_files_keep_minor_units(self):
+        """JSON and snapshot files keep cents, and convert to or from float data on load."""
+        self.finances.load_from_file(SAMPLE_DATA)
+        self.assertEqual(self.finances.total('income', "2024-05-01", "2024-05-31"), 980000)
+        json_file = os.path.join(self.directory.name, "data.json")
+        snapshot_file = os.path.join(self.directory.name, "data.snap")
+        self.finances.save_to_file(json_file)
+        self.finances.save_to_file(snapshot_file, binary=True)
+        for file_name in (json_file, snapshot_file):
+            cents = Finance_Tracker.Finances(storage='columnar', currency='USD')
+            cents.load_from_file(file_name)
+            self.assertEqual(list(cents.income), list(self.finances.income))
+            floats = Finance_Tracker.Finances()
+            floats.load_from_file(file_name)
+            self.assertEqual(floats.total('income', "2024-05-01", "2024-05-31"), 9800.0)
+        mapped = Finance_Tracker.Finances(storage='mapped', currency='USD')
+        mapped.load_from_file(snapshot_file)
+        self.assertEqual(mapped.total('income', "2024-05-01", "2024-05-31"), 980000)
+        for ledger in Finance_Tracker.LEDGERS:
+            setattr(mapped, ledger, [])
+
+    def test_investment_growth_rounds_to_cents(self):
+        """Growth on a portfolio kept in cents rounds to a whole cent."""
+        investments = Finance_Tracker.Investments("My Portfolio", currency='USD')
+        investments.add_investment("Stock", 1000.01)
+        self.assertEqual(investments.calculate_investment_growth("Stock", 0.05), 105001)
+
+class TestMultiFileLoad(unittest.TestCase):
+    def setUp(self):
+        """Setup one data file per account, each with its own dates and investments."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_names = []
+        for account, days in (("Checking", (3, 9, 20)), ("Savings", (1, 9, 30)), ("Card", (5,))):
+            file_name = os.path.join(self.directory.name, f"{account}.json")
+            finances = Finance_Tracker.Finances()
+            finances.open_journal(file_name)
+            for day in days:
+                finances.add_expense(account, day, f"2024-05-{day:02d}")
+                finances.add_income(account, 100, f"2024-06-{day:02d}")
+            finances.add_investment("Stock", 100)
+            finances.compact()
+            finances.close_journal()
+            self.file_names.append(file_name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_files_are_merged_in_date_order(self):
+        """Every file's records end up in one Finances in date order, next to what was there before."""
+        for workers in (1, 2):
+            finances = Finance_Tracker.Finances()
+            finances.add_expense("Rent", 1000, "2024-05-02")
+            finances.add_investment("Stock", 50)
+            finances.load_files(self.file_names, workers=workers)
+            self.assertEqual([exp['amount'] for exp in finances.expenses], [1000, 1, 3, 5, 9, 9, 20, 30])
+            self.assertEqual([exp['date'][-2:] for exp in finances.expenses[1:]], ["01", "03", "05", "09", "09", "20", "30"])
+            self.assertEqual([exp['category'] for exp in finances.build_report("2024-05-09", "2024-05-09")['Expenses']],
+                             ["Checking", "Savings"])
+            self.assertEqual(finances.total('income', "2024-06-01", "2024-06-30"), 700)
+            self.assertEqual(finances.investments, {"Stock": 350})
+
+    def test_spawned_workers(self):
+        """Files load in parallel even when fresh worker processes couldn't import the module."""
+        code = "finances = Finance_Tracker.Finances(); finances._load_files(sys.argv[3:], workers=2); print(len(finances.expenses))"
+        self.assertEqual(run_spawned(code, *self.file_names).split(), ['7'])
+
+    def test_nothing_is_added_if_a_file_fails(self):
+        """A missing file stops the whole load before anything is merged."""
+        finances = Finance_Tracker.Finances()
+        with self.assertRaises(FileNotFoundError):
+            finances._load_files(self.file_names + [os.path.join(self.directory.name, "missing.json")], workers=1)
+        self.assertEqual(len(finances.expenses), 0)
+
+class TestMaterializedReport(unittest.TestCase):
+    def setUp(self):
+        """Setup finances with a materialized report for May."""
+        self.finances = Finance_Tracker.Finances()
+        self.finances.add_income("Work Salary", 2000, "2024-05-01")
+        self.report = self.finances.materialize("2024-05-01", "2024-05-31")
+
+    def test_kept_up_to_date(self):
+        """The report matches build_report after every kind of insert, in or out of order."""
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+        self.finances.add_expense("Groceries", 80, "2024-05-02")
+        self.finances.add_expense("Dining Out", 60, "2024-06-01")
+        self.finances.add_transaction("2024-05-10", "Expense", 50, "Groceries")
+        self.finances.extend_income([("Bonus", 500, "2024-05-20"), ("Refund", 25, "2024-04-30")])
+        self.assertEqual(self.report.report, self.finances.build_report("2024-05-01", "2024-05-31"))
+        self.assertEqual(self.report.totals['expenses'], 1080)
+        self.assertEqual(self.report.totals['transactions'], -50)
+        self.assertEqual(self.report.net_cash_flow(), self.finances.net_cash_flow("2024-05-01", "2024-05-31"))
+
+    def test_subscribers_see_changes_in_the_window(self):
+        """Subscribers are only told about records added to the window, and close stops updates."""
+        changes = []
+        self.report.subscribe(lambda report, ledger, records: changes.append((ledger, records)))
+        version = self.report.version
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+        self.finances.add_expense("Dining Out", 60, "2024-06-01")
+        self.assertEqual(changes, [('expenses', [{'category': "Rent", 'amount': 1000, 'date': "2024-05-05"}])])
+        self.assertEqual(self.report.version, version + 1)
+        self.report.close()
+        self.finances.add_expense("Utilities", 150, "2024-05-07")
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(len(self.report.report['Expenses']), 1)
+
+    def test_refreshed_after_load(self):
+        """Loading data replaces the lists, and the report follows."""
+        self.finances.load_from_file(SAMPLE_DATA)
+        self.assertEqual(self.report.report, self.finances.build_report("2024-05-01", "2024-05-31"))
+        self.assertEqual(self.report.totals['income'], 9800)
+
+class TestReportCache(unittest.TestCase):
+    def setUp(self):
+        """Setup finances that cache their reports."""
+        self.finances = Finance_Tracker.Finances(report_cache_size=2)
+        self.finances.load_from_file(SAMPLE_DATA)
+
+    def test_repeated_reports_are_cached(self):
+        """Asking for the same window again is a hit, whichever way its dates are written."""
+        report = self.finances.build_report("2024-05-01", "2024-05-31")
+        self.assertIs(self.finances.build_report("2024-5-1", "2024-05-31"), report)
+        info = self.finances.report_cache.info()
+        self.assertEqual((info['hits'], info['misses'], info['hit_rate']), (1, 1, 0.5))
+
+    def test_only_windows_with_new_records_are_dropped(self):
+        """A new record drops the reports whose window it falls in and keeps the others."""
+        may = self.finances.build_report("2024-05-01", "2024-05-31")
+        june = self.finances.build_report("2024-06-01", "2024-06-30")
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+        self.finances.extend_income([("Bonus", 500, "2024-07-01")])
+        self.assertIs(self.finances.build_report("2024-06-01", "2024-06-30"), june)
+        new_may = self.finances.build_report("2024-05-01", "2024-05-31")
+        self.assertIsNot(new_may, may)
+        self.assertIn({'category': "Rent", 'amount': 1000, 'date': "2024-05-05"}, new_may['Expenses'])
+        self.assertEqual(self.finances.report_cache.info()['invalidations'], 1)
+
+    def test_direct_changes_and_eviction(self):
+        """Lists changed directly empty the cache, and only maxsize reports are kept."""
+        count = len(self.finances.build_report("2024-05-01", "2024-05-31")['Income'])
+        self.finances.income.append({'source': "Gift", 'amount': 50, 'date': "2024-05-03"})
+        self.assertEqual(len(self.finances.build_report("2024-05-01", "2024-05-31")['Income']), count + 1)
+        for month in ("06", "07", "08"):
+            self.finances.build_report(f"2024-{month}-01", f"2024-{month}-28")
+        self.assertEqual(self.finances.report_cache.info()['size'], 2)
+
+def as_lists(values):
+    """Turns a numpy array or nested lists into nested lists."""
+    return values.tolist() if hasattr(values, 'tolist') else values
+
+class TestProjection(unittest.TestCase):
+    def setUp(self):
+        """Setup a portfolio with two assets."""
+        self.investments = Finance_Tracker.Investments("My Portfolio")
+        self.investments.add_investment("Stock", 1000)
+        self.investments.add_investment("Bond", 500)
+
+    def test_bands(self):
+        """Bands start at today's values, are ordered by percentile and leave the portfolio alone."""
+        projection = self.investments.project(12, 0.01, 0.05, paths=500, percentiles=(5, 50, 95), seed=1)
+        total = as_lists(projection['total'])
+        self.assertEqual(total[1][0], 1500)
+        self.assertEqual(len(total[0]), 13)
+        for period in range(1, 13):
+            self.assertLess(total[0][period], total[1][period])
+            self.assertLess(total[1][period], total[2][period])
+        self.assertEqual(self.investments.investments, {"Stock": 1000, "Bond": 500})
+
+    def test_without_volatility(self):
+        """With no volatility every path compounds at the mean return."""
+        projection = self.investments.project(3, {"Stock": 0.1, "Bond": 0.0}, 0, paths=10, percentiles=(50,))
+        stock = as_lists(projection['assets']["Stock"])[0]
+        for period, value in enumerate(stock):
+            self.assertAlmostEqual(value, 1000 * 1.1 ** period)
+        self.assertAlmostEqual(as_lists(projection['total'])[0][3], 1831)
+
+    def test_spawned_workers(self):
+        """A parallel projection works even when fresh worker processes couldn't import the module."""
+        code = ("portfolio = Finance_Tracker.Investments('Spawned'); portfolio.add_investment('Stock', 1000)\n"
+                "kwargs = dict(periods=3, mean=0.01, volatility=0.1, paths=2 * Finance_Tracker.PROJECTION_CHUNK, seed=7)\n"
+                "totals = [portfolio.project(workers=workers, **kwargs)['total'] for workers in (1, 2)]\n"
+                "print([[float(value) for value in row] for row in totals[0]] == [[float(value) for value in row] for row in totals[1]])")
+        self.assertEqual(run_spawned(code).split(), ['True'])
+
+    def test_seeded_and_parallel(self):
+        """A seeded projection is the same whether it runs in one process or several."""
+        kwargs = dict(periods=6, mean=0.01, volatility=0.1, paths=2 * Finance_Tracker.PROJECTION_CHUNK, seed=7)
+        serial = as_lists(self.investments.project(**kwargs)['total'])
+        parallel = as_lists(self.investments.project(workers=2, **kwargs)['total'])
+        self.assertEqual(serial, parallel)
+
+    def test_correlation(self):
+        """Correlated assets spread the portfolio's outcomes wider, and bad matrices are rejected."""
+        spread = lambda bands: bands[-1][-1] - bands[0][-1]
+        independent = self.investments.project(12, 0, 0.1, paths=2000, percentiles=(5, 95), seed=3)
+        correlated = self.investments.project(12, 0, 0.1, [[1, 0.9], [0.9, 1]], paths=2000, percentiles=(5, 95), seed=3)
+        self.assertGreater(spread(as_lists(correlated['total'])), spread(as_lists(independent['total'])))
+        with self.assertRaises(ValueError):
+            self.investments.project(12, 0, 0.1, [[1, 2], [2, 1]])
+        with self.assertRaises(ValueError):
+            self.investments.project(12, {"Stock": 0.01}, 0.1)
+
+class TestPortfolioGrowth(unittest.TestCase):
+    def setUp(self):
+        """Setup a portfolio with two assets."""
+        self.investments = Finance_Tracker.Investments("My Portfolio")
+        self.investments.add_investment("Stock", 1000)
+        self.investments.add_investment("Bond", 500)
+
+    def assertRowsAlmostEqual(self, values, expected):
+        for row, expected_row in zip(as_lists(values), expected, strict=True):
+            for value, expected_value in zip(row, expected_row, strict=True):
+                self.assertAlmostEqual(value, expected_value)
+
+    def test_rates_per_asset(self):
+        """The same rates every period give one row per period, without changing the portfolio."""
+        values = self.investments.grow({"Stock": 0.1, "Bond": 0.02}, periods=2)
+        self.assertRowsAlmostEqual(values, [[1000, 500], [1100, 510], [1210, 520.2]])
+        self.assertRowsAlmostEqual(self.investments.grow(0.1, periods=1), [[1000, 500], [1100, 550]])
+        self.assertEqual(self.investments.investments, {"Stock": 1000, "Bond": 500})
+
+    def test_rates_per_period(self):
+        """A matrix of rates, or a dict of per-period rates, applies each period's rates in turn."""
+        expected = [[1000, 500], [1100, 500], [990, 525]]
+        self.assertRowsAlmostEqual(self.investments.grow([[0.1, 0.0], [-0.1, 0.05]]), expected)
+        self.assertRowsAlmostEqual(self.investments.grow({"Stock": [0.1, -0.1], "Bond": [0.0, 0.05]}), expected)
+        with self.assertRaises(ValueError):
+            self.investments.grow([[0.1, 0.0], [-0.1]])
+        with self.assertRaises(ValueError):
+            self.investments.grow([0.1, 0.0])
+
+    def test_mutate(self):
+        """mutate=True keeps the values after the last period, matching calculate_investment_growth."""
+        self.investments.grow(0.05, periods=3, mutate=True)
+        single = Finance_Tracker.Investments("Single")
+        single.add_investment("Stock", 1000)
+        for _ in range(3):
+            single.calculate_investment_growth("Stock", 0.05)
+        self.assertAlmostEqual(self.investments.investments["Stock"], single.investments["Stock"])
+        cents = Finance_Tracker.Investments("Cents", currency='USD')
+        cents.add_investment("Stock", 10.01)
+        cents.grow(0.05, periods=1, mutate=True)
+        self.assertEqual(cents.investments["Stock"], 1051)
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        """Setup finances loaded from the sample data, plus a few rides."""
+        self.finances = Finance_Tracker.Finances()
+        self.finances.load_from_file(SAMPLE_DATA)
+        self.finances.extend_transactions([("2023-12-30", "Expense", 25, "Uber ride home"),
+                                           ("2024-03-02", "Expense", 18, "UBER Eats"),
+                                           ("2024-02-14", "Expense", 40, "Uber ride to airport")])
+
+    def descriptions(self, finances, query, start_date=None, end_date=None):
+        return [record['description'] for record in finances.search(query, start_date, end_date)]
+
+    def test_words_and_prefixes(self):
+        """Every word must match, in any case, and a word ending in * matches by prefix."""
+        self.assertEqual(self.descriptions(self.finances, "uber"), ["Uber ride home", "Uber ride to airport", "UBER Eats"])
+        self.assertEqual(self.descriptions(self.finances, "Uber RIDE"), ["Uber ride home", "Uber ride to airport"])
+        self.assertEqual(self.descriptions(self.finances, "pay*"), ["Payment from Client A", "Royalty Payment",
+                                                                    "Part-Time Job Payment", "Royalty Payment"])
+        self.assertEqual(self.descriptions(self.finances, "uber taxi"), [])
+        self.assertEqual(self.descriptions(self.finances, "  "), [])
+
+    def test_date_range(self):
+        """Matches can be limited to a date range."""
+        self.assertEqual(self.descriptions(self.finances, "uber", "2024-01-01", "2024-12-31"), ["Uber ride to airport", "UBER Eats"])
+        self.assertEqual(self.descriptions(self.finances, "pay*", end_date="2024-05-31"), ["Payment from Client A", "Royalty Payment"])
+
+    def test_index_kept_up_to_date(self):
+        """The index is built once, then kept up to date as transactions are added, and rebuilt after a load."""
+        self.finances.search("uber")
+        index = self.finances._text_index
+        self.finances.add_transaction("2024-07-01", "Expense", 30, "Uber ride")
+        self.finances.extend_transactions([("2024-07-02", "Expense", 12, "uber")])
+        self.assertEqual(len(self.descriptions(self.finances, "uber")), 5)
+        self.assertIs(self.finances._text_index, index)
+        self.finances.load_from_file(SAMPLE_DATA)
+        self.assertEqual(self.descriptions(self.finances, "uber"), [])
+
+    def test_columnar_storage(self):
+        """Columnar storage finds the same transactions."""
+        columnar = Finance_Tracker.Finances(storage='columnar')
+        columnar.extend_transactions(list(self.finances.transactions))
+        for query in ("uber", "pay* royalty", "ride"):
+            self.assertEqual(columnar.search(query, "2024-01-01"), self.finances.search(query, "2024-01-01"))
+
+class TestCategoryDictionary(unittest.TestCase):
+    def setUp(self):
+        """Setup finances loaded from the sample data in each storage option."""
+        self.finances = {}
+        for storage in ('list', 'columnar'):
+            self.finances[storage] = Finance_Tracker.Finances(storage=storage)
+            self.finances[storage].load_from_file(SAMPLE_DATA)
+
+    def test_categories_stored_once(self):
+        """Records with the same category share one string, whichever way they were added."""
+        finances = self.finances['list']
+        finances.add_expense("".join(["Gro", "ceries"]), 20, "2024-07-01")
+        finances.extend_expenses([("".join(["Groc", "eries"]), 30, "2024-07-02")])
+        groceries = [record['category'] for record in finances.expenses if record['category'] == "Groceries"]
+        self.assertGreater(len(groceries), 2)
+        self.assertTrue(all(category is groceries[0] for category in groceries))
+
+    def test_dictionary_and_codes(self):
+        """Both storage options expose the same categories and a code per record."""
+        for storage, finances in self.finances.items():
+            values = finances.categories('expenses').values
+            self.assertEqual(sorted(values), sorted({record['category'] for record in finances.expenses}))
+            codes = finances.category_codes('expenses')
+            self.assertEqual([values[code] for code in codes], [record['category'] for record in finances.expenses])
+
+    def test_select(self):
+        """Records can be selected by one or more categories and a date range."""
+        expected = [record for record in self.finances['list'].income if record['source'] in ("Salary", "Bonus")]
+        for storage, finances in self.finances.items():
+            self.assertEqual(finances.select('income', ("Salary", "Bonus", "Lottery")), expected)
+            self.assertEqual(finances.select('income', ["Salary", "Bonus"], "2024-05-10"), expected[1:])
+            self.assertEqual(finances.select('income', "Lottery"), [])
+
+    def test_changed_directly(self):
+        """A list changed without add_* is encoded again before it is used."""
+        finances = self.finances['list']
+        finances.expenses.append({'category': "Travel", 'amount': 300, 'date': "2024-07-01"})
+        self.assertIn("Travel", finances.categories('expenses').values)
+        self.assertEqual(finances.aggregate('expenses', 'category')['Travel']['sum'], 300)
+
+class TestColumnarStorage(unittest.TestCase):
+    def setUp(self):
+        """Setup a Finances object that keeps its records in columns."""
+        self.finances = Finance_Tracker.Finances(storage='columnar')
+
+    def test_records_read_back_as_dicts(self):
+        """Columnar records read back as the same dicts the list storage would hold."""
+        self.finances.add_income("Work Salary", 2000, "2024-05-01")
+        self.finances.add_transaction("2024-05-10", "Expense", 50, "Groceries")
+        self.assertIn({'source': "Work Salary", 'amount': 2000, 'date': "2024-05-01"}, self.finances.income)
+        self.assertEqual(self.finances.transactions[0], {'date': "2024-05-10", 'category': "Expense", 'amount': 50, 'description': "Groceries"})
+
+    def test_records_are_read_only(self):
+        """Changing a record read from the columns raises instead of being silently lost."""
+        self.finances.add_income("Work Salary", 2000, "2024-05-01")
+        record = self.finances.income[0]
+        with self.assertRaises(TypeError):
+            record['amount'] = 99
+        with self.assertRaises(TypeError):
+            record.update(amount=99)
+        self.assertEqual(self.finances.income[0]['amount'], 2000)
+        copy = dict(record)
+        copy['amount'] = 99
+        self.assertEqual(json.loads(json.dumps(record)), {'source': "Work Salary", 'amount': 2000, 'date': "2024-05-01"})
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_columns_are_compact(self):
+        """Dates are day numbers and repeated categories share one dictionary entry."""
+        self.finances.add_expense("Rent", 1000, "2024-05-05")
+        self.finances.add_expense("Rent", 1000, "2024-06-05")
+        self.assertEqual(self.finances.expenses.column('date').typecode, 'i')
+        self.assertEqual(list(self.finances.expenses.column('category')), [0, 0])
+        self.assertEqual(sum(self.finances.expenses.column('amount')), 2000)
+
+    def test_build_report_and_load(self):
+        """Reports and loading work the same as with list storage."""
+        self.finances.load_from_file(SAMPLE_DATA)
+        report = self.finances.build_report("2024-05-01", "2024-05-05")
+        self.assertEqual([inc['source'] for inc in report['Income']], ["Salary", "Freelance Work"])
+        self.assertEqual(len(self.finances.transactions), 10)
+        self.assertEqual(self.finances.total('expenses', "2024-05-01", "2024-05-31"), 2650)
+
+    def test_unknown_storage(self):
+        """An unknown storage option is rejected."""
+        with self.assertRaises(ValueError):
+            Finance_Tracker.Finances(storage='sqlite')
+
+class TestStreamingLoad(unittest.TestCase):
+    def test_stream_matches_regular_load(self):
+        """Streaming the sample data gives the same result as loading it in one go."""
+        expected = Finance_Tracker.Finances()
+        expected.load_from_file(SAMPLE_DATA)
+        finances = Finance_Tracker.Finances()
+        progress = []
+        finances.load_from_file(SAMPLE_DATA, stream=True, progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(finances.income, expected.income)
+        self.assertEqual(finances.expenses, expected.expenses)
+        self.assertEqual(finances.transactions, expected.transactions)
+        self.assertEqual(finances.investments, expected.investments)
+        self.assertEqual(progress[-1][0], os.path.getsize(SAMPLE_DATA))
+        self.assertEqual(finances.build_report("2024-06-01", "2024-06-30")['Income'][0]['source'], "Part-Time Job")
+
+    def test_small_chunks(self):
+        """Records and numbers split across chunk boundaries are parsed correctly."""
+        with open(SAMPLE_DATA, 'rb') as file:
+            sections = {key: list(value) if key != 'investments' else len(list(value))
+                        for key, value in Finance_Tracker.JSONArrayStream(file, chunk_size=7).sections()}
+        with open(SAMPLE_DATA) as file:
+            self.assertEqual(sections['income'], json.load(file)['income'])
+        self.assertEqual(sections['investments'], 10)
+
+    def test_bad_file_changes_nothing(self):
+        """A file with a bad record in any list leaves every list as it was, streamed or not."""
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "data.json")
+            with open(file_name, 'w') as file:
+                json.dump({'income': [{'source': "Bonus", 'amount': 500, 'date': "2024-05-03"}],
+                           'expenses': [{'category': "Rent", 'amount': 1000, 'date': "2024/01/02"}]}, file)
+            for stream in (False, True):
+                finances = Finance_Tracker.Finances()
+                finances.load_from_file(SAMPLE_DATA)
+                income, expenses = list(finances.income), list(finances.expenses)
+                with self.assertRaises(ValueError):
+                    finances._load(file_name, stream=stream)
+                self.assertEqual(finances.income, income)
+                self.assertEqual(finances.expenses, expenses)
+                self.assertEqual(finances.total('income', "2024-05-01", "2024-05-31"), 9800)
+
+    def test_currency_after_records(self):
+        """A currency given after the records is honoured before them and refused after them."""
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "data.json")
+            with open(file_name, 'w') as file:
+                file.write('{"currency": "USD", "income": [{"source": "Bonus", "amount": 1999, "date": "2024-05-01"}]}')
+            finances = Finance_Tracker.Finances()
+            finances._load(file_name, stream=True)
+            self.assertEqual(finances.income[0]['amount'], 19.99)
+            with open(file_name, 'w') as file:
+                file.write('{"income": [{"source": "Bonus", "amount": 1999, "date": "2024-05-01"}], "currency": "USD"}')
+            with self.assertRaises(ValueError):
+                Finance_Tracker.Finances()._load(file_name, stream=True)
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        """Setup a temporary directory for the data file and its journal."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "data.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_changes_survive_without_save(self):
+        """Changes are logged as they happen and replayed when the file is loaded."""
+        finances = Finance_Tracker.Finances()
+        finances.open_journal(self.file_name)
+        finances.add_income("Work Salary", 2000, "2024-05-01")
+        finances.add_transaction("2024-05-10", "Expense", 50, "Groceries")
+        finances.add_investment("Stocks", 5000)
+        loaded = Finance_Tracker.Finances()
+        loaded.load_from_file(self.file_name)
+        self.assertEqual(loaded.income, finances.income)
+        self.assertEqual(loaded.transactions, finances.transactions)
+        self.assertEqual(loaded.investments, {"Stocks": 5000})
+        finances.close_journal()
+
+    def test_compaction(self):
+        """The data file is rewritten and the journal emptied every compact_every changes."""
+        finances = Finance_Tracker.Finances()
+        finances.open_journal(self.file_name, compact_every=2)
+        finances.add_expense("Rent", 1000, "2024-05-05")
+        finances.add_expense("Groceries", 80, "2024-05-06")
+        finances.add_expense("Utilities", 150, "2024-05-07")
+        finances.close_journal()
+        self.assertEqual(len(list(Finance_Tracker.Journal.entries(self.file_name + ".journal"))), 1)
+        with open(self.file_name) as file:
+            self.assertEqual(len(json.load(file)['expenses']), 2)
+        loaded = Finance_Tracker.Finances()
+        loaded.open_journal(self.file_name)
+        self.assertEqual([exp['category'] for exp in loaded.expenses], ["Rent", "Groceries", "Utilities"])
+        loaded.close_journal()
+
+    def test_partly_written_change_is_ignored(self):
+        """A change cut off by a crash is dropped instead of breaking the load."""
+        finances = Finance_Tracker.Finances()
+        finances.open_journal(self.file_name)
+        finances.add_expense("Rent", 1000, "2024-05-05")
+        finances.close_journal()
+        with open(self.file_name + ".journal", 'a') as file:
+            file.write('[2,"expenses","Groc')
+        loaded = Finance_Tracker.Finances()
+        loaded.open_journal(self.file_name)
+        loaded.add_expense("Groceries", 80, "2024-05-06")
+        loaded.close_journal()
+        reloaded = Finance_Tracker.Finances()
+        reloaded.load_from_file(self.file_name)
+        self.assertEqual([exp['category'] for exp in reloaded.expenses], ["Rent", "Groceries"])
+
+    def test_replay_converts_currency(self):
+        """Amounts logged in minor units replay correctly into finances kept as floats, and back."""
+        finances = Finance_Tracker.Finances(currency='USD')
+        finances.open_journal(self.file_name)
+        finances.add_income("Bonus", 19.99, "2024-05-01")
+        finances.add_investment("Stocks", 100.5)
+        finances.close_journal()
+        floats = Finance_Tracker.Finances()
+        floats.load_from_file(self.file_name)
+        self.assertEqual(floats.income[0]['amount'], 19.99)
+        self.assertEqual(floats.investments, {"Stocks": 100.5})
+        floats.open_journal(self.file_name)
+        floats.add_expense("Rent", 10.25, "2024-05-02")
+        floats.close_journal()
+        cents = Finance_Tracker.Finances(currency='USD')
+        cents.load_from_file(self.file_name)
+        self.assertEqual([cents.income[0]['amount'], cents.expenses[0]['amount']], [1999, 1025])
+
+    def test_damaged_file_is_kept(self):
+        """A data file that fails to load stops the journal from opening, so it is never overwritten."""
+        finances = Finance_Tracker.Finances()
+        finances.open_journal(self.file_name, compact_every=1)
+        finances.add_income("Work Salary", 2000, "2024-05-01")
+        finances.close_journal()
+        with open(self.file_name, 'r+') as file:
+            file.truncate(os.path.getsize(self.file_name) // 2)
+        with open(self.file_name) as file:
+            damaged = file.read()
+        reopened = Finance_Tracker.Finances()
+        with self.assertRaises(ValueError):
+            reopened.open_journal(self.file_name, compact_every=1)
+        self.assertIsNone(reopened.journal)
+        with open(self.file_name) as file:
+            self.assertEqual(file.read(), damaged)
+
+    def test_save_writes_everything(self):
+        """save_to_file writes every list and the investments, and keeps a leftover journal without replaying it."""
+        finances = Finance_Tracker.Finances()
+        finances.open_journal(self.file_name)
+        finances.add_expense("Rent", 1000, "2024-05-05")
+        finances.close_journal()
+        other = Finance_Tracker.Finances()
+        other.add_income("Job", 3000, "2024-05-01")
+        other.add_transaction("2024-05-10", "Expense", 50, "Groceries")
+        other.add_investment("Stocks", 5000)
+        other.save_to_file(self.file_name)
+        self.assertTrue(os.path.exists(self.file_name + ".journal"))
+        loaded = Finance_Tracker.Finances()
+        loaded.load_from_file(self.file_name)
+        self.assertEqual(loaded.income, other.income)
+        self.assertEqual(loaded.expenses, [])
+        self.assertEqual(loaded.transactions, other.transactions)
+        self.assertEqual(loaded.investments, {"Stocks": 5000})
+
+    def test_binary_save_keeps_journal(self):
+        """Saving the journaled file as a snapshot is refused, so later changes are still logged."""
+        finances = Finance_Tracker.Finances()
+        finances.open_journal(self.file_name)
+        finances.add_income("Job", 3000, "2024-05-01")
+        with self.assertRaises(ValueError):
+            finances._save(self.file_name, binary=True)
+        finances.save_to_file(self.file_name, binary=True)
+        finances.add_income("Bonus", 500, "2024-05-02")
+        finances.close_journal()
+        loaded = Finance_Tracker.Finances()
+        loaded.load_from_file(self.file_name)
+        self.assertEqual([inc['source'] for inc in loaded.income], ["Job", "Bonus"])
+
+    def test_load_while_journaling(self):
+        """Loading another file replaces the journaled data, and reopening the journal gives the loaded data."""
+        finances = Finance_Tracker.Finances()
+        finances.open_journal(self.file_name)
+        finances.add_income("Job", 3000, "2024-05-01")
+        finances.load_from_file(SAMPLE_DATA)
+        finances.close_journal()
+        reopened = Finance_Tracker.Finances()
+        reopened.open_journal(self.file_name)
+        self.assertEqual(reopened.income, finances.income)
+        self.assertEqual(reopened.expenses, finances.expenses)
+        self.assertNotIn("Job", [inc['source'] for inc in reopened.income])
+        reopened.close_journal()
+
+RATES = {
+    'USD': {'USD': 1.0, 'EUR': 0.9, 'GBP': 0.8},
+    'EUR': {'EUR': 1.0, 'USD': 1.1, 'GBP': 0.85},
+}
+
+class RatesHandler(http.server.BaseHTTPRequestHandler):
+    """Local stand-in for the exchange rate API: GET /<currency> returns its rates, GET /old/<currency> redirects there."""
+    protocol_version = "HTTP/1.1"
+    requests_served = 0
+    failures_left = 0
+    damaged_left = 0
+
+    def do_GET(self):
+        RatesHandler.requests_served += 1
+        currency = self.path.strip('/')
+        if currency.startswith("old/"):
+            self.send_response(302)
+            self.send_header("Location", "/" + currency[4:])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif RatesHandler.failures_left:
+            RatesHandler.failures_left -= 1
+            self.send_json(503, {'result': 'error'})
+        elif RatesHandler.damaged_left:
+            RatesHandler.damaged_left -= 1
+            self.send_body(200, b'{"base": "USD", "rat')
+        elif currency in RATES:
+            self.send_json(200, {'base': currency, 'rates': RATES[currency]})
+        else:
+            self.send_json(404, {'result': 'error'})
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data).encode())
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestRateCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the stand-in rate server once for all tests."""
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RatesHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def fetch(self, currency):
+        with urllib.request.urlopen(self.url + currency) as response:
+            return json.load(response)['rates']
+
+    def setUp(self):
+        self.now = 0
+        RatesHandler.requests_served = 0
+        self.cache = Finance_Tracker.RateCache(ttl=60, maxsize=1, fetcher=self.fetch, clock=lambda: self.now)
+
+    def test_rates_downloaded_once(self):
+        """Converting many amounts from one currency downloads its rates only once."""
+        converted = [Finance_Tracker.convert_currency(amount, 'USD', 'EUR', cache=self.cache) for amount in (100, 200, 300)]
+        self.assertEqual(converted, [90.0, 180.0, 270.0])
+        self.assertEqual(RatesHandler.requests_served, 1)
+        self.assertEqual(self.cache.info()['hits'], 2)
+        self.assertEqual(self.cache.info()['misses'], 1)
+
+    def test_ttl_and_eviction(self):
+        """Rates are downloaded again once they expire or are pushed out by another currency."""
+        self.cache.get('USD')
+        self.now = 61
+        self.cache.get('USD')
+        self.cache.get('EUR')
+        self.cache.get('USD')
+        self.assertEqual(RatesHandler.requests_served, 4)
+        self.assertEqual(self.cache.info()['size'], 1)
+
+    def test_cache_file(self):
+        """Rates kept in a cache file are reused after a restart."""
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "rates.json")
+            Finance_Tracker.RateCache(fetcher=self.fetch, file_name=file_name).get('USD')
+            restarted = Finance_Tracker.RateCache(fetcher=self.fetch, file_name=file_name)
+            self.assertEqual(restarted.get('USD')['GBP'], 0.8)
+        self.assertEqual(RatesHandler.requests_served, 1)
+
+class TestAsyncRateClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start the stand-in rate server once for all tests."""
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RatesHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/{{}}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        RatesHandler.requests_served = 0
+        RatesHandler.failures_left = 0
+        RatesHandler.damaged_left = 0
+        self.cache = Finance_Tracker.RateCache(ttl=60)
+
+    def run_client(self, work, **options):
+        """Run work(client) on a fresh client and event loop, returning its result and the client's info."""
+        async def main():
+            async with Finance_Tracker.AsyncRateClient(self.url, cache=self.cache, **options) as client:
+                return await work(client), client.info()
+        return asyncio.run(main())
+
+    def test_connection_reused(self):
+        """Sequential downloads of different currencies share one kept-alive connection."""
+        async def work(client):
+            return [await client.convert(100, currency, 'GBP') for currency in ('USD', 'EUR')]
+        converted, info = self.run_client(work)
+        self.assertEqual(converted, [80.0, 100 * RATES['EUR']['GBP']])
+        self.assertEqual(RatesHandler.requests_served, 2)
+        self.assertEqual(info['connections_opened'], 1)
+
+    def test_concurrent_callers_share_download(self):
+        """Callers asking for the same currency at once wait on a single download."""
+        async def work(client):
+            return await asyncio.gather(*(client.convert(amount, 'USD', 'EUR') for amount in (100, 200, 300, 400, 500)))
+        converted, info = self.run_client(work)
+        self.assertEqual(converted, [90.0, 180.0, 270.0, 360.0, 450.0])
+        self.assertEqual(RatesHandler.requests_served, 1)
+        self.assertEqual(info['fetches'], 1)
+        self.assertEqual(info['coalesced'], 4)
+        self.assertEqual(self.cache.info()['size'], 1)
+
+    def test_server_errors_retried(self):
+        """Server errors are retried after a delay; an unknown currency is not."""
+        RatesHandler.failures_left = 2
+        async def work(client):
+            return await client.exchange_rate('USD', 'EUR')
+        rate, info = self.run_client(work, backoff=0.01)
+        self.assertEqual(rate, 0.9)
+        self.assertEqual(info['retries'], 2)
+        self.assertEqual(RatesHandler.requests_served, 3)
+
+        async def unknown(client):
+            return await client.rates('XYZ')
+        with self.assertRaises(ValueError):
+            self.run_client(unknown, backoff=0.01)
+        self.assertEqual(RatesHandler.requests_served, 4)
+
+    def test_bad_responses_retried(self):
+        """Damaged and oversized answers are retried like dropped connections, and redirects are followed."""
+        RatesHandler.damaged_left = 1
+        async def work(client):
+            return await client.exchange_rate('USD', 'EUR')
+        rate, info = self.run_client(work, backoff=0.01)
+        self.assertEqual((rate, info['retries']), (0.9, 1))
+        with self.assertRaises(ConnectionError):
+            self.run_client(lambda client: client.rates('EUR'), retries=1, backoff=0.01, max_response_bytes=10)
+
+        async def malformed():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"HTTP/1.1 OK\r\n\r\n")
+            reader.feed_eof()
+            return await Finance_Tracker._read_response(reader, 100)
+        with self.assertRaises(ConnectionError):
+            asyncio.run(malformed())
+
+        async def redirected():
+            async with Finance_Tracker.AsyncRateClient(self.url.replace("{}", "old/{}"), cache=self.cache) as client:
+                return await client.rates('EUR')
+        self.assertEqual(asyncio.run(redirected()), RATES['EUR'])
+
+    def test_cache_file_written(self):
+        """Downloaded rates are saved in the cache file."""
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "rates.json")
+            self.cache = Finance_Tracker.RateCache(ttl=60, file_name=file_name)
+            async def work(client):
+                return await asyncio.gather(client.rates('USD'), client.rates('EUR'))
+            self.run_client(work)
+            restarted = Finance_Tracker.RateCache(ttl=60, file_name=file_name)
+            self.assertEqual(restarted.lookup('USD'), RATES['USD'])
+            self.assertEqual(restarted.lookup('EUR'), RATES['EUR'])
+
+    def test_timeout(self):
+        """A server that never answers fails with ConnectionError once every retry has timed out."""
+        with socket.socket() as silent:
+            silent.bind(("127.0.0.1", 0))
+            silent.listen()
+            url = f"http://127.0.0.1:{silent.getsockname()[1]}/{{}}"
+            async def main():
+                async with Finance_Tracker.AsyncRateClient(url, cache=self.cache, timeout=0.05, retries=1, backoff=0.01) as client:
+                    await client.rates('USD')
+            with self.assertRaises(ConnectionError):
+                asyncio.run(main())
+
+class TestStartup(unittest.TestCase):
+    def test_import_skips_http_stack(self):
+        """Importing the module does not import requests or numpy until they are needed."""
+        script = "import sys; import Finance_Tracker; print('requests' in sys.modules, 'numpy' in sys.modules)"
+        directory = os.path.dirname(os.path.abspath(Finance_Tracker.__file__))
+        output = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.split(), ['False', 'False'])
+
+class TestBatchConversion(unittest.TestCase):
+    def setUp(self):
+        """Setup a rate cache that counts how often each currency's rates are fetched."""
+        self.fetched = []
+        def fetch(currency):
+            self.fetched.append(currency)
+            return RATES[currency]
+        self.cache = Finance_Tracker.RateCache(fetcher=fetch)
+
+    def test_mixed_source_currencies(self):
+        """Each distinct source currency is fetched once for the whole batch."""
+        converted = Finance_Tracker.convert_currency_batch([100, 50, 10, 20], ['USD', 'EUR', 'USD', 'EUR'], 'GBP', cache=self.cache)
+        for value, expected in zip(converted, [80.0, 42.5, 8.0, 17.0]):
+            self.assertAlmostEqual(value, expected)
+        self.assertEqual(sorted(self.fetched), ['EUR', 'USD'])
+
+    def test_convert_ledger(self):
+        """A whole ledger converts in one call, with list or columnar storage."""
+        for storage in ('list', 'columnar'):
+            finances = Finance_Tracker.Finances(storage=storage)
+            finances.add_transaction("2024-05-10", "Expense", 50, "Groceries")
+            finances.add_transaction("2024-05-11", "Income", 200, "Refund")
+            self.assertEqual(list(finances.convert_ledger('transactions', 'EUR', cache=self.cache)), [45.0, 180.0])
+
+    def test_unknown_currency(self):
+        """An unknown target currency gives None like convert_currency."""
+        self.assertIsNone(Finance_Tracker.convert_currency_batch([1, 2], 'USD', 'XYZ', cache=self.cache))
+
+class TestRateTable(unittest.TestCase):
+    def setUp(self):
+        """Setup a table with USD rates on two dates and one direct EUR rate."""
+        self.table = Finance_Tracker.RateTable()
+        self.table.add_rates("2024-05-01", 'USD', {'USD': 1.0, 'EUR': 0.9, 'GBP': 0.8})
+        self.table.add_rates("2024-06-01", 'USD', {'EUR': 0.8, 'GBP': 0.75})
+        self.table.add("2024-05-15", 'EUR', 'JPY', 165.0)
+
+    def test_nearest_earlier_date(self):
+        """A date without rates uses the latest earlier one, and nothing before the first rate."""
+        self.assertEqual(self.table.rate('USD', 'EUR', "2024-05-20"), 0.9)
+        self.assertEqual(self.table.rate('USD', 'EUR', "2024-06-01"), 0.8)
+        self.assertEqual(self.table.rate('USD', 'USD', "2020-01-01"), 1.0)
+        with self.assertRaises(ValueError):
+            self.table.rate('USD', 'EUR', "2024-04-30")
+
+    def test_inverse_and_cross_rates(self):
+        """Missing pairs come from the opposite pair or go through the pivot currency."""
+        self.assertAlmostEqual(self.table.rate('EUR', 'USD', "2024-05-02"), 1 / 0.9)
+        self.assertAlmostEqual(self.table.rate('EUR', 'GBP', "2024-06-02"), 0.75 / 0.8)
+        self.assertAlmostEqual(self.table.rate('JPY', 'EUR', "2024-05-20"), 1 / 165.0)
+        with self.assertRaises(ValueError):
+            self.table.rate('JPY', 'GBP', "2024-05-20")
+
+    def test_unusable_rates(self):
+        """Zero and non-finite rates are skipped in API answers and rejected when added one by one."""
+        self.table.add_rates("2024-07-01", 'USD', {'EUR': 0, 'GBP': float('nan'), 'JPY': float('inf'), 'CHF': 0.9})
+        self.assertEqual(self.table.rate('EUR', 'USD', "2024-07-02"), 1 / 0.8)
+        self.assertEqual(self.table.rate('USD', 'CHF', "2024-07-02"), 0.9)
+        for rate in (0, -1.0, float('nan'), float('inf'), True):
+            with self.assertRaises(ValueError):
+                self.table.add("2024-07-01", 'USD', 'EUR', rate)
+
+    def test_file_round_trip(self):
+        """Rates saved to a file load back into an equal table."""
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "rates.json")
+            self.table.save(file_name)
+            loaded = Finance_Tracker.RateTable()
+            loaded.load(file_name)
+        self.assertEqual(loaded.days, self.table.days)
+        self.assertEqual(loaded.rates, self.table.rates)
+        self.assertEqual(len(loaded), 5)
+
+    def test_convert_ledger_by_date(self):
+        """Each record of a ledger converts at the rate of its own date, offline."""
+        for storage in ('list', 'columnar'):
+            finances = Finance_Tracker.Finances(storage=storage)
+            finances.add_expense("Rent", 100, "2024-05-10")
+            finances.add_expense("Rent", 100, "2024-06-10")
+            converted = finances.convert_ledger('expenses', 'GBP', 'EUR', rates=self.table)
+            for value, expected in zip(converted, [100 * 0.8 / 0.9, 100 * 0.75 / 0.8]):
+                self.assertAlmostEqual(value, expected)
+            self.assertIsNone(finances.convert_ledger('expenses', 'GBP', 'JPY', rates=self.table))
+
+class TestAggregate(unittest.TestCase):
+    def setUp(self):
+        """Setup finances loaded from the sample data."""
+        self.finances = Finance_Tracker.Finances()
+        self.finances.load_from_file(SAMPLE_DATA)
+
+    def test_group_by_category(self):
+        """Transactions group by category with all statistics."""
+        groups = self.finances.aggregate('transactions', 'category')
+        self.assertEqual(list(groups), ['expense', 'income'])
+        self.assertEqual(groups['expense'], {'sum': 380, 'count': 3, 'mean': 380 / 3, 'min': 50, 'max': 250})
+
+    def test_group_by_calendar(self):
+        """Income groups by month and week, optionally within a date range."""
+        months = self.finances.aggregate('income', 'month')
+        self.assertEqual({month: group['sum'] for month, group in months.items()}, {'2024-05': 9800, '2024-06': 2400})
+        weeks = self.finances.aggregate('income', 'week', "2024-05-01", "2024-05-10")
+        self.assertEqual({week: group['count'] for week, group in weeks.items()}, {'2024-W18': 2, '2024-W19': 1})
+
+    def test_methods_and_storage_agree(self):
+        """Hash and sort methods give the same groups for list and columnar storage."""
+        columnar = Finance_Tracker.Finances(storage='columnar')
+        columnar.load_from_file(SAMPLE_DATA)
+        expected = self.finances.aggregate('expenses', 'category')
+        self.assertEqual(self.finances.aggregate('expenses', 'category', method='sort'), expected)
+        self.assertEqual(columnar.aggregate('expenses', 'category', method='sort'), expected)
+        self.assertEqual(columnar.aggregate('expenses', 'year'), self.finances.aggregate('expenses', 'year'))
+
+    def test_invalid_grouping(self):
+        """Grouping by a field the records don't have is rejected."""
+        with self.assertRaises(ValueError):
+            self.finances.aggregate('income', 'category')
+
+class TestBatchMode(unittest.TestCase):
+    def setUp(self):
+        """Setup the objects batch commands run against."""
+        self.finances = Finance_Tracker.Finances()
+        self.investments = Finance_Tracker.Investments("My Portfolio")
+
+    def run_lines(self, lines):
+        output = io.StringIO()
+        failed = Finance_Tracker.run_batch(lines, self.finances, self.investments, output)
+        return failed, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_commands_share_one_instance(self):
+        """Commands run in order against the same data and give one JSON line each."""
+        failed, results = self.run_lines([
+            '# monthly import',
+            'add_income "Work Salary" 2000 2024-05-01',
+            'add_expense Rent 1000 2024-05-05',
+            '',
+            'total income 2024-05-01 2024-05-31',
+            'add_investment Stocks 5000',
+            'growth Stocks 0.10',
+        ])
+        self.assertEqual(failed, 0)
+        self.assertEqual([result['line'] for result in results], [2, 3, 5, 6, 7])
+        self.assertEqual(results[2]['result'], 2000)
+        self.assertEqual(results[4]['result'], 5500)
+        self.assertEqual(self.finances.income, [{'source': "Work Salary", 'amount': 2000, 'date': "2024-05-01"}])
+
+    def test_errors_do_not_stop_the_batch(self):
+        """A bad command is reported and the rest still run."""
+        failed, results = self.run_lines(['add_expense Rent lots 2024-05-05', 'frobnicate', 'report 2024-05-01', 'expenses'])
+        self.assertEqual(failed, 3)
+        self.assertEqual([result['ok'] for result in results], [False, False, False, True])
+        self.assertEqual(results[3]['result'], [])
+
+    def test_non_finite_numbers_rejected(self):
+        """nan and inf are rejected as arguments, so nothing invalid is added or written as JSON."""
+        failed, results = self.run_lines(['add_expense Rent nan 2024-05-05', 'add_income Job inf 2024-05-01',
+                                          'add_investment Stocks -Infinity', 'total expenses 2024-05-01 2024-05-31'])
+        self.assertEqual(failed, 3)
+        self.assertEqual([result['ok'] for result in results], [False, False, False, True])
+        self.assertEqual(results[3]['result'], 0)
+        self.assertEqual((self.finances.expenses, self.finances.income, self.investments.investments), ([], [], {}))
+
+    def test_search(self):
+        """Transactions can be searched by description, optionally within a date range."""
+        failed, results = self.run_lines(['add_transaction 2024-05-01 Expense 20 "Uber ride"',
+                                          'add_transaction 2024-06-01 Expense 25 "Uber ride"',
+                                          'search "uber ride" 2024-05-01 2024-05-31'])
+        self.assertEqual(failed, 0)
+        self.assertEqual([record['date'] for record in results[2]['result']], ["2024-05-01"])
+
+    def test_save_and_load(self):
+        """Saving and loading report failures instead of printing them."""
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "data.json")
+            failed, results = self.run_lines(['add_income Bonus 500 2024-05-03', f'save "{file_name}"',
+                                              f'load "{file_name}"', f'load "{file_name}.missing"'])
+        self.assertEqual(failed, 1)
+        self.assertNotIn('message', results[1])
+        self.assertFalse(results[3]['ok'])
+
 if __name__ == '__main__':
     unittest.main()